@@ -0,0 +1,180 @@
+#!/usr/bin/env -S python3 -u
+
+#################################################
+# bench_ftp.py v.20250604.1
+# copyright 2025 John Ackermann N8UR jra@febo.com
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# End-to-end download and ingest rate from a simulated receiver
+# (ftp_sim.py) into a scratch measurement directory, in the ways
+# the pipeline fetches days:
+#
+#   single      get_gps_ftp() for one day, own connection
+#   backfill    get_gps_ftp() for each day in turn, own connection
+#               each day (get_gps_ftp.py -a)
+#   shared      the same on one connection (nrcan_daemon.py)
+#   graph       download/convert tasks overlapped (task_graph.py)
+#
+# For mosaic the days are RINEX, so "ingest" is download, copy into
+# place, the partial weekly append and the catalog; for netrs the
+# conversion needs runpkr00 and teqc, so only the download is
+# timed.  Results go to a JSON file.
+#
+# Usage: bench_ftp.py [-r mosaic|netrs] [-n days] [-b bytes_per_s]
+#        [-l latency] [--login_delay s] [--disconnect N]
+#        [--io workers] [-o results.json]
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+from datetime import datetime, timedelta
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOP)
+sys.path.insert(1, os.path.dirname(os.path.abspath(__file__)))
+
+import generators as gen
+from ftp_sim import SimConfig, make_tree, start_server
+
+STATION = 'BNCH'
+
+def options_bench_ftp():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-r','--rx_type',
+        type=str,required=False,default='mosaic',
+        help="Receiver layout (mosaic || netrs)")
+    parser.add_argument('-n','--days',
+        type=int,required=False,default=7,
+        help="Days for the backfill modes")
+    parser.add_argument('-b','--bandwidth',
+        type=float,required=False,default=0,
+        help="Simulated link rate, bytes/s (default: unlimited)")
+    parser.add_argument('-l','--latency',
+        type=float,required=False,default=0,
+        help="Simulated delay before each reply, seconds")
+    parser.add_argument('--login_delay',
+        type=float,required=False,default=0,
+        help="Simulated login delay, seconds")
+    parser.add_argument('--disconnect',
+        type=int,required=False,default=0,
+        help="Drop every Nth transfer part way through")
+    parser.add_argument('--io',
+        type=int,required=False,default=4,
+        help="Download workers for the graph mode")
+    parser.add_argument('-o','--output',
+        type=str,required=False,
+        default=os.path.join(TOP, 'benchmarks', 'bench_ftp.json'),
+        help="JSON results file (default benchmarks/bench_ftp.json)")
+    args = parser.parse_args()
+    return args
+
+# (year, doy) for each of days days from the first generated day
+def days_list(days):
+    out = []
+    for i in range(days):
+        d = gen.START + timedelta(days=i)
+        out.append((d.year, d.timetuple().tm_yday))
+    return out
+
+# one day: download, then convert unless netrs; returns True if
+# the day made it into the measurement directory (or, for netrs,
+# was downloaded)
+def fetch_day(m_path, rx_type, fqdn, year, doy, ftp=None):
+    from get_gps_ftp import download_day, convert_day
+    got = download_day(m_path, rx_type, fqdn, STATION, year, doy, ftp)
+    if got is None:
+        return False
+    if rx_type == 'netrs':
+        os.remove(got[2])
+        return True
+    return convert_day(*got) is not None
+
+def run_mode(mode, work, rx_type, fqdn, days, io_workers):
+    from get_gps_ftp import ftp_connect
+    m_path = os.path.join(work, mode, STATION) + '/'
+    os.makedirs(m_path)
+    todo = days_list(1 if mode == 'single' else days)
+    ok = 0
+    start = time.perf_counter()
+    with open(os.devnull,'w') as null:
+        with contextlib.redirect_stdout(null):
+            if mode in ('single', 'backfill'):
+                for y, d in todo:
+                    ok += fetch_day(m_path, rx_type, fqdn, y, d)
+            elif mode == 'shared':
+                with ftp_connect(fqdn, timeout=60) as ftp:
+                    for y, d in todo:
+                        ok += fetch_day(m_path, rx_type, fqdn, y, d, ftp)
+            else:
+                from task_graph import TaskGraph, convert_step
+                from get_gps_ftp import download_day
+                graph = TaskGraph(io_workers, 1)
+                last = []
+                for y, d in todo:
+                    dl = graph.add('download {}'.format(d), download_day,
+                        (m_path, rx_type, fqdn, STATION, y, d))
+                    if rx_type == 'netrs':
+                        continue
+                    last = [graph.add('convert {}'.format(d), convert_step,
+                        deps=[dl], pool='cpu', use_results=True,
+                        after=last)]
+                graph.run()
+                # the last step for each day is what counts
+                final = 'download' if rx_type == 'netrs' else 'convert'
+                for name, task in graph.tasks.items():
+                    if not name.startswith(final) or task.result is None:
+                        continue
+                    ok += 1
+                    if rx_type == 'netrs':
+                        os.remove(task.result[2])
+    return time.perf_counter() - start, len(todo), ok
+
+def main():
+    args = options_bench_ftp()
+    work = tempfile.mkdtemp(prefix='nrcan_ftp_')
+    try:
+        root = os.path.join(work, 'rx')
+        per_day = make_tree(root, args.rx_type, STATION, gen.START,
+            args.days) / args.days
+        cfg = SimConfig(root, args.bandwidth, args.latency,
+            args.login_delay, args.disconnect)
+        server, fqdn = start_server(cfg)
+        results = {'created': datetime.utcnow().isoformat(timespec='seconds'),
+            'rx_type': args.rx_type, 'bandwidth': args.bandwidth,
+            'latency': args.latency, 'login_delay': args.login_delay,
+            'disconnect': args.disconnect, 'bytes_per_day': per_day,
+            'modes': {}}
+        print('{:10s}{:>6s}{:>6s}{:>10s}{:>10s}{:>10s}'.format('mode', 'days',
+            'ok', 'seconds', 'days/s', 'MB/s'))
+        for mode in ('single', 'backfill', 'shared', 'graph'):
+            secs, n, ok = run_mode(mode, work, args.rx_type, fqdn, args.days,
+                args.io)
+            rate = ok * per_day / secs / 1e6
+            results['modes'][mode] = {'seconds': secs, 'days': n, 'ok': ok,
+                'days_per_s': ok / secs, 'mb_per_s': rate}
+            print('{:10s}{:6d}{:6d}{:10.3f}{:10.2f}{:10.2f}'.format(mode, n,
+                ok, secs, ok / secs, rate))
+        server.shutdown()
+        server.server_close()
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    with open(args.output,'w') as f:
+        json.dump(results, f, indent=1)
+    print("Wrote", args.output)
+
+if __name__ == '__main__':
+    main()
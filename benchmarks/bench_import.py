@@ -0,0 +1,133 @@
+#!/usr/bin/env -S python3 -u
+
+#################################################
+# bench_import.py v.20250604.1
+# copyright 2025 John Ackermann N8UR jra@febo.com
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# Measures cold import time of the nrcan_tools entry points in a
+# fresh interpreter (like systemd starting us) and checks that the
+# light ones don't pull in heavy modules.  Exits non-zero if a
+# module shows up where it shouldn't, or if a time is more than
+# --tolerance times the --baseline result.
+#
+# Usage: bench_import.py [-n repeats] [-o results.json]
+#        [-b baseline.json] [-t tolerance]
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+from datetime import datetime
+
+# repo directory, so the tools import without being installed
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# module: modules that must not be loaded just by importing it
+TARGETS = {
+    'nrcan':            ('requests', 'requests_toolbelt', 'ftplib',
+                         'zipfile', 'webbrowser', 'gnsscal', 'numpy'),
+    'nrcan_tools':      ('requests', 'ftplib', 'zipfile', 'gnsscal',
+                         'numpy'),
+    'ppp_runner':       ('requests', 'requests_toolbelt', 'ftplib',
+                         'webbrowser', 'gnsscal', 'numpy'),
+    'get_gps_ftp':      ('requests', 'ftplib', 'gnsscal', 'numpy'),
+    'make_weekly_rinex':('requests', 'ftplib', 'gnsscal', 'numpy'),
+    'make_gps_misc':    ('requests', 'requests_toolbelt', 'webbrowser'),
+    'get_gps_ppp':      ('requests', 'requests_toolbelt', 'webbrowser'),
+}
+
+def options_bench_import():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n','--repeats',
+        type=int,required=False,default=5,
+        help="Runs per module; best time is kept")
+    parser.add_argument('-o','--output',
+        type=str,required=False,
+        default=os.path.join(TOP, 'benchmarks', 'bench_import.json'),
+        help="JSON results file (default benchmarks/bench_import.json)")
+    parser.add_argument('-b','--baseline',
+        type=str,required=False,default='',
+        help="Earlier results file to compare against")
+    parser.add_argument('-t','--tolerance',
+        type=float,required=False,default=1.5,
+        help="Allowed slowdown vs. baseline (ratio)")
+    args = parser.parse_args()
+    return args
+
+# import module in a fresh interpreter; return (microseconds,
+# list of modules loaded by then).  module '' gives the modules
+# the bare interpreter loads (site, .pth files, etc.)
+def time_import(module):
+    code = "import sys; print(' '.join(sorted(sys.modules)))"
+    if module:
+        code = "import " + module + "; " + code
+    env = dict(os.environ, PYTHONPATH=TOP, PYTHONDONTWRITEBYTECODE='')
+    r = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+        cwd=TOP, env=env, capture_output=True, text=True)
+    if r.returncode != 0:
+        print("Couldn't import", module + ":", r.stderr.strip()[-200:])
+        return None, []
+    usecs = None
+    # last line for the module itself has the cumulative time
+    for line in r.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = [p.strip() for p in line[12:].split('|')]
+        if parts[2] == module:
+            usecs = int(parts[1])
+    return usecs, r.stdout.split()
+
+def main():
+    args = options_bench_import()
+    results = {'created': datetime.utcnow().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0], 'import_us': {}}
+    failed = False
+    startup = set(time_import('')[1])
+
+    for module, forbidden in TARGETS.items():
+        best = None
+        loaded = []
+        for i in range(args.repeats):
+            usecs, loaded = time_import(module)
+            if usecs is not None and (best is None or usecs < best):
+                best = usecs
+        if best is None:
+            failed = True
+            continue
+        results['import_us'][module] = best
+        heavy = [m for m in forbidden if m in loaded and m not in startup]
+        print("{:20s}{:8.1f} ms".format(module, best / 1000), end='')
+        if heavy:
+            print("   loads", ' '.join(heavy), "!!")
+            failed = True
+        else:
+            print()
+
+    if args.baseline:
+        with open(args.baseline,'r') as f:
+            baseline = json.load(f)['import_us']
+        for module, usecs in results['import_us'].items():
+            if module in baseline and \
+                    usecs > baseline[module] * args.tolerance:
+                print("Regression:", module, baseline[module], "->",
+                    usecs, "us")
+                failed = True
+
+    with open(args.output,'w') as f:
+        json.dump(results, f, indent=1)
+    print("Wrote", args.output)
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
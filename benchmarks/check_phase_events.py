@@ -0,0 +1,110 @@
+#!/usr/bin/env -S python3 -u
+
+#################################################
+# check_phase_events.py v.20250604.1
+# copyright 2025 John Ackermann N8UR jra@febo.com
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# Checks phase_events.EventDetector on synthetic phase data with
+# known events: white phase noise with one phase step, one spike,
+# a frequency change and a gap.  Each must be found once, at the
+# right sample, and nothing else may be reported.  Exit code is 1
+# if anything is wrong.
+#
+# Usage: check_phase_events.py [-n samples] [--seed seed]
+
+import os
+import sys
+import random
+import argparse
+from datetime import datetime, timedelta
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOP)
+
+# sample interval, seconds
+TAU = 30
+# white phase noise, seconds
+NOISE = 20e-12
+START = datetime(2024, 1, 7)
+
+# samples (datetime, offset) with the events placed as fractions
+# of the run; returns the samples and the events we expect
+def make_phase(n, seed, freq=1e-12, rate=3e-11, step=5e-9, spike=5e-9):
+    rng = random.Random(seed)
+    i_rate, i_step, i_spike, i_gap = \
+        int(n * 0.4), int(n * 0.2), int(n * 0.7), int(n * 0.85)
+    samples = []
+    phase = 0.0
+    for i in range(n):
+        if i == i_gap:
+            # drop 10 epochs
+            continue
+        phase = freq * TAU * i + (rate * TAU * (i - i_rate) \
+            if i >= i_rate else 0.0)
+        if i >= i_step:
+            phase += step
+        x = phase + rng.gauss(0.0, NOISE)
+        if i == i_spike:
+            x += spike
+        samples.append((START + timedelta(seconds=TAU * i), x))
+    # the gap: samples i_gap .. i_gap + 9 missing
+    samples = [s for s in samples \
+        if not i_gap <= (s[0] - START).total_seconds() / TAU < i_gap + 10]
+    at = lambda i: (START + timedelta(seconds=TAU * i)).isoformat()
+    expect = [
+        ('step', at(i_step), ''),
+        # first sample off the old rate
+        ('step', at(i_rate + 1), 'rate'),
+        ('spike', at(i_spike), ''),
+        ('gap', at(i_gap - 1), '10'),
+        ]
+    return samples, expect
+
+def check(n, seed):
+    from phase_events import EventDetector
+    samples, expect = make_phase(n, seed)
+    det = EventDetector()
+    for dt, x in samples:
+        det.add(dt, x)
+    events = det.close()
+    got = [(kind, iso, detail) for kind, iso, size, detail in events]
+    ok = sorted(got) == sorted(expect)
+    for ev in events:
+        print(' '.join(str(v) for v in ev))
+    if not ok:
+        for ev in expect:
+            if ev not in got:
+                print("missing:", ' '.join(ev))
+        for ev in got:
+            if ev not in expect:
+                print("unexpected:", ' '.join(ev))
+    return ok
+
+def options_check():
+    parser = argparse.ArgumentParser(
+        description="Check phase_events on synthetic data")
+    parser.add_argument('-n','--samples', type=int, default=5000,
+        help="Samples to generate (default 5000)")
+    parser.add_argument('--seed', type=int, default=1,
+        help="Random seed (default 1)")
+    return parser.parse_args()
+
+def main():
+    args = options_check()
+    if not check(args.samples, args.seed):
+        print("FAILED")
+        sys.exit(1)
+    print("ok")
+
+if __name__ == '__main__':
+    main()
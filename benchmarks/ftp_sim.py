@@ -0,0 +1,389 @@
+#!/usr/bin/env -S python3 -u
+
+#################################################
+# ftp_sim.py v.20250604.1
+# copyright 2025 John Ackermann N8UR jra@febo.com
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# A stand-in for a receiver's FTP server, so get_gps_ftp.py can be
+# run (and timed) without a receiver on the other end of a slow
+# link.  make_tree() lays out synthetic days the way the receivers
+# do:
+#
+#     mosaic:  DSK1/SSN/GRB0051/<yy><doy>/<station><doy>0.<yy>o
+#     netrs:   <yyyy><mm>/<station><yyyy><mm><dd>0000a.T00
+#
+# (Mosaic days are RINEX from generators.py; NetRS .T00 files are
+# random bytes of about the right size, since only Trimble's
+# runpkr00 can read the real thing.)
+#
+# The server speaks just enough FTP for ftplib -- USER, PASS, SYST,
+# TYPE, PWD, CWD, PASV/EPSV, REST, RETR, SIZE, LIST/NLST, NOOP, QUIT --
+# and can be made to act like a receiver on a bad day:
+#
+#   bandwidth      data rate of each transfer, bytes/s (0 = as fast
+#                  as it can)
+#   latency        delay before each control reply, seconds
+#   login_delay    extra delay before accepting the login, seconds
+#   disconnect     drop every Nth transfer part way through
+#   disconnect_at  ... after this fraction of the file
+#
+# Usage: ftp_sim.py root [-r mosaic|netrs] [-s station] [--make]
+#        [-y year -d doy -n days] [-p port] [-b bytes_per_s]
+#        [-l latency] [--login_delay s] [--disconnect N]
+
+import os
+import sys
+import time
+import random
+import socket
+import argparse
+import threading
+import socketserver
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import generators as gen
+
+# data channel block size
+BLOCK = 16384
+
+# size of a synthetic .T00 day, bytes
+T00_SIZE = 1500000
+
+# path (relative to root) of a day's file in a receiver's layout
+def receiver_path(rx_type, station, day):
+    yy = day.strftime('%y')
+    doy = day.strftime('%j')
+    if rx_type == 'mosaic':
+        return 'DSK1/SSN/GRB0051/' + yy + doy + '/' + station + doy + \
+            '0.' + yy + 'o'
+    return day.strftime('%Y%m') + '/' + station + \
+        day.strftime('%Y%m%d') + '0000a.T00'
+
+# write days of files under root; returns the total bytes
+def make_tree(root, rx_type, station, first=gen.START, days=1, seed=0):
+    total = 0
+    for i in range(days):
+        day = first + timedelta(days=i)
+        path = os.path.join(root, receiver_path(rx_type, station, day))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if not os.path.isfile(path):
+            if rx_type == 'mosaic':
+                gen.write_rinex_day(path, day, marker=station, seed=seed)
+            else:
+                rng = random.Random(seed * 1000003 + day.toordinal())
+                with open(path,'wb') as f:
+                    f.write(rng.randbytes(T00_SIZE))
+        total += os.path.getsize(path)
+    return total
+
+class SimConfig:
+    def __init__(self, root, bandwidth=0, latency=0.0, login_delay=0.0,
+            disconnect=0, disconnect_at=0.5):
+        self.root = os.path.abspath(root)
+        self.bandwidth = bandwidth
+        self.latency = latency
+        self.login_delay = login_delay
+        self.disconnect = disconnect
+        self.disconnect_at = disconnect_at
+        self.lock = threading.Lock()
+        self.transfers = 0          # RETRs started, for disconnect
+        self.bytes_sent = 0
+
+    # True if this transfer should be cut off
+    def next_transfer(self):
+        with self.lock:
+            self.transfers += 1
+            return bool(self.disconnect) and \
+                self.transfers % self.disconnect == 0
+
+class FtpHandler(socketserver.StreamRequestHandler):
+    # one control connection
+    def setup(self):
+        super().setup()
+        self.cfg = self.server.cfg
+        self.cwd = '/'
+        self.pasv = None        # listening data socket
+        self.rest = 0           # offset for the next RETR
+
+    def reply(self, text):
+        if self.cfg.latency:
+            time.sleep(self.cfg.latency)
+        self.wfile.write((text + '\r\n').encode())
+        self.wfile.flush()
+
+    # real path for an FTP path, or None if it's outside root
+    def real_path(self, path):
+        path = os.path.normpath(os.path.join(self.cwd, path or '.'))
+        real = os.path.normpath(os.path.join(self.cfg.root,
+            path.lstrip('/')))
+        if real != self.cfg.root and \
+                not real.startswith(self.cfg.root + os.sep):
+            return None
+        return real
+
+    def handle(self):
+        self.reply('220 ftp_sim ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            line = line.decode(errors='replace').rstrip('\r\n')
+            cmd, sep, arg = line.partition(' ')
+            cmd = cmd.upper()
+            func = getattr(self, 'ftp_' + cmd, None)
+            if func is None:
+                self.reply('502 ' + cmd + ' not implemented')
+                continue
+            if func(arg) is False:
+                break
+        if self.pasv:
+            self.pasv.close()
+
+    def ftp_USER(self, arg):
+        self.reply('331 Password please')
+
+    def ftp_PASS(self, arg):
+        if self.cfg.login_delay:
+            time.sleep(self.cfg.login_delay)
+        self.reply('230 Logged in')
+
+    def ftp_SYST(self, arg):
+        self.reply('215 UNIX Type: L8')
+
+    def ftp_TYPE(self, arg):
+        self.reply('200 Type set to ' + arg)
+
+    def ftp_NOOP(self, arg):
+        self.reply('200 OK')
+
+    def ftp_PWD(self, arg):
+        self.reply('257 "' + self.cwd + '"')
+
+    def ftp_CWD(self, arg):
+        real = self.real_path(arg)
+        if real is None or not os.path.isdir(real):
+            self.reply('550 ' + arg + ': No such directory')
+            return
+        self.cwd = '/' + os.path.relpath(real, self.cfg.root) \
+            .replace(os.sep, '/').lstrip('.')
+        self.reply('250 CWD command successful')
+
+    def ftp_QUIT(self, arg):
+        self.reply('221 Bye')
+        return False
+
+    def open_pasv(self):
+        if self.pasv:
+            self.pasv.close()
+        self.pasv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.pasv.bind((self.request.getsockname()[0], 0))
+        self.pasv.listen(1)
+        self.pasv.settimeout(30)
+        return self.pasv.getsockname()
+
+    def ftp_PASV(self, arg):
+        host, port = self.open_pasv()
+        self.reply('227 Entering Passive Mode ({},{},{})'.format(
+            host.replace('.', ','), port >> 8, port & 0xff))
+
+    def ftp_EPSV(self, arg):
+        host, port = self.open_pasv()
+        self.reply('229 Entering Extended Passive Mode (|||{}|)'.format(
+            port))
+
+    def ftp_REST(self, arg):
+        try:
+            self.rest = int(arg)
+        except ValueError:
+            self.reply('501 Bad offset')
+            return
+        self.reply('350 Restarting at ' + arg)
+
+    def ftp_SIZE(self, arg):
+        real = self.real_path(arg)
+        if real is None or not os.path.isfile(real):
+            self.reply('550 ' + arg + ': No such file')
+            return
+        self.reply('213 ' + str(os.path.getsize(real)))
+
+    # accept the data connection for a transfer, or None
+    def data_conn(self):
+        if self.pasv is None:
+            self.reply('425 Use PASV first')
+            return None
+        try:
+            conn, addr = self.pasv.accept()
+        except OSError:
+            self.reply('425 Can\'t open data connection')
+            return None
+        finally:
+            self.pasv.close()
+            self.pasv = None
+        return conn
+
+    def ftp_RETR(self, arg):
+        rest, self.rest = self.rest, 0
+        real = self.real_path(arg)
+        if real is None or not os.path.isfile(real):
+            self.reply('550 ' + arg + ': No such file')
+            return
+        conn = self.data_conn()
+        if conn is None:
+            return
+        size = max(os.path.getsize(real) - rest, 0)
+        cut = int(size * self.cfg.disconnect_at) \
+            if self.cfg.next_transfer() else None
+        self.reply('150 Opening BINARY mode data connection for ' + arg + \
+            ' (' + str(size) + ' bytes)')
+        sent = 0
+        start = time.time()
+        try:
+            with open(real,'rb') as f:
+                f.seek(rest)
+                while True:
+                    n = BLOCK if cut is None else min(BLOCK, cut - sent)
+                    buf = f.read(n) if n > 0 else b''
+                    if not buf:
+                        break
+                    conn.sendall(buf)
+                    sent += len(buf)
+                    if self.cfg.bandwidth:
+                        ahead = sent / self.cfg.bandwidth - \
+                            (time.time() - start)
+                        if ahead > 0:
+                            time.sleep(ahead)
+        except OSError:
+            cut = sent
+        finally:
+            conn.close()
+        with self.cfg.lock:
+            self.cfg.bytes_sent += sent
+        if cut is not None:
+            self.reply('426 Connection closed; transfer aborted')
+        else:
+            self.reply('226 Transfer complete')
+
+    def ftp_NLST(self, arg):
+        self.send_list(arg, False)
+
+    def ftp_LIST(self, arg):
+        self.send_list(arg, True)
+
+    def send_list(self, arg, long):
+        if arg.startswith('-'):
+            arg = ''
+        real = self.real_path(arg)
+        if real is None or not os.path.isdir(real):
+            self.reply('550 ' + arg + ': No such directory')
+            return
+        conn = self.data_conn()
+        if conn is None:
+            return
+        self.reply('150 Here comes the listing')
+        lines = []
+        for name in sorted(os.listdir(real)):
+            if long:
+                path = os.path.join(real, name)
+                kind = 'd' if os.path.isdir(path) else '-'
+                lines.append('{}rw-r--r-- 1 rx rx {:>10d} Jan 01 00:00 {}' \
+                    .format(kind, os.path.getsize(path), name))
+            else:
+                lines.append(name)
+        try:
+            conn.sendall(''.join([l + '\r\n' for l in lines]).encode())
+        finally:
+            conn.close()
+        self.reply('226 Directory send OK')
+
+class SimServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, cfg):
+        self.cfg = cfg
+        super().__init__(address, FtpHandler)
+
+# start a server in a background thread; returns (server,
+# 'host:port' for get_gps_ftp's fqdn).  Stop it with
+# server.shutdown(); server.server_close()
+def start_server(cfg, host='127.0.0.1', port=0):
+    server = SimServer((host, port), cfg)
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    return server, '{}:{}'.format(*server.server_address[:2])
+
+def options_ftp_sim():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('root',
+        type=str,
+        help="Directory to serve")
+    parser.add_argument('-r','--rx_type',
+        type=str,required=False,default='mosaic',
+        help="Layout for --make (mosaic || netrs)")
+    parser.add_argument('-s','--station',
+        type=str,required=False,default='BNCH',
+        help="Station name for --make")
+    parser.add_argument('--make',
+        action='store_true',
+        help="Write synthetic days under root first")
+    parser.add_argument('-y','--year',
+        type=int,required=False,default=gen.START.year,
+        help="Year of first day for --make")
+    parser.add_argument('-d','--day_of_year',
+        type=int,required=False,default=int(gen.START.strftime('%j')),
+        help="Day of year of first day for --make")
+    parser.add_argument('-n','--days',
+        type=int,required=False,default=7,
+        help="Days to make")
+    parser.add_argument('-p','--port',
+        type=int,required=False,default=2121,
+        help="Port to listen on (default 2121)")
+    parser.add_argument('-b','--bandwidth',
+        type=float,required=False,default=0,
+        help="Data rate, bytes/s (default: unlimited)")
+    parser.add_argument('-l','--latency',
+        type=float,required=False,default=0,
+        help="Delay before each reply, seconds")
+    parser.add_argument('--login_delay',
+        type=float,required=False,default=0,
+        help="Extra delay before login is accepted, seconds")
+    parser.add_argument('--disconnect',
+        type=int,required=False,default=0,
+        help="Drop every Nth transfer part way through")
+
+    args = parser.parse_args()
+    return args
+
+def main():
+    args = options_ftp_sim()
+    if args.make:
+        first = datetime(args.year, 1, 1) + \
+            timedelta(days=args.day_of_year - 1)
+        total = make_tree(args.root, args.rx_type, args.station, first,
+            args.days)
+        print("Made", args.days, args.rx_type, "days,", total, "bytes")
+    cfg = SimConfig(args.root, args.bandwidth, args.latency,
+        args.login_delay, args.disconnect)
+    server = SimServer(('', args.port), cfg)
+    print("Serving", cfg.root, "on port", args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+if __name__ == '__main__':
+    main()
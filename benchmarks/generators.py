@@ -0,0 +1,267 @@
+#!/usr/bin/env -S python3 -u
+
+#################################################
+# generators.py v.20250604.1
+# copyright 2025 John Ackermann N8UR jra@febo.com
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# Synthetic input files for the benchmarks: RINEX 2.11 daily
+# observation files like the receivers give us, and NRCan .clk and
+# .sum files like CSRS-PPP sends back.  The same arguments (and
+# seed) always give the same bytes, so timings from different runs
+# are of the same work.
+#
+# The data are only realistic where the tools look: record layout,
+# header labels, epochs, and the fields we parse.  Observation
+# values are smooth ramps; clock offsets are a random walk plus a
+# frequency offset and drift.
+#
+# Usage: generators.py rinex|clk|sum path [-s start] [-n days]
+#        [-t tau] [-g gaps] [--seed seed]
+
+import os
+import sys
+import random
+import argparse
+from datetime import datetime, timedelta
+
+# day 0 of GPS week 0
+GPS_EPOCH = datetime(1980, 1, 6)
+
+# default first day: Sunday, so day 0 of a GPS week (2296)
+START = datetime(2024, 1, 7)
+
+OBS_TYPES = ('L1', 'L2', 'C1', 'P2', 'S1', 'S2')
+
+# a RINEX header line: 60 columns of data, then the label
+def hdr(label, body=''):
+    return '{:60s}{:20s}\n'.format(body, label)
+
+def rinex_header(start, interval, marker, obs_types=OBS_TYPES):
+    types = '{:6d}'.format(len(obs_types)) + \
+        ''.join(['{:>6s}'.format(t) for t in obs_types])
+    return [
+        hdr('RINEX VERSION / TYPE',
+            '     2.11           OBSERVATION DATA    G (GPS)'),
+        hdr('PGM / RUN BY / DATE',
+            '{:20s}{:20s}{:20s}'.format('generators.py', 'bench',
+            start.strftime('%Y%m%d %H%M%S UTC'))),
+        hdr('MARKER NAME', marker),
+        hdr('OBSERVER / AGENCY', '{:20s}{:40s}'.format('bench', 'bench')),
+        hdr('REC # / TYPE / VERS', '{:20s}{:20s}{:20s}'.format('0',
+            'BENCH RX', '1.0')),
+        hdr('ANT # / TYPE', '{:20s}{:20s}'.format('0', 'BENCH ANT')),
+        hdr('APPROX POSITION XYZ', '{:14.4f}{:14.4f}{:14.4f}'.format(
+            1234567.123, -4567890.456, 4012345.789)),
+        hdr('ANTENNA: DELTA H/E/N', '{:14.4f}{:14.4f}{:14.4f}'.format(
+            0, 0, 0)),
+        hdr('WAVELENGTH FACT L1/2', '{:6d}{:6d}'.format(1, 1)),
+        hdr('# / TYPES OF OBSERV', types),
+        hdr('INTERVAL', '{:10.3f}'.format(interval)),
+        hdr('TIME OF FIRST OBS', '{:6d}{:6d}{:6d}{:6d}{:6d}{:13.7f}'
+            '     GPS'.format(start.year, start.month, start.day,
+            start.hour, start.minute, start.second)),
+        hdr('END OF HEADER'),
+    ]
+
+# one day of RINEX 2 observations starting at day (a datetime at
+# 00:00), nsat satellites in view at each epoch out of 32
+def write_rinex_day(path, day, interval=30, nsat=8, marker='BENCH',
+        seed=0):
+    rng = random.Random(seed * 100003 + day.toordinal())
+    n_types = len(OBS_TYPES)
+    per_line = 5
+    with open(path,'w') as f:
+        f.writelines(rinex_header(day, interval, marker))
+        # the constellation changes every hour or so
+        sats = sorted(rng.sample(range(1, 33), nsat))
+        for i in range(int(86400 // interval)):
+            t = day + timedelta(seconds=i * interval)
+            if i % 120 == 0:
+                sats = sorted(rng.sample(range(1, 33), nsat))
+            names = ''.join(['G{:02d}'.format(s) for s in sats])
+            f.write(' {:02d} {:2d} {:2d} {:2d} {:2d}{:11.7f}  0{:3d}{}\n' \
+                .format(t.year % 100, t.month, t.day, t.hour, t.minute,
+                t.second, nsat, names[:36]))
+            for k in range(36, len(names), 36):
+                f.write(' ' * 32 + names[k:k + 36] + '\n')
+            for s in sats:
+                base = 2e7 + s * 1000.0 + i * 0.731
+                vals = ['{:14.3f}  '.format(base + j * 1e5) \
+                    for j in range(n_types)]
+                for k in range(0, n_types, per_line):
+                    f.write(''.join(vals[k:k + per_line]).rstrip() + '\n')
+
+# (seconds from start, length) of gaps, from a count spread
+# pseudo-randomly over the span
+def make_gaps(seconds, count, tau, seed=0):
+    rng = random.Random(seed + 7)
+    gaps = []
+    for i in range(count):
+        gaps.append((rng.randrange(0, int(seconds)), tau * rng.randrange(2,
+            120)))
+    return sorted(gaps)
+
+# .clk file body lines (AR records) from start for days at tau
+# seconds, leaving out epochs in gaps ((offset s, length s) pairs)
+def clk_lines(start, days, tau=30, gaps=(), station='BNCH', seed=0):
+    rng = random.Random(seed)
+    x = 1.0e-9
+    freq = 1.1e-11
+    drift = 1e-14 / 86400.0
+    n = int(days * 86400 // tau)
+    g = 0
+    gaps = list(gaps)
+    for i in range(n):
+        sec = i * tau
+        x += (freq + drift * sec) * tau + rng.gauss(0, 2e-12)
+        while g < len(gaps) and sec >= gaps[g][0] + gaps[g][1]:
+            g += 1
+        if g < len(gaps) and sec >= gaps[g][0]:
+            continue
+        t = start + timedelta(seconds=sec)
+        yield 'AR {:4s} {:4d} {:2d} {:2d} {:2d} {:2d} {:9.6f}  2 ' \
+            '{:21.12e} {:11.1e}\n'.format(station, t.year, t.month, t.day,
+            t.hour, t.minute, float(t.second), x, 1e-10)
+
+def clk_header(station='BNCH', tau=30):
+    return [
+        hdr('RINEX VERSION / TYPE',
+            '     3.00           C                   '),
+        hdr('PGM / RUN BY / DATE', '{:20s}{:20s}'.format('CSRS-PPP',
+            'NRCan')),
+        hdr('# / TYPES OF DATA', '{:6d}{:>6s}'.format(1, 'AR')),
+        hdr('COMMENT', 'Sampling interval ' + str(tau) + ' s'),
+        hdr('# OF SOLN STA / TRF', '{:6d}    {:s}'.format(1, 'IGS14')),
+        hdr('SOLN STA NAME / NUM', station),
+        hdr('END OF HEADER'),
+    ]
+
+# one .clk file covering start for days
+def write_clk(path, start=START, days=7, tau=30, gaps=(), station='BNCH',
+        seed=0):
+    with open(path,'w') as f:
+        f.writelines(clk_header(station, tau))
+        f.writelines(clk_lines(start, days, tau, gaps, station, seed))
+
+# one .clk file per GPS week (as CSRS-PPP gives us), named like
+# the tier directories' files; returns the paths
+def write_clk_weeks(directory, name, start=START, days=7, tau=30,
+        n_gaps=0, tier='final', station='BNCH', seed=0):
+    gaps = make_gaps(days * 86400, n_gaps, tau, seed)
+    first = (start - GPS_EPOCH).days
+    end = first + int(days)
+    paths = []
+    day = first
+    while day < end:
+        week = day // 7
+        wend = min((week + 1) * 7, end)
+        offset = (day - first) * 86400
+        wgaps = [(g0 - offset, gl) for g0, gl in gaps \
+            if g0 + gl > offset and g0 < offset + (wend - day) * 86400]
+        path = os.path.join(directory, '{}__{:04d}_{}.clk'.format(name,
+            week, tier))
+        write_clk(path, GPS_EPOCH + timedelta(days=day), wend - day, tau,
+            wgaps, station, seed + week)
+        paths.append(path)
+        day = wend
+    return paths
+
+# a CSRS-PPP .sum file for data from begin to end (datetimes)
+def write_sum(path, begin, end, tier='FIN', offset=-277.3, seed=0):
+    rng = random.Random(seed)
+    def pos(label, a, b, sigma):
+        return label.ljust(49) + a + b + '{:8.3f}\n'.format(sigma)
+    with open(path,'w') as f:
+        f.write('NOW {}\n'.format((end + timedelta(days=17)) \
+            .strftime('%Y-%m-%d %H:%M:%S')))
+        f.write('BEG {}.00\n'.format(begin.strftime('%Y-%m-%d %H:%M:%S')))
+        f.write('END {}.00\n'.format(end.strftime('%Y-%m-%d %H:%M:%S')))
+        f.write('INT 30.00\n')
+        f.write('SP3 EMR0OPS{}_{}0000_01D_15M_ORB.SP3\n'.format(tier,
+            begin.strftime('%Y%j')))
+        f.write('RCV BENCH RX 1.0\n')
+        f.write('ANT BENCH ANT NONE\n')
+        for axis, v in (('X', 1234567.123), ('Y', -4567890.456),
+                ('Z', 4012345.789)):
+            v += rng.gauss(0, 0.005)
+            f.write(pos('POS   ' + axis + '(m)', '{:13.3f}'.format(v),
+                '{:13.3f}'.format(v + 0.01), 0.002))
+        for axis, v in (('LAT', '  40 12 34.56789'),
+                ('LON', ' -74 12 34.56789'), ('HGT', '         123.456')):
+            f.write(('POS ' + axis).ljust(47) + v + v + \
+                '{:8.3f}\n'.format(0.003))
+        f.write('OFF {:.4f} 0.1666 ns\n'.format(offset + rng.gauss(0, 0.5)))
+
+# weekly .sum files for a measurement, in <m_path>/<tier>/sum/
+# the way get_gps_ppp.py files them; returns the paths
+def write_sum_weeks(m_path, name, start=START, weeks=1, tier='final',
+        seed=0):
+    corr = {'final': 'FIN', 'rapid': 'RAP', 'ultra': 'ULT'}[tier]
+    sum_dir = os.path.join(m_path, tier, 'sum')
+    os.makedirs(sum_dir, exist_ok=True)
+    week0 = (start - GPS_EPOCH).days // 7
+    paths = []
+    for w in range(weeks):
+        begin = GPS_EPOCH + timedelta(days=(week0 + w) * 7)
+        end = begin + timedelta(days=7) - timedelta(seconds=30)
+        path = os.path.join(sum_dir, '{}__{:04d}_{}.sum'.format(name,
+            week0 + w, tier))
+        write_sum(path, begin, end, corr, -277.3 + 0.1 * w, seed + w)
+        paths.append(path)
+    return paths
+
+def options_generators():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('kind',
+        choices=('rinex', 'clk', 'sum'),
+        help="What to make")
+    parser.add_argument('path',
+        type=str,
+        help="Output file")
+    parser.add_argument('-s','--start',
+        type=str,required=False,default=START.strftime('%Y-%m-%d'),
+        help="First day, YYYY-MM-DD")
+    parser.add_argument('-n','--days',
+        type=float,required=False,default=1,
+        help="Days of data (clk, sum)")
+    parser.add_argument('-t','--tau',
+        type=int,required=False,default=30,
+        help="Sample interval, seconds")
+    parser.add_argument('-g','--gaps',
+        type=int,required=False,default=0,
+        help="Number of gaps (clk)")
+    parser.add_argument('--seed',
+        type=int,required=False,default=0,
+        help="Random seed")
+
+    args = parser.parse_args()
+    return args
+
+def main():
+    args = options_generators()
+    start = datetime.strptime(args.start, '%Y-%m-%d')
+    if args.kind == 'rinex':
+        write_rinex_day(args.path, start, args.tau, seed=args.seed)
+    elif args.kind == 'clk':
+        write_clk(args.path, start, args.days, args.tau,
+            make_gaps(args.days * 86400, args.gaps, args.tau, args.seed),
+            seed=args.seed)
+    else:
+        end = start + timedelta(days=args.days) - timedelta(seconds=30)
+        write_sum(args.path, start, end, seed=args.seed)
+    print("Wrote", args.path, "(" + str(os.path.getsize(args.path)),
+        "bytes)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env -S python3 -u
+
+#################################################
+# run_benchmarks.py v.20250604.1
+# copyright 2025 John Ackermann N8UR jra@febo.com
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# Times the file-handling parts of the pipeline on synthetic data
+# (see generators.py) at 1 day, 1 week, 1 year and 10 years:
+#
+#   make_phase_file     weekly .clk files -> phase file
+#   get_final_epoch,    the epoch helpers in nrcan_tools, on the
+#   get_tau             phase file just made
+#   make_gps_misc       one .sum per week, appended one at a time
+#   make_gps_misc_batch the same .sum files merged in one go
+#   measurement_files   a MeasurementFiles for every day, bare and
+#   measurement_files_all   with all its names worked out
+#   append_daily        daily RINEX -> partial weekly file
+#   weekly_archive      make_weekly_rinex (weekly file and zips)
+#
+# The RINEX benchmarks need a whole week, and a year of daily
+# files is a couple of GB, so they run on at most --max_weeks weeks
+# and the results say how many.  10 years (decade) isn't run unless
+# asked for; it needs about 1.5 GB of disk for the .clk files.
+#
+# Results (best of --repeats, in seconds, with the amount of data)
+# go to a JSON file; with -b, times more than --tolerance times an
+# earlier results file are reported and the exit code is 1.
+#
+# Usage: run_benchmarks.py [-s day,week,year[,decade]] [-o results.json]
+#        [-b baseline.json] [-t tolerance] [-n repeats] [-w max_weeks]
+#        [-d workdir] [--keep]
+
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+from datetime import datetime, timedelta
+
+# repo directory, so the tools import without being installed
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOP)
+sys.path.insert(1, os.path.dirname(os.path.abspath(__file__)))
+
+import generators as gen
+
+# size name: days of data
+SIZES = {'day': 1, 'week': 7, 'year': 364, 'decade': 3640}
+
+# measurement name used for the generated trees
+NAME = 'bench'
+
+def options_run_benchmarks():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s','--sizes',
+        type=str,required=False,default='day,week,year',
+        help="Comma separated sizes: " + ', '.join(SIZES))
+    parser.add_argument('-o','--output',
+        type=str,required=False,
+        default=os.path.join(TOP, 'benchmarks', 'benchmarks.json'),
+        help="JSON results file (default benchmarks/benchmarks.json)")
+    parser.add_argument('-b','--baseline',
+        type=str,required=False,default='',
+        help="Earlier results file to compare against")
+    parser.add_argument('-t','--tolerance',
+        type=float,required=False,default=1.5,
+        help="Allowed slowdown vs. baseline (ratio)")
+    parser.add_argument('-n','--repeats',
+        type=int,required=False,default=1,
+        help="Runs per benchmark; best time is kept")
+    parser.add_argument('-w','--max_weeks',
+        type=int,required=False,default=4,
+        help="Most weeks of RINEX to archive per size")
+    parser.add_argument('-d','--workdir',
+        type=str,required=False,default='',
+        help="Where to put generated data (default: a temp dir)")
+    parser.add_argument('--keep',
+        action='store_true',
+        help="Don't remove the generated data")
+    args = parser.parse_args()
+    return args
+
+# run func(*args) with its printing thrown away; returns
+# (seconds, result)
+def timed(func, *args):
+    with open(os.devnull,'w') as null:
+        with contextlib.redirect_stdout(null):
+            start = time.perf_counter()
+            result = func(*args)
+            secs = time.perf_counter() - start
+    return secs, result
+
+# best of repeats runs; setup() (if given) is run untimed before
+# each and its result passed to func
+def best_of(repeats, func, setup=None):
+    best = None
+    result = None
+    for i in range(max(repeats, 1)):
+        args = () if setup is None else (setup(),)
+        secs, result = timed(func, *args)
+        if best is None or secs < best:
+            best = secs
+    return best, result
+
+def total_size(paths):
+    return sum([os.path.getsize(p) for p in paths])
+
+def fresh_dir(path):
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    return path
+
+# the benchmarks for one size; returns {name: result dict}
+def run_size(size, days, work, repeats, max_weeks):
+    from make_phase_from_clk import make_phase_file
+    from make_gps_misc import make_gps_misc, make_gps_misc_batch
+    import nrcan_tools
+    results = {}
+    weeks = max(days // 7, 1)
+    print(size + ':', days, 'days')
+
+    # phase file from weekly .clk files
+    clk_dir = fresh_dir(os.path.join(work, size, 'clk'))
+    clk_files = gen.write_clk_weeks(clk_dir, NAME, gen.START, days, 30,
+        n_gaps=max(days // 30, 1))
+    phase = os.path.join(work, size, 'phase.dat')
+    secs, count = best_of(repeats, lambda: make_phase_file(
+        os.path.join(clk_dir, '*.clk'), phase))
+    results['make_phase_file'] = {'seconds': secs, 'records': count,
+        'bytes': total_size(clk_files)}
+
+    # epoch helpers on the phase file
+    for name in ('get_final_epoch', 'get_tau'):
+        func = getattr(nrcan_tools, name)
+        secs, r = best_of(repeats, lambda: func(phase))
+        results[name] = {'seconds': secs, 'records': count,
+            'bytes': os.path.getsize(phase)}
+
+    # .sum files into pos/offset files
+    m_path = fresh_dir(os.path.join(work, size, 'misc', NAME))
+    sums = gen.write_sum_weeks(m_path, NAME, gen.START, weeks)
+    # start each run with no pos/offset files (the directories are
+    # left alone, as MeasurementFiles remembers making them)
+    def misc_setup():
+        for f in glob.glob(os.path.join(m_path, '*', 'misc', '*')):
+            os.remove(f)
+        return sums
+    def misc_one(sums):
+        for s in sums:
+            make_gps_misc(s, m_path)
+    secs, r = best_of(repeats, misc_one, misc_setup)
+    results['make_gps_misc'] = {'seconds': secs, 'records': weeks}
+    secs, r = best_of(repeats, make_gps_misc_batch, misc_setup)
+    results['make_gps_misc_batch'] = {'seconds': secs, 'records': weeks}
+
+    # MeasurementFiles for each day
+    dates = [gen.START + timedelta(days=i) for i in range(days)]
+    ydoy = [(d.year, d.timetuple().tm_yday) for d in dates]
+    def make_all(load):
+        for y, d in ydoy:
+            m = nrcan_tools.MeasurementFiles(m_path, y, d)
+            if load:
+                m.load_all()
+    secs, r = best_of(repeats, lambda: make_all(False))
+    results['measurement_files'] = {'seconds': secs, 'records': days}
+    secs, r = best_of(repeats, lambda: make_all(True))
+    results['measurement_files_all'] = {'seconds': secs, 'records': days}
+
+    if days >= 7:
+        results.update(run_weekly(size, work, repeats,
+            min(weeks, max_weeks)))
+    return results
+
+# daily RINEX -> weekly file and zips, for n_weeks weeks
+def run_weekly(size, work, repeats, n_weeks):
+    from nrcan_tools import MeasurementFiles
+    from make_weekly_rinex import make_weekly_rinex, append_daily_to_weekly
+    week0 = (gen.START - gen.GPS_EPOCH).days // 7
+    append = 0.0
+    archive = 0.0
+    nbytes = 0
+    for w in range(week0, week0 + n_weeks):
+        best_append = None
+        best_archive = None
+        for i in range(max(repeats, 1)):
+            # a new tree each run, since MeasurementFiles remembers
+            # which directories it has made
+            top = fresh_dir(os.path.join(work, size, 'rinex',
+                '{}_{}'.format(w, i)))
+            m_path = os.path.join(top, NAME)
+            days = []
+            for dow in range(7):
+                day = gen.GPS_EPOCH + timedelta(days=w * 7 + dow)
+                m = MeasurementFiles(m_path, day.year,
+                    day.timetuple().tm_yday)
+                m.make_dirs()
+                m.make_daily_dnld_dir()
+                gen.write_rinex_day(m.daily_dnld_path, day)
+                days.append(m)
+            size_week = total_size([m.daily_dnld_path for m in days])
+            secs, r = timed(lambda: [append_daily_to_weekly(m) \
+                for m in days])
+            best_append = secs if best_append is None else \
+                min(best_append, secs)
+            secs, r = timed(make_weekly_rinex, m_path, w, True, False)
+            best_archive = secs if best_archive is None else \
+                min(best_archive, secs)
+            shutil.rmtree(top, ignore_errors=True)
+        nbytes += size_week
+        append += best_append
+        archive += best_archive
+    return {'append_daily': {'seconds': append, 'records': n_weeks * 7,
+            'bytes': nbytes},
+        'weekly_archive': {'seconds': archive, 'records': n_weeks,
+            'bytes': nbytes}}
+
+def main():
+    args = options_run_benchmarks()
+    sizes = [s for s in args.sizes.split(',') if s]
+    for s in sizes:
+        if s not in SIZES:
+            print("Unknown size", s, "- choose from", ', '.join(SIZES))
+            sys.exit(1)
+    work = args.workdir or tempfile.mkdtemp(prefix='nrcan_bench_')
+    os.makedirs(work, exist_ok=True)
+    os.umask(0o002)     # o-w
+
+    results = {'created': datetime.utcnow().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0], 'sizes': {}}
+    try:
+        for size in sizes:
+            res = run_size(size, SIZES[size], work, args.repeats,
+                args.max_weeks)
+            results['sizes'][size] = {'days': SIZES[size], 'results': res}
+            for name, r in res.items():
+                print('  {:22s}{:10.4f} s {:10d} records'.format(name,
+                    r['seconds'], r.get('records') or 0))
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(work, ignore_errors=True)
+
+    failed = False
+    if args.baseline:
+        with open(args.baseline,'r') as f:
+            baseline = json.load(f)['sizes']
+        for size, entry in results['sizes'].items():
+            old = baseline.get(size, {}).get('results', {})
+            for name, r in entry['results'].items():
+                if name in old and old[name].get('records') == \
+                        r.get('records') and \
+                        r['seconds'] > old[name]['seconds'] * args.tolerance:
+                    print("Regression:", size, name,
+                        '{:.3f} -> {:.3f} s'.format(old[name]['seconds'],
+                        r['seconds']))
+                    failed = True
+
+    with open(args.output,'w') as f:
+        json.dump(results, f, indent=1)
+    print("Wrote", args.output)
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
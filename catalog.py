@@ -0,0 +1,280 @@
+#!/usr/bin/env -S python3 -u
+
+#################################################
+# catalog.py v.20250604.1
+# copyright 2025 John Ackermann N8UR jra@febo.com
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# SQLite catalog of what we have for a measurement: downloaded
+# daily files, weekly archives, CSRS-PPP submissions and the
+# products that came back.  Lives in <measurement_path>/catalog.sqlite
+# and is updated by each stage as it works, so "what's the latest"
+# and "what's missing" are index lookups instead of directory walks.
+# If the catalog is empty it's rebuilt once from the files on disk.
+#
+# Usage: catalog.py -m measurement_path [--rebuild] [--latest]
+#        [--missing first_gps_day end_gps_day]
+
+import os
+import sys
+import glob
+import sqlite3
+import hashlib
+import zipfile
+import argparse
+import threading
+from datetime import datetime
+
+from nrcan_tools import *
+
+CATALOG_FILE = 'catalog.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily (
+    gps_days INTEGER PRIMARY KEY,
+    gps_week INTEGER NOT NULL,
+    gps_dow INTEGER NOT NULL,
+    year INTEGER,
+    doy INTEGER,
+    path TEXT,
+    size INTEGER,
+    added TEXT);
+CREATE INDEX IF NOT EXISTS daily_week ON daily (gps_week);
+CREATE TABLE IF NOT EXISTS weekly (
+    gps_week INTEGER PRIMARY KEY,
+    path TEXT,
+    num_files INTEGER,
+    size INTEGER,
+    added TEXT);
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    gps_week INTEGER,
+    input_path TEXT,
+    keyid TEXT,
+    status TEXT,
+    submitted TEXT,
+    finished TEXT);
+CREATE INDEX IF NOT EXISTS submissions_week ON submissions (gps_week);
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    gps_week INTEGER,
+    base TEXT,
+    tier TEXT,
+    kind TEXT,
+    path TEXT UNIQUE,
+    sha256 TEXT,
+    first_epoch TEXT,
+    last_epoch TEXT,
+    added TEXT);
+CREATE INDEX IF NOT EXISTS products_week_tier ON products (gps_week, tier);
+"""
+
+# gps week from a file name like name__WWWW_... (or None)
+def week_from_name(name):
+    try:
+        return int(os.path.basename(name).partition('__')[2][:4])
+    except ValueError:
+        return None
+
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path,'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def now_iso():
+    return datetime.utcnow().isoformat(timespec='seconds')
+
+class Catalog:
+    def __init__(self, m_path):
+        self.m_path = os.path.abspath(m_path.rstrip('/')) + '/'
+        self.db_path = self.m_path + CATALOG_FILE
+        # stages may run in threads; sqlite objects are shared
+        # between them, one statement at a time
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.db_path, timeout=30,
+            check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    # run one statement in its own transaction
+    def execute(self, sql, params=()):
+        with self.lock, self.db:
+            return self.db.execute(sql, params).fetchall()
+
+    def count(self, table):
+        return self.execute('SELECT COUNT(*) FROM ' + table)[0][0]
+
+    ###### writers ######
+
+    def add_daily(self, gps_week, gps_dow, year, doy, path):
+        size = os.path.getsize(path) if os.path.isfile(path) else None
+        self.execute('INSERT OR REPLACE INTO daily VALUES ' + \
+            '(?,?,?,?,?,?,?,?)', (gps_week * 7 + gps_dow, gps_week,
+            gps_dow, year, doy, path, size, now_iso()))
+
+    def add_weekly(self, gps_week, path, num_files):
+        size = os.path.getsize(path) if os.path.isfile(path) else None
+        self.execute('INSERT OR REPLACE INTO weekly VALUES (?,?,?,?,?)',
+            (gps_week, path, num_files, size, now_iso()))
+
+    # returns the submission id for finish_submission()
+    def add_submission(self, input_path, keyid):
+        with self.lock, self.db:
+            cur = self.db.execute('INSERT INTO submissions ' + \
+                '(gps_week, input_path, keyid, status, submitted) ' + \
+                'VALUES (?,?,?,?,?)', (week_from_name(input_path),
+                input_path, keyid, 'submitted', now_iso()))
+            return cur.lastrowid
+
+    def finish_submission(self, sub_id, status):
+        self.execute('UPDATE submissions SET status = ?, finished = ? ' + \
+            'WHERE id = ?', (status, now_iso(), sub_id))
+
+    # kind is 'zip', 'sum' or 'clk'; tier is final/rapid/ultra
+    def add_product(self, path, tier, kind, first_epoch='', last_epoch=''):
+        base = os.path.basename(path).rsplit('_', 1)[0]
+        self.execute('INSERT OR REPLACE INTO products ' + \
+            '(gps_week, base, tier, kind, path, sha256, first_epoch, ' + \
+            'last_epoch, added) VALUES (?,?,?,?,?,?,?,?,?)',
+            (week_from_name(path), base, tier, kind, path,
+            sha256_file(path), first_epoch, last_epoch, now_iso()))
+
+    ###### queries ######
+
+    # (gps_week, gps_dow, year, doy) of latest daily file, or None
+    def last_daily(self):
+        rows = self.execute('SELECT gps_week, gps_dow, year, doy ' + \
+            'FROM daily ORDER BY gps_days DESC LIMIT 1')
+        return rows[0] if rows else None
+
+    # latest gps week with a weekly file, or None
+    def last_weekly(self):
+        rows = self.execute('SELECT MAX(gps_week) FROM weekly')
+        return rows[0][0]
+
+    # gps days from first through end - 1 with no daily file
+    def missing_days(self, first, end):
+        have = set(r[0] for r in self.execute('SELECT gps_days ' + \
+            'FROM daily WHERE gps_days >= ? AND gps_days < ?',
+            (first, end)))
+        return [d for d in range(first, end) if d not in have]
+
+    # best tier we have a product of 'kind' for in gps_week
+    def best_tier(self, gps_week, kind='clk'):
+        tiers = set(r[0] for r in self.execute('SELECT tier FROM ' + \
+            'products WHERE gps_week = ? AND kind = ?', (gps_week, kind)))
+        for tier in ('final', 'rapid', 'ultra'):
+            if tier in tiers:
+                return tier
+        return None
+
+    ###### one-time import of what's already on disk ######
+
+    def rebuild(self):
+        m = get_measurement_files(self.m_path, 2020, 22)
+        days = 0
+        # daily files still in their weekly download dirs
+        for f in glob.glob(m.dnld_base + m.m_name + '__*_daily/*.obs'):
+            days += self.add_daily_name(f, f)
+        # and ones already zipped up
+        for z in glob.glob(m.dnld_base + m.m_name + '__*daily.zip'):
+            try:
+                with zipfile.ZipFile(z,'r') as zf:
+                    names = zf.namelist()
+            except Exception as e:
+                print("Couldn't read", z + ":", e)
+                continue
+            for name in names:
+                days += self.add_daily_name(name, z)
+        weeks = 0
+        for f in glob.glob(m.weekly_rinex_dir + '*.obs*') + \
+                glob.glob(m.weekly_rinex_dir + 'final/*.obs*'):
+            week = week_from_name(f)
+            if week is not None:
+                self.add_weekly(week, f, None)
+                weeks += 1
+        products = 0
+        for tier in ('final', 'rapid', 'ultra'):
+            for kind in ('zip', 'sum', 'clk'):
+                for f in glob.glob(m.m_path + tier + '/' + kind + '/*'):
+                    self.add_product(f, tier, kind)
+                    products += 1
+        print("Catalog rebuilt:", days, "days,", weeks, "weeks,",
+            products, "products")
+
+    # add a daily file found by name; returns 1 if it was added
+    def add_daily_name(self, name, path):
+        try:
+            gps_week, gps_dow = find_file_week_and_day(name)
+        except ValueError:
+            return 0
+        from gnsscal import gpswd2yrdoy
+        year, doy = gpswd2yrdoy(gps_week, gps_dow)
+        size = os.path.getsize(path) if os.path.isfile(path) else None
+        self.execute('INSERT OR IGNORE INTO daily VALUES ' + \
+            '(?,?,?,?,?,?,?,?)', (gps_week * 7 + gps_dow, gps_week,
+            gps_dow, year, doy, path, size, now_iso()))
+        return 1
+
+# catalogs opened during this run, by measurement path
+catalogs = {}
+
+# return the catalog for a measurement, rebuilding it from the
+# files on disk the first time
+def get_catalog(m_path):
+    key = os.path.abspath(m_path.rstrip('/')) + '/'
+    if key not in catalogs:
+        cat = Catalog(key)
+        if cat.count('daily') == 0 and cat.count('weekly') == 0:
+            cat.rebuild()
+        catalogs[key] = cat
+    return catalogs[key]
+
+def options_catalog():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-m','--measurement_path',
+        type=str,required=True,
+        help="Measurement path")
+    parser.add_argument('--rebuild',
+        action='store_true',
+        help="Re-import files on disk into the catalog")
+    parser.add_argument('--latest',
+        action='store_true',
+        help="Show latest daily and weekly files")
+    parser.add_argument('--missing',
+        type=int,nargs=2,required=False,
+        metavar=('FIRST','END'),
+        help="List missing gps days from FIRST to END - 1")
+
+    args = parser.parse_args()
+    return args
+
+def main():
+    args = options_catalog()
+    cat = get_catalog(args.measurement_path)
+    if args.rebuild:
+        cat.rebuild()
+    if args.latest:
+        print("Latest daily (week, dow, year, doy):", cat.last_daily())
+        print("Latest weekly:", cat.last_weekly())
+    if args.missing:
+        for d in cat.missing_days(args.missing[0], args.missing[1]):
+            print(d, '{:04d}'.format(d // 7), '{:02d}'.format(d % 7))
+
+if __name__ == '__main__':
+    main()
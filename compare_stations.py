@@ -0,0 +1,208 @@
+#!/usr/bin/env -S python3 -u
+
+#################################################
+# compare_stations.py v.20250604.1
+# copyright 2025 John Ackermann N8UR jra@febo.com
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# Compares the PPP clock offsets of two or more receivers.  The
+# phase files are joined on epoch (only epochs every file has are
+# used) and for each pair we get the difference series, statistics
+# over the common epochs, and the ADEV/MDEV/TDEV of the difference.
+#
+# The files are worked through a time window at a time (30 days by
+# default): each window is pulled out of each file with a binary
+# search (query.py), joined with NumPy, and folded into running
+# totals, so memory use depends on the window and not on how many
+# years are being compared.
+#
+# Usage: compare_stations.py phase_file phase_file [...]
+#        [-s start] [-e end] [-w window_days] [-o outdir]
+
+import os
+import sys
+import argparse
+from datetime import timedelta
+from functools import reduce
+
+import numpy as np          # pip3 install numpy
+
+from phase_series import read_phase, guess_tau0, Gridder
+from stability import Accumulator, octave_ms, format_rows
+from query import file_span, to_dt
+
+# window size, days
+WINDOW = 30
+
+# name for a phase file in the output
+def station_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+# (iso strings, doy strings) for an array of unix seconds
+def iso_and_doy(epochs):
+    dt = epochs.astype('datetime64[s]')
+    doy = (dt.astype('datetime64[D]') - \
+        dt.astype('datetime64[Y]').astype('datetime64[D]')).astype(int) + 1
+    return dt.astype(str), np.char.zfill(doy.astype(str), 3)
+
+class PairStats:
+    # running statistics and stability of one difference series
+    def __init__(self, name, tau0, n_grid, outfile=None):
+        self.name = name
+        self.tau0 = tau0
+        self.n = 0
+        self.ref = None     # first value, taken off to keep sums small
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.lo = np.inf
+        self.hi = -np.inf
+        self.gridder = Gridder(tau0)
+        self.acc = Accumulator(octave_ms(n_grid))
+        self.out = None
+        if outfile:
+            self.out = open(outfile,'w')
+            self.out.write('# clock difference ' + name + '\n')
+            self.out.write('# fields: difference (s), iso_8601, doy\n')
+
+    def add(self, epochs, diff):
+        if not len(diff):
+            return
+        if self.ref is None:
+            self.ref = float(diff[0])
+        d = diff - self.ref
+        self.n += len(d)
+        self.total += float(d.sum())
+        self.total_sq += float(np.dot(d, d))
+        self.lo = min(self.lo, float(diff.min()))
+        self.hi = max(self.hi, float(diff.max()))
+        out = self.gridder.add(epochs, diff)
+        if out is not None:
+            self.acc.add(out[1])
+        if self.out:
+            iso, doy = iso_and_doy(epochs)
+            self.out.writelines(['{:+.12f} {} {}\n'.format(x, i, j) \
+                for x, i, j in zip(diff, iso, doy)])
+
+    def close(self):
+        if self.out:
+            self.out.close()
+
+    # dict of mean, std, rms, min, max (seconds) and n
+    def stats(self):
+        if self.n == 0:
+            return {'n': 0}
+        mean = self.total / self.n
+        var = max(self.total_sq / self.n - mean * mean, 0.0)
+        return {'n': self.n, 'mean': mean + self.ref,
+            'std': float(np.sqrt(var)),
+            'rms': float(np.sqrt(var + (mean + self.ref) ** 2)),
+            'min': self.lo, 'max': self.hi}
+
+# (common epochs, [values for each series]) for lists of epoch and
+# value arrays; repeated epochs in a series use the first value
+def join_epochs(epochs, values):
+    uniq = [np.unique(e, return_index=True) for e in epochs]
+    common = reduce(np.intersect1d, [u[0] for u in uniq])
+    joined = []
+    for (e, first), v in zip(uniq, values):
+        joined.append(v[first[np.searchsorted(e, common)]])
+    return common, joined
+
+# compare phase files; returns {pair name: PairStats}
+def compare_stations(paths, start=None, end=None, window=WINDOW,
+        outdir=None, tau0=None):
+    spans = [file_span(p) for p in paths]
+    if any(s[0] is None for s in spans):
+        print("No data in", ', '.join([p for p, s in zip(paths, spans) \
+            if s[0] is None]))
+        return {}
+    # the period every file covers
+    first = max([s[0] for s in spans])
+    last = min([s[1] for s in spans])
+    if start is not None:
+        first = max(first, to_dt(start))
+    if end is not None:
+        last = min(last, to_dt(end) - timedelta(seconds=1))
+    if last < first:
+        print("The files have no time in common")
+        return {}
+    if tau0 is None:
+        tau0 = max([guess_tau0(p) or 1 for p in paths])
+    n_grid = int((last - first).total_seconds() // tau0) + 1
+
+    names = [station_name(p) for p in paths]
+    pairs = {}
+    for i in range(len(paths)):
+        for j in range(i + 1, len(paths)):
+            name = names[i] + '-' + names[j]
+            outfile = os.path.join(outdir, name + '_diff.dat') \
+                if outdir else None
+            pairs[(i, j)] = PairStats(name, tau0, n_grid, outfile)
+
+    ws = first
+    while ws <= last:
+        we = min(ws + timedelta(days=window), last + timedelta(seconds=1))
+        data = [read_phase(p, ws, we) for p in paths]
+        common, joined = join_epochs([d[0] for d in data],
+            [d[1] for d in data])
+        for (i, j), pair in pairs.items():
+            pair.add(common, joined[i] - joined[j])
+        ws = we
+
+    for pair in pairs.values():
+        pair.close()
+    return dict((p.name, p) for p in pairs.values())
+
+def options_compare_stations():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('paths',
+        type=str,nargs='+',
+        help="Two or more phase files")
+    parser.add_argument('-s','--start',
+        type=str,required=False,default=None,
+        help="First epoch (ISO 8601)")
+    parser.add_argument('-e','--end',
+        type=str,required=False,default=None,
+        help="End epoch (ISO 8601, exclusive)")
+    parser.add_argument('-w','--window',
+        type=int,required=False,default=WINDOW,
+        help="Days of data to work on at a time")
+    parser.add_argument('-t','--tau0',
+        type=int,required=False,default=None,
+        help="Sample interval in seconds (default: from the data)")
+    parser.add_argument('-o','--outdir',
+        type=str,required=False,default=None,
+        help="Write the difference series to files here")
+
+    args = parser.parse_args()
+    return args
+
+def main():
+    args = options_compare_stations()
+    if len(args.paths) < 2:
+        print("Need at least two phase files")
+        sys.exit()
+    pairs = compare_stations(args.paths, args.start, args.end,
+        args.window, args.outdir, args.tau0)
+    for name, pair in pairs.items():
+        st = pair.stats()
+        print('#', name + ':', st['n'], 'common epochs')
+        if st['n'] == 0:
+            continue
+        print('# mean {:.4e} s  std {:.4e} s  rms {:.4e} s'.format(
+            st['mean'], st['std'], st['rms']))
+        print('# min {:.4e} s  max {:.4e} s'.format(st['min'], st['max']))
+        sys.stdout.writelines(format_rows(pair.acc.results(pair.tau0)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env -S python3 -u
+
+#################################################
+# date_range.py v.20250604.1
+# copyright 2025 John Ackermann N8UR jra@febo.com
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# Converts whole ranges of GPS days into calendar and GPS week
+# fields in one go, for backfill loops.  A "GPS day" is
+# gps_week * 7 + gps_dow, same as MeasurementFiles.gps_days_num,
+# so ranges run in absolute day order across year boundaries.
+#
+# Usage: date_range.py first_gps_day end_gps_day [measurement_name]
+
+import sys
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np          # pip3 install numpy
+
+# day 0 of GPS week 0
+GPS_EPOCH = np.datetime64('1980-01-06', 'D')
+
+# the fields in a table row, named as in MeasurementFiles
+FIELDS = ('gps_days_num', 'gps_week_num', 'gps_dow_num', 'year_num',
+    'doy_num', 'month_num', 'day_num', 'yyyy_str', 'yy_str', 'doy_str',
+    'mm_str', 'dd_str', 'gps_week_str', 'gps_dow_str', 'daily_dnld_file')
+
+GPSDay = namedtuple('GPSDay', FIELDS)
+
+# zero-padded strings from an integer array
+def zero_pad(nums, width):
+    return np.char.zfill(nums.astype(str), width)
+
+# gps day numbers from calendar year and day of year (scalars
+# or arrays); day of year 1 is January 1
+def yrdoy_to_gps_days(year, doy):
+    year = np.asarray(year)
+    doy = np.asarray(doy)
+    dates = (year - 1970).astype('datetime64[Y]').astype('datetime64[D]') \
+        + (doy - 1).astype('timedelta64[D]')
+    return (dates - GPS_EPOCH).astype(np.int64)
+
+# gps day number of the current UTC date
+def today_gps_days():
+    today = np.datetime64(datetime.utcnow().date(), 'D')
+    return int((today - GPS_EPOCH).astype(np.int64))
+
+# build a table (dict of arrays, keys in FIELDS) for an array
+# of gps day numbers.  m_name is used to make the daily
+# download file names; without it they are empty strings.
+def gps_days_table(days, m_name=''):
+    days = np.asarray(days, dtype=np.int64)
+    dates = GPS_EPOCH + days.astype('timedelta64[D]')
+    years = dates.astype('datetime64[Y]')
+    months = dates.astype('datetime64[M]')
+
+    table = {}
+    table['gps_days_num'] = days
+    table['gps_week_num'] = days // 7
+    table['gps_dow_num'] = days % 7
+    table['year_num'] = years.astype(np.int64) + 1970
+    table['doy_num'] = \
+        (dates - years.astype('datetime64[D]')).astype(np.int64) + 1
+    table['month_num'] = months.astype(np.int64) % 12 + 1
+    table['day_num'] = \
+        (dates - months.astype('datetime64[D]')).astype(np.int64) + 1
+
+    table['yyyy_str'] = zero_pad(table['year_num'], 4)
+    table['yy_str'] = np.char.zfill((table['year_num'] % 100).astype(str), 2)
+    table['doy_str'] = zero_pad(table['doy_num'], 3)
+    table['mm_str'] = zero_pad(table['month_num'], 2)
+    table['dd_str'] = zero_pad(table['day_num'], 2)
+    table['gps_week_str'] = zero_pad(table['gps_week_num'], 4)
+    table['gps_dow_str'] = zero_pad(table['gps_dow_num'], 2)
+
+    # same as MeasurementFiles.daily_dnld_file
+    if m_name:
+        names = np.char.add(m_name + '__', table['gps_week_str'])
+        names = np.char.add(names, '_')
+        names = np.char.add(names, table['gps_dow_str'])
+        table['daily_dnld_file'] = np.char.add(names, '.obs')
+    else:
+        table['daily_dnld_file'] = np.full(len(days), '')
+    return table
+
+# table for gps days first through end - 1 (like range())
+def gps_days_range(first, end, m_name=''):
+    return gps_days_table(np.arange(int(first), int(end)), m_name)
+
+# table for calendar dates; either end may be in a different year
+def yrdoy_range(first_year, first_doy, end_year, end_doy, m_name=''):
+    first = int(yrdoy_to_gps_days(first_year, first_doy))
+    end = int(yrdoy_to_gps_days(end_year, end_doy))
+    return gps_days_range(first, end, m_name)
+
+# walk a table one day at a time, in gps day order, as GPSDay
+# tuples holding plain ints and strings
+def iter_gps_days(table):
+    order = np.argsort(table['gps_days_num'], kind='stable')
+    columns = [table[f][order].tolist() for f in FIELDS]
+    for row in zip(*columns):
+        yield GPSDay(*row)
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: date_range.py first_gps_day end_gps_day [name]")
+        sys.exit()
+    m_name = sys.argv[3] if len(sys.argv) > 3 else ''
+    table = gps_days_range(sys.argv[1], sys.argv[2], m_name)
+    for day in iter_gps_days(table):
+        print(day.gps_days_num, day.gps_week_str, day.gps_dow_str,
+            day.yyyy_str, day.doy_str, day.mm_str, day.dd_str,
+            day.daily_dnld_file)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+#!/usr/bin/env -S python3 -u
+
+#################################################
+# freq_drift.py v.20250604.1
+# copyright 2025 John Ackermann N8UR jra@febo.com
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# Frequency offset and drift of a clock from its phase, kept up to
+# date without rereading the history.  We fit
+#
+#     x(t) = offset + freq * t + drift * t^2 / 2
+#
+# by least squares, but only keep the sums the fit needs
+# (sum of t^k for k = 0..4, of t^k * x for k = 0..2, and of x^2),
+# one set per UTC day, in a small JSON state file.  New epochs just
+# add to their day's sums; a fit over any window of days adds up
+# those days (shifting each to a common time origin) and solves a
+# 3x3 system, so each update is O(new data) and each report is
+# O(days in the window).
+#
+# There's one state file per phase file, so per station and tier;
+# by default it's a hidden file next to the phase file.
+#
+# Usage: freq_drift.py phase_file [-d state_file] [-w days,days...]
+#        [--rebuild]
+
+import os
+import sys
+import json
+import argparse
+from math import comb
+
+import numpy as np          # pip3 install numpy
+
+from phase_series import read_chunks
+
+# report windows, days (0 means all the data)
+WINDOWS = (7, 30, 365, 0)
+
+# number of sums kept per day: t^0..t^4, t^0*x..t^2*x, x^2
+NSUMS = 9
+
+STATE_VERSION = 1
+
+# default state file for a phase file
+def state_path(phase_path):
+    return os.path.join(os.path.dirname(os.path.abspath(phase_path)),
+        '.' + os.path.basename(phase_path) + '.drift.json')
+
+class DriftEstimator:
+    def __init__(self):
+        self.last = None    # unix time of the last epoch added
+        self.x0 = None      # first offset seen; x is kept relative to it
+        self.days = {}      # unix day -> list of NSUMS sums, t in days
+                            # from the start of that day
+
+    # add one sample (unix seconds, offset in seconds); samples not
+    # later than the last one added are ignored.  Returns True if used.
+    def add(self, ts, x):
+        if self.last is not None and ts <= self.last:
+            return False
+        if self.x0 is None:
+            self.x0 = float(x)
+        x -= self.x0
+        day, sec = divmod(int(ts), 86400)
+        t = sec / 86400.0
+        s = self.days.get(day)
+        if s is None:
+            s = self.days[day] = [0.0] * NSUMS
+        t2 = t * t
+        s[0] += 1
+        s[1] += t
+        s[2] += t2
+        s[3] += t2 * t
+        s[4] += t2 * t2
+        s[5] += x
+        s[6] += t * x
+        s[7] += t2 * x
+        s[8] += x * x
+        self.last = int(ts)
+        return True
+
+    # same for arrays (sorted by time), done with NumPy
+    def add_arrays(self, ts, x):
+        ts = np.asarray(ts, dtype=np.int64)
+        x = np.asarray(x, dtype=float)
+        if self.last is not None:
+            keep = ts > self.last
+            ts = ts[keep]
+            x = x[keep]
+        if not len(ts):
+            return 0
+        if self.x0 is None:
+            self.x0 = float(x[0])
+        x = x - self.x0
+        day, sec = np.divmod(ts, 86400)
+        t = sec / 86400.0
+        uniq, inv = np.unique(day, return_inverse=True)
+        cols = (np.ones_like(t), t, t**2, t**3, t**4, x, t * x, t**2 * x,
+            x * x)
+        sums = [np.bincount(inv, weights=c, minlength=len(uniq)) \
+            for c in cols]
+        for i, d in enumerate(uniq):
+            s = self.days.setdefault(int(d), [0.0] * NSUMS)
+            for k in range(NSUMS):
+                s[k] += float(sums[k][i])
+        self.last = int(ts[-1])
+        return len(ts)
+
+    # least-squares fit over days first_day <= day < end_day.
+    # Returns a dict with n, days, offset (s, at the end of the
+    # window), freq (fractional, at the end) and drift (fractional
+    # per day), and rms residual (s); None if too little data.
+    def fit(self, first_day, end_day):
+        span = float(end_day - first_day)
+        # moments in u = (time - end of window) / span, so u runs
+        # from -1 to 0 and the system is well scaled
+        T = [0.0] * 5
+        X = [0.0] * 3
+        n = 0
+        xx = 0.0
+        for day, s in self.days.items():
+            if day < first_day or day >= end_day:
+                continue
+            shift = (day - end_day) / span
+            scale = [1.0 / span ** j for j in range(5)]
+            for k in range(5):
+                T[k] += sum(comb(k, j) * shift ** (k - j) * s[j] * scale[j] \
+                    for j in range(k + 1))
+            for k in range(3):
+                X[k] += sum(comb(k, j) * shift ** (k - j) * s[5 + j] * \
+                    scale[j] for j in range(k + 1))
+            n += s[0]
+            xx += s[8]
+        if n < 3:
+            return None
+        c = (1.0, 1.0, 2.0)     # x = p0 + p1 u + p2 u^2 / 2
+        N = np.array([[T[i + j] / (c[i] * c[j]) for j in range(3)] \
+            for i in range(3)])
+        rhs = np.array([X[i] / c[i] for i in range(3)])
+        p, res, rank, sv = np.linalg.lstsq(N, rhs, rcond=None)
+        rss = max(xx - float(np.dot(p, rhs)), 0.0)
+        return {'n': int(n), 'days': int(end_day - first_day),
+            'offset': float(p[0]) + self.x0,
+            'freq': float(p[1]) / span / 86400.0,
+            'drift': float(p[2]) / span / span / 86400.0,
+            'rms': float(np.sqrt(rss / n))}
+
+    # fits ending at the last day with data, for each window in days
+    # (0 = everything)
+    def report(self, windows=WINDOWS):
+        if not self.days:
+            return []
+        end = max(self.days) + 1
+        first = min(self.days)
+        out = []
+        for w in windows:
+            r = self.fit(first if w == 0 else max(end - w, first), end)
+            if r is not None:
+                r['window'] = w
+                out.append(r)
+        return out
+
+    def to_dict(self):
+        return {'version': STATE_VERSION, 'last': self.last, 'x0': self.x0,
+            'days': dict((str(d), s) for d, s in self.days.items())}
+
+    @classmethod
+    def from_dict(cls, d):
+        est = cls()
+        if d.get('version') == STATE_VERSION:
+            est.last = d['last']
+            est.x0 = d['x0']
+            est.days = dict((int(k), v) for k, v in d['days'].items())
+        return est
+
+def load_state(path):
+    try:
+        with open(path,'r') as f:
+            return DriftEstimator.from_dict(json.load(f))
+    except (OSError, ValueError, KeyError):
+        return DriftEstimator()
+
+def save_state(path, est):
+    tmp = path + '.tmp'
+    with open(tmp,'w') as f:
+        json.dump(est.to_dict(), f, separators=(',', ':'))
+    os.replace(tmp, path)
+
+def format_report(rows):
+    lines = ['# window_days n offset_s freq drift_per_day rms_s\n']
+    for r in rows:
+        lines.append('{} {:d} {:+.6e} {:+.6e} {:+.6e} {:.4e}\n'.format(
+            r['window'] or 'all', r['n'], r['offset'], r['freq'],
+            r['drift'], r['rms']))
+    return lines
+
+# bring a phase file's state up to date, reading only the epochs
+# after the last one already in it; returns the estimator
+def update_from_phase(phase_path, state=None, rebuild=False):
+    state = state or state_path(phase_path)
+    est = DriftEstimator() if rebuild else load_state(state)
+    start = None
+    if est.last is not None:
+        start = np.datetime64(est.last + 1, 's').astype(object)
+    n = 0
+    for epochs, offsets in read_chunks(phase_path, start):
+        n += est.add_arrays(epochs, offsets)
+    save_state(state, est)
+    print("freq_drift.py:", n, "new epochs from", \
+        os.path.basename(phase_path))
+    return est
+
+def options_freq_drift():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('path',
+        type=str,
+        help="Phase file")
+    parser.add_argument('-d','--drift_state',
+        type=str,required=False,default=None,
+        help="State file (default: hidden file next to phase file)")
+    parser.add_argument('-w','--windows',
+        type=str,required=False,default='7,30,365,0',
+        help="Comma separated report windows in days, 0 for all")
+    parser.add_argument('--rebuild',
+        action='store_true',
+        help="Start the state over from the whole phase file")
+
+    args = parser.parse_args()
+    return args
+
+def main():
+    args = options_freq_drift()
+    est = update_from_phase(args.path, args.drift_state, args.rebuild)
+    windows = [int(w) for w in args.windows.split(',')]
+    sys.stdout.writelines(format_report(est.report(windows)))
+
+if __name__ == '__main__':
+    main()
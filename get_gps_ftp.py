@@ -20,12 +20,12 @@ import subprocess
 import tempfile
 import argparse
 import datetime as dt
-from ftplib import FTP
-from ftplib import all_errors as ftp_errors
-from gnsscal import *       # pip3 install gnsscal
 
 # functions are included here
 from nrcan_tools import *
+from make_weekly_rinex import append_daily_to_weekly
+from catalog import get_catalog
+from metrics import Stage, day_label, file_size
 
 def options_get_gps_ftp():
     parser = argparse.ArgumentParser()
@@ -38,7 +38,7 @@ def options_get_gps_ftp():
         help="GPS Receiver type (mosaic || netrs)")
     parser.add_argument('-f','--fqdn',
         type=str,required=True,
-        help="FQDN of receiver")
+        help="FQDN of receiver (host or host:port)")
     parser.add_argument('-s','--station',
         type=str,required=True,
         help="Receiver station name")
@@ -90,21 +90,88 @@ def convert_T00(infile,outfile):
     os.unlink(tmpfile.name)
     return True
 
+# open an anonymous FTP connection to a receiver.  fqdn may be
+# host:port, for a receiver (or benchmarks/ftp_sim.py) that isn't
+# on port 21; an IPv6 address with a port goes in brackets,
+# [addr]:port
+def ftp_connect(fqdn, timeout=None):
+    from ftplib import FTP
+    host, port = fqdn, 0
+    if fqdn.startswith('['):
+        host, sep, rest = fqdn[1:].partition(']')
+        if rest.startswith(':'):
+            port = int(rest[1:])
+    elif fqdn.count(':') == 1:
+        host, port = fqdn.split(':')
+        port = int(port)
+    ftp = FTP(timeout=timeout)
+    ftp.connect(host, port)
+    ftp.login('anonymous')
+    return ftp
+
+# fetch dirname/filename over an open FTP connection into the open
+# file dnld_file; returns the server's response, or None if it
+# couldn't be had
+def ftp_download(ftp, gps_dirname, gps_filename, dnld_file):
+    from ftplib import all_errors as ftp_errors
+    #print("getting ", gps_dirname, gps_filename,sep='')
+    try:
+        ftp.cwd(gps_dirname)
+    except ftp_errors as e:
+        print("Couldn't change remote directory:")
+        print(e)
+        return None
+    # we're downloading in binary mode whether ascii or .T00 format
+    try:
+        response = ftp.retrbinary('RETR ' + gps_filename, \
+            dnld_file.write, 1024)
+    except ftp_errors as e:
+        print("Couldn't download:")
+        print(e)
+        return None
+    dnld_file.flush()
+    # Check the response code
+    if not response.startswith('226'):  # Transfer complete
+        print("Transfer error. File may be incomplete or corrupt.")
+    return response
+
 ####################################################################
 # main function
 # rx_type = the rx type -- "mosaic" or "netrs"
 # fqdn = FQDN of rx hostname
 # station_ID = station name (used in GPS filenames)
 # measurement_path is where files go
+# ftp is an optional open ftplib.FTP connection to the receiver
+# to use instead of opening a new one (see nrcan_daemon.py)
+#
+# The work is in two steps, download_day() (network) and
+# convert_day() (disk and CPU), so task_graph.py can overlap them
+# across days; get_gps_ftp() just does one after the other.
 
 def get_gps_ftp(measurement_path, rx_type, fqdn, \
-        station, year, doy):
+        station, year, doy, ftp=None):
     print("get_gps_ftp.py:")    # id for logging
+    got = download_day(measurement_path, rx_type, fqdn, station, \
+        year, doy, ftp)
+    if got is None:
+        return
+    convert_day(*got)
+
+    try:
+        running_standalone
+    except NameError:
+        return
+
+# download one day's file from the receiver to a temporary file.
+# Returns (m, rx_type, tmp_path, gps_filename) for convert_day(),
+# or None if there's nothing to convert
+def download_day(measurement_path, rx_type, fqdn, \
+        station, year, doy, ftp=None):
     os.umask(0o002)        # o-w
     
     # first convert year and doy to gps week and dow
 
-    m = MeasurementFiles(measurement_path, year, doy)
+    m = get_measurement_files(measurement_path, year, doy)
 
     print("Year, day of year, GPS week, GPS day of week:", \
         year, doy, m.gps_week_str, m.gps_dow_str)
@@ -115,6 +182,16 @@ def get_gps_ftp(measurement_path, rx_type, fqdn, \
         print("Today is:",m.today_gps_week_str,m.today_gps_dow_str)
         sys.exit()
 
+    # a day get_gps_incr.py has finished is in place, and one it's
+    # still building will be when the day is over
+    from get_gps_incr import day_complete, day_in_progress
+    if day_complete(m):
+        print("Day already built by get_gps_incr.py")
+        return None
+    if day_in_progress(m):
+        print("Day still being built by get_gps_incr.py")
+        return None
+
     # receiver-specific variables
     if rx_type == 'mosaic':
         gps_dirname = "DSK1/SSN/GRB0051/" + m.yy_str + m.doy_str + "/"
@@ -123,7 +200,7 @@ def get_gps_ftp(measurement_path, rx_type, fqdn, \
             dnld_file = tempfile.NamedTemporaryFile(suffix='.obs',delete=False)
         except:
             print("Couldn't create tempfile.  Exiting!")
-            return
+            return None
     elif rx_type == 'netrs':
         gps_dirname =  m.yyyy_str + m.mm_str + "/"
         gps_filename = station + m.yyyy_str + m.mm_str + \
@@ -132,89 +209,107 @@ def get_gps_ftp(measurement_path, rx_type, fqdn, \
             dnld_file = tempfile.NamedTemporaryFile(suffix='.T00',delete=False)
         except:
             print("Couldn't create tempfile.  Exiting!")
-            return
+            return None
     else:
         print("Invalid rx_type.  Specify 'mosaic' or 'netrs'")
-        return
+        return None
 
-    # now get the file
-    with FTP(fqdn, 'anonymous') as ftp:
-        #print("getting ", gps_dirname, gps_filename,sep='')
-        try:
-            ftp.cwd(gps_dirname)
-        except ftp_errors as e:
-            print("Couldn't change remote directory:")
-            print(e)
-            return
-        # we're downloading in binary mode whether ascii or .T00 format
+    # now get the file, on our own connection or one we were handed
+    # (which may already be somewhere else on the receiver)
+    with Stage('ftp', m.m_name, day_label(m)) as st:
         try:
-            response = ftp.retrbinary('RETR ' + gps_filename, \
-                dnld_file.write, 1024)
-        except ftp_errors as e:
-            print("Couldn't download:")
-            print(e)
-            return
-        # rewind tmpfile
-        dnld_file.seek(0)
-        # Check the response code
-        if response.startswith('226'):  # Transfer complete
-            if rx_type != "mosaic":
-                print("Downloaded",gps_filename)
-        else:
-            print("Transfer error. File may be incomplete or corrupt.")
+            if ftp is not None:
+                response = ftp_download(ftp, '/' + gps_dirname, \
+                    gps_filename, dnld_file)
+            # a connection we were handed may have gone stale while
+            # it sat idle; try once more on a new one
+            if ftp is None or response is None:
+                if ftp is not None:
+                    print("Retrying on a new connection")
+                    dnld_file.seek(0)
+                    dnld_file.truncate()
+                with ftp_connect(fqdn) as conn:
+                    response = ftp_download(conn, gps_dirname, \
+                        gps_filename, dnld_file)
+        except BaseException:
+            dnld_file.close()
+            os.remove(dnld_file.name)
+            raise
+        dnld_file.close()
+        st.done('ok' if response is not None else 'failed',
+            bytes=file_size(dnld_file.name))
+    if response is None:
+        os.remove(dnld_file.name)
+        return None
+    if response.startswith('226') and rx_type != "mosaic":
+        print("Downloaded",gps_filename)
 
     # was there any data downloaded?
-    tmpsize = os.path.getsize(dnld_file.name)
-    if tmpsize > 0:
-        m.make_daily_dnld_dir()
+    if os.path.getsize(dnld_file.name) == 0:
+        os.remove(dnld_file.name)
+        print("Downloaded file was empty.  Exiting:")
+        return None
+    return m, rx_type, dnld_file.name, gps_filename
+
+# turn a downloaded file into the day's RINEX file, add it to the
+# week's partial file and the catalog, and remove the temporary
+# file.  Returns the daily RINEX path.
+def convert_day(m, rx_type, tmp_path, gps_filename):
+    m.make_daily_dnld_dir()
+    with Stage('convert', m.m_name, day_label(m)) as st:
         if rx_type == 'netrs':
-            if convert_T00(dnld_file.name, m.daily_dnld_path) == True:
+            if convert_T00(tmp_path, m.daily_dnld_path) == True:
                 print("Downloaded",gps_filename,"and converted to RINEX")
+                st.done(bytes=file_size(m.daily_dnld_path))
             else:
                 print("Downloaded",gps_filename,
                     "but couldn't convert to RINEX!")
-             
+                st.done('failed')
+         
         elif rx_type == 'mosaic':
             print("Downloaded", gps_filename)
-            shutil.copy(dnld_file.name,m.daily_dnld_path)
-        s = m.daily_dnld_path.split('/')
-        s = s[len(s)-2] + '/' + s[len(s)-1]
-        size = os.path.getsize(m.daily_dnld_path)
-        print("Saved as " + s + " (" + format_filesize(size) + ")")
-    else:
-        os.remove(dnld_file.name)
-        print("Downloaded file was empty.  Exiting:")
-        return
-
-    os.remove(dnld_file.name)
-
+            shutil.copy(tmp_path,m.daily_dnld_path)
+            st.done(bytes=file_size(m.daily_dnld_path))
+    os.remove(tmp_path)
+    s = m.daily_dnld_path.split('/')
+    s = s[len(s)-2] + '/' + s[len(s)-1]
+    size = os.path.getsize(m.daily_dnld_path)
+    print("Saved as " + s + " (" + format_filesize(size) + ")")
+    # build the week's file as we go so weekly day has less to do
     try:
-        running_standalone
-    except NameError:
-        return
+        append_daily_to_weekly(m)
+    except Exception as e:
+        print("Couldn't append to partial weekly file:",e)
+    try:
+        get_catalog(m.m_path).add_daily(m.gps_week_num, \
+            m.gps_dow_num, m.year_num, m.doy_num, m.daily_dnld_path)
+    except Exception as e:
+        print("Couldn't add day to catalog:",e)
+    return m.daily_dnld_path
 
-if __name__ == '__main__':
+def main():
+    global running_standalone
     running_standalone = True
     args = options_get_gps_ftp()
 
     # process all from day after last until today
     if args.all_new == True:
+        from date_range import gps_days_range, iter_gps_days, \
+            today_gps_days
         print("Downloading all new RINEX files")
         # get the last day that's been downloaded
         last_week,last_dow,last_year,last_doy = \
             find_last_daily_rinex(args.measurement_path)
-        # so we don't run into the future
-        now = datetime.utcnow()
-        today_doy = int(now.strftime('%j'))
-        for x in range(last_doy + 1,today_doy):
+        # walk gps days so we cross year boundaries properly;
+        # stop at yesterday so we don't run into the future
+        first = int(last_week) * 7 + int(last_dow) + 1
+        for day in iter_gps_days(gps_days_range(first, today_gps_days())):
             get_gps_ftp(args.measurement_path, args.rx_type, \
-                args.fqdn, args.station, args.year, x)
-            # don't go into the future
-            if x > today_doy:
-                break
+                args.fqdn, args.station, day.year_num, day.doy_num)
     else:       # just get specified date
-        if x > day_of_year:
-            sys.exit()
         get_gps_ftp(args.measurement_path, args.rx_type, \
             args.fqdn, args.station, args.year, args.day_of_year)
     sys.exit()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,395 @@
+#!/usr/bin/env -S python3 -u
+
+#################################################
+# get_gps_incr.py v.20250604.1
+# copyright 2025 John Ackermann N8UR jra@febo.com
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# Builds the day's RINEX file as the day goes, instead of fetching
+# the whole day after midnight.  Run it every few minutes (from a
+# timer, or nrcan_daemon.py -n); each run:
+#
+#   - lists the day's files on the receiver (the day's file as it
+#     is being written, and any hourly session files)
+#   - fetches only the bytes past what it already has of each one
+#     (FTP REST), into a local copy under download/incremental/
+#   - appends the epochs after the last one it wrote to the day's
+#     RINEX file, a whole epoch block at a time.  The file is built
+#     under download/incremental/ and only moved into the daily
+#     directory (download/<name>__<week>_daily/) once the day is
+#     over, so nothing there ever holds part of a day.
+#
+# Mosaic files are RINEX already, so only the new part of each is
+# read.  NetRS .T00 files are converted again from the local copy
+# each time (runpkr00 can't start part way through), but still only
+# the new bytes come over the network.
+#
+# What's been fetched and written is kept in a small JSON file per
+# day.  Once a day is over (plus FINAL_DELAY), the last bytes are
+# fetched, the day goes into the week's partial file and the
+# catalog just as get_gps_ftp.py would do it, and the local copies
+# are removed; get_gps_ftp.py then leaves that day alone.
+#
+# With no date, polls today and, until it's finished, yesterday.
+#
+# Usage: get_gps_incr.py -m measurement_path -r rx_type -f fqdn
+#        -s station [-y year -d doy]
+
+import os
+import sys
+import json
+import tempfile
+import argparse
+from datetime import datetime, timedelta
+
+from nrcan_tools import *
+from rinex import read_rinex_header, num_obs_types, iter_epochs, \
+    header_interval
+from metrics import Stage, day_label, file_size
+
+# seconds after the end of a day before its files are taken to be
+# complete
+FINAL_DELAY = 900
+
+def options_get_gps_incr():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-m','--measurement_path',
+        type=str,required=True,
+        help="Measurement path")
+    parser.add_argument('-r','--rx_type',
+        type=str,required=True,
+        help="GPS Receiver type (mosaic || netrs)")
+    parser.add_argument('-f','--fqdn',
+        type=str,required=True,
+        help="FQDN of receiver (host or host:port)")
+    parser.add_argument('-s','--station',
+        type=str,required=True,
+        help="Receiver station name")
+    parser.add_argument('-y','--year',
+        type=int,required=False,default=0,
+        help="Year to process (default: today and yesterday)")
+    parser.add_argument('-d','--day_of_year',
+        type=int,required=False,default=0,
+        help="Day of year to process")
+
+    args = parser.parse_args()
+    return args
+
+def new_state():
+    return {'files': {}, 'last_epoch': '', 'epochs': 0, 'complete': False}
+
+def read_state(path):
+    try:
+        with open(path,'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return new_state()
+
+def write_state(path, state):
+    tmp = path + '.tmp'
+    with open(tmp,'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+# True if get_gps_incr has finished the day of m
+def day_complete(m):
+    if not os.path.isfile(m.daily_incr_state):
+        return False
+    return read_state(m.daily_incr_state).get('complete', False)
+
+# True if get_gps_incr is part way through building the day of m
+def day_in_progress(m):
+    return os.path.isfile(m.daily_incr_path) and not day_complete(m)
+
+# remote directory for the day of m and the names of the day's
+# files in it, in order
+def remote_files(ftp, rx_type, station, m):
+    from ftplib import error_perm
+    if rx_type == 'mosaic':
+        dirname = "/DSK1/SSN/GRB0051/" + m.yy_str + m.doy_str + "/"
+        prefix = station + m.doy_str
+        suffix = "." + m.yy_str + "o"
+    else:
+        dirname = "/" + m.yyyy_str + m.mm_str + "/"
+        prefix = station + m.yyyy_str + m.mm_str + m.dd_str
+        suffix = ".T00"
+    try:
+        ftp.cwd(dirname)
+        names = [os.path.basename(n) for n in ftp.nlst()]
+    except error_perm:
+        # nothing logged yet
+        return dirname, []
+    return dirname, sorted([n for n in names \
+        if n.startswith(prefix) and n.endswith(suffix)])
+
+# bring the local copy of remote file name up to the size of the
+# remote one, fetching only the bytes past entry['offset'].  A
+# transfer cut off part way keeps what arrived, and the next run
+# carries on from there.  Returns the number of bytes fetched.
+def fetch_new_bytes(ftp, name, local, entry):
+    from ftplib import error_temp
+    ftp.voidcmd('TYPE I')
+    size = ftp.size(name)
+    if size is None or size == entry['offset']:
+        return 0
+    if size < entry['offset']:
+        # not the file we had; start it again
+        print(name, "is smaller than before; fetching it again")
+        entry['offset'] = 0
+        entry['parsed'] = 0
+    start = entry['offset']
+    with open(local,'ab') as f:
+        f.truncate(start)
+        try:
+            ftp.retrbinary('RETR ' + name, f.write, 65536,
+                rest=start or None)
+        except (error_temp, OSError, EOFError) as e:
+            print(name, "cut off after", f.tell() - start, "bytes:", e)
+        finally:
+            f.flush()
+            entry['offset'] = f.tell()
+    return entry['offset'] - start
+
+# (header lines, header size in bytes) of a local RINEX file, or
+# (None, 0) if the header isn't all there yet
+def local_header(path):
+    with open(path,'r', encoding='latin-1', newline='') as f:
+        header = read_rinex_header(f)
+    if not header or 'END OF HEADER' not in header[-1]:
+        return None, 0
+    return header, sum([len(l) for l in header])
+
+# whole epoch blocks in a local RINEX file from byte start on;
+# yields (dt, flag, lines, end) where end is the byte offset just
+# past the block.  A block (or line) not all there yet is left for
+# the next run.
+def new_epochs(path, start, n_types):
+    with open(path,'r', encoding='latin-1', newline='') as f:
+        f.seek(start)
+        pos = [start]
+        def whole_lines():
+            for line in f:
+                if not line.endswith('\n'):
+                    return
+                pos[0] += len(line)
+                yield line
+        for dt, flag, lines in iter_epochs(whole_lines(), n_types):
+            yield dt, flag, lines, pos[0]
+
+# last epoch in a RINEX file, or None
+def last_epoch(path):
+    last = None
+    with open(path,'r', errors='replace') as f:
+        n_types = num_obs_types(read_rinex_header(f))
+        for dt, flag, lines in iter_epochs(f, n_types):
+            last = dt
+    return last
+
+# True if the RINEX file at path has data up to the end of the day
+# of m (its last epoch within one sample interval of midnight)
+def reaches_day_end(m, path):
+    with open(path,'r', errors='replace') as f:
+        interval = header_interval(read_rinex_header(f)) or 30
+    last = last_epoch(path)
+    return last is not None and \
+        last + timedelta(seconds=interval) >= m.dt + timedelta(days=1)
+
+# append blocks after state['last_epoch'] from a local RINEX copy to
+# the day's file being built, starting at byte 'start' of the copy
+# (the header is written first if the file is new).  Returns (epochs
+# written, byte offset read up to).
+def append_new(m, state, path, start):
+    header, size = local_header(path)
+    if header is None:
+        return 0, 0
+    n_types = num_obs_types(header)
+    after = make_dt_from_iso(state['last_epoch']) \
+        if state['last_epoch'] else None
+    written = 0
+    end = max(start, size)
+    new_file = not os.path.isfile(m.daily_incr_path)
+    with open(m.daily_incr_path,'a', encoding='latin-1', newline='') as outp:
+        if new_file:
+            outp.writelines(header)
+        for dt, flag, lines, end in new_epochs(path, max(start, size),
+                n_types):
+            if after is not None and dt <= after:
+                continue
+            outp.writelines(lines)
+            if flag in (0, 1):
+                after = dt
+                written += 1
+    if after is not None:
+        state['last_epoch'] = make_iso_from_dt(after)
+    state['epochs'] += written
+    return written, end
+
+# the day's files are all in; move the day's file into place, do
+# what get_gps_ftp.py does with a downloaded day and remove the
+# local copies.  If a whole-day file is already in place (the
+# daily run got there first) ours is dropped; a part-day one is
+# replaced, and taken back out of the week's partial file.  Safe
+# to repeat.
+def finish_day(m, state, files):
+    from make_weekly_rinex import append_daily_to_weekly, \
+        invalidate_partial_day
+    from catalog import get_catalog
+    m.make_daily_dnld_dir()
+    if os.path.isfile(m.daily_incr_path):
+        if not os.path.isfile(m.daily_dnld_path):
+            os.replace(m.daily_incr_path, m.daily_dnld_path)
+        elif reaches_day_end(m, m.daily_dnld_path):
+            print("Day", day_label(m), "already in place; using that file")
+            os.remove(m.daily_incr_path)
+        else:
+            print("Replacing part-day file for", day_label(m))
+            invalidate_partial_day(m)
+            os.replace(m.daily_incr_path, m.daily_dnld_path)
+    print("Day", day_label(m), "complete:", state['epochs'], "epochs")
+    try:
+        append_daily_to_weekly(m)
+    except Exception as e:
+        print("Couldn't append to partial weekly file:",e)
+    try:
+        get_catalog(m.m_path).add_daily(m.gps_week_num, \
+            m.gps_dow_num, m.year_num, m.doy_num, m.daily_dnld_path)
+    except Exception as e:
+        print("Couldn't add day to catalog:",e)
+    for name in files:
+        try:
+            os.remove(m.daily_incr_dir + name)
+        except FileNotFoundError:
+            pass
+    state['complete'] = True
+
+# poll the receiver once for one day; returns the number of epochs
+# added to the day's file.  ftp is an optional open connection.
+def poll_day(measurement_path, rx_type, fqdn, station, year, doy,
+        ftp=None):
+    from get_gps_ftp import ftp_connect, convert_T00
+    from ftplib import all_errors as ftp_errors
+    os.umask(0o002)     # o-w
+    m = get_measurement_files(measurement_path, year, doy)
+    if rx_type not in ('mosaic', 'netrs'):
+        print("Invalid rx_type.  Specify 'mosaic' or 'netrs'")
+        return 0
+    state = read_state(m.daily_incr_state)
+    if state['complete']:
+        return 0
+    day_over = datetime.utcnow() >= m.dt + timedelta(days=1,
+        seconds=FINAL_DELAY)
+    # finish up if the day's file is in place and is the whole day:
+    # ours, moved there by a finish_day() that was cut short, or the
+    # daily run's once the day is over and it runs to midnight.  A
+    # part-day file from the daily run is replaced by ours at the end.
+    if os.path.isfile(m.daily_dnld_path) and \
+            ((state['epochs'] > 0 and not os.path.isfile(m.daily_incr_path))
+            or (day_over and reaches_day_end(m, m.daily_dnld_path))):
+        finish_day(m, state, list(state['files']))
+        write_state(m.daily_incr_state, state)
+        return 0
+    # if our file isn't as we left it (a run stopped between writing
+    # and saving the state), carry on from what's in it
+    size = file_size(m.daily_incr_path)
+    if size != state.get('size'):
+        last = last_epoch(m.daily_incr_path) if size else None
+        state['last_epoch'] = make_iso_from_dt(last) if last else ''
+    os.makedirs(m.daily_incr_dir, exist_ok=True)
+
+    st = Stage('ftp_incr', m.m_name, day_label(m))
+    fetched = 0
+    written = 0
+    conn = ftp
+    try:
+        if conn is None:
+            conn = ftp_connect(fqdn, timeout=60)
+        dirname, names = remote_files(conn, rx_type, station, m)
+        for name in names:
+            entry = state['files'].setdefault(name,
+                {'offset': 0, 'parsed': 0})
+            local = m.daily_incr_dir + name
+            if not os.path.isfile(local):
+                entry['offset'] = 0
+                entry['parsed'] = 0
+            try:
+                n = fetch_new_bytes(conn, name, local, entry)
+            finally:
+                write_state(m.daily_incr_state, state)
+            fetched += n
+            if n == 0 and entry['parsed'] == entry['offset']:
+                continue
+            if rx_type == 'mosaic':
+                w, entry['parsed'] = append_new(m, state, local,
+                    entry['parsed'])
+            else:
+                tmp = tempfile.NamedTemporaryFile(suffix='.obs',
+                    delete=False)
+                tmp.close()
+                try:
+                    w = 0
+                    if convert_T00(local, tmp.name) == True:
+                        w, junk = append_new(m, state, tmp.name, 0)
+                    entry['parsed'] = entry['offset']
+                finally:
+                    os.remove(tmp.name)
+            written += w
+            write_state(m.daily_incr_state, state)
+    except ftp_errors as e:
+        print("FTP error polling", fqdn + ":", e)
+        st.done('failed', fetched, written)
+        state['size'] = file_size(m.daily_incr_path)
+        write_state(m.daily_incr_state, state)
+        return written
+    except BaseException:
+        st.done('failed', fetched, written)
+        raise
+    finally:
+        if ftp is None and conn is not None:
+            try:
+                conn.quit()
+            except Exception:
+                conn.close()
+    print(day_label(m) + ":", fetched, "new bytes,", written,
+        "new epochs, last", state['last_epoch'] or 'none')
+    st.done(bytes=fetched, records=written)
+
+    state['size'] = file_size(m.daily_incr_path)
+    if day_over and state['epochs'] > 0:
+        finish_day(m, state, state['files'])
+    write_state(m.daily_incr_state, state)
+    return written
+
+# poll today and, until it's finished, yesterday (or just the day
+# given); returns the number of epochs added
+def get_gps_incr(measurement_path, rx_type, fqdn, station, year=0, doy=0,
+        ftp=None):
+    print("get_gps_incr.py:")
+    if year and doy:
+        days = [(year, doy)]
+    else:
+        m = get_measurement_files(measurement_path, 'today')
+        days = [(m.yesterday_year_num, m.yesterday_doy_num),
+            (m.today_year_num, m.today_doy_num)]
+    written = 0
+    for y, d in days:
+        written += poll_day(measurement_path, rx_type, fqdn, station, y, d,
+            ftp)
+    return written
+
+def main():
+    args = options_get_gps_incr()
+    get_gps_incr(args.measurement_path, args.rx_type, args.fqdn,
+        args.station, args.year, args.day_of_year)
+
+if __name__ == '__main__':
+    main()
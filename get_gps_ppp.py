@@ -21,6 +21,12 @@
 # listing .zip as an allowed file upload type, we can in fact
 # upload zip files.
 #
+# With -d the inputs are daily files (the daily lane): they're
+# sent as soon as they're downloaded to get ultra-rapid and then
+# rapid results days before the weekly file is made.  Only those
+# tiers are kept; finals come from the weekly file.  The daily
+# file itself is left where it is for the weekly build.
+#
 # Usage: get_gps_ppp.py input_file_path measurement_path email_addr
  
 import os
@@ -31,12 +37,17 @@ import shutil
 import glob
 import zipfile
 import errno
-import webbrowser
-import requests
 import tempfile
-from requests_toolbelt.multipart.encoder import MultipartEncoder
+import argparse
 from make_gps_misc import *
 from nrcan_tools import *
+from catalog import get_catalog
+from sum_file import read_sum
+from metrics import Stage, file_size
+
+# how many days before the current one the daily lane looks back
+# for days that still need rapid results
+DAILY_DAYS_BACK = 1
 
 def options_get_gps_ppp():
     parser = argparse.ArgumentParser()
@@ -50,6 +61,9 @@ def options_get_gps_ppp():
     parser.add_argument('-e','--email',
         type=str,required=True,
         help="User email address for NRCan")
+    parser.add_argument('-d','--daily',
+        action='store_true',
+        help="Inputs are daily files (rapid/ultra-rapid only)")
 
     args = parser.parse_args()
     return args
@@ -59,8 +73,32 @@ def handler(signum, frame):
     if res == 'y':
         exit(1)
 
-def get_gps_ppp(input_file_path, measurement_path,user_name):
+# session is an optional requests.Session to reuse connections
+# across uploads (see nrcan_daemon.py)
+#
+# The work is in two steps, submit_ppp() (upload, wait, fetch the
+# results; mostly waiting on the network) and ingest_ppp() (file
+# the results and update the derived files; disk and CPU), so
+# task_graph.py can run them in different pools.
+#
+# daily is True for a daily file from the daily lane (see
+# get_gps_ppp_daily())
+def get_gps_ppp(input_file_path, measurement_path,user_name,session=None,
+        daily=False):
     print("get_gps_ppp:")
+    result = submit_ppp(input_file_path, measurement_path, user_name,
+        session, daily)
+    if result is not None:
+        ingest_ppp(result)
+
+# upload one RINEX file and fetch the results zip.  Returns a dict
+# for ingest_ppp(), or None if there was nothing to submit.
+def submit_ppp(input_file_path, measurement_path,user_name,session=None,
+        daily=False):
+    # these are slow to load, so only do it when we need them
+    import requests
+    from requests_toolbelt.multipart.encoder import MultipartEncoder
+    http = session if session is not None else requests
 #    signal.signal(signal.SIGINT, handler)
 
     os.umask(0o002)    # o-w
@@ -111,15 +149,40 @@ def get_gps_ppp(input_file_path, measurement_path,user_name):
 
     # note: date_1 and date_2 params are just placeholders
     # as we only care about directory names
-    m = MeasurementFiles(measurement_path, 2020,22)
+    m = get_measurement_files(measurement_path, 2020,22)
 
     try:
-        m.make_output_dirs()
+        m.make_dirs()
 #        print("Made output dirs...")
     except Exception as e:
         print("Couldn't find/make output dirs",e,"!  Exiting...")
         sys.exit()
 
+    # don't waste a PPP job on a file that can't give a useful
+    # answer; bad weekly files go to weekly/rejected with the
+    # reasons, so they aren't tried again every week (a bad daily
+    # file is left alone, as the weekly build still needs it)
+    from rinex_check import check_rinex
+    with Stage('rinex_check', m.m_name, measurement_base) as st:
+        check = check_rinex(input_file_path, expect_days=1 if daily else 7)
+        st.done('ok' if check.ok else 'rejected', file_size(input_file_path),
+            check.epochs)
+    print(check.summary())
+    if not check.ok and daily:
+        print("Not submitting daily file")
+        return
+    if not check.ok:
+        reject_dir = measurement_path + "weekly/rejected/"
+        try:
+            os.makedirs(reject_dir, exist_ok=True)
+            shutil.move(input_file_path, reject_dir + input_file_name)
+            with open(reject_dir + input_file_name + '.txt','w') as f:
+                f.write(check.summary() + '\n')
+            print("Not submitting; moved to",reject_dir)
+        except Exception as e:
+            print("Not submitting; couldn't move to",reject_dir,e)
+        return
+
     try:
         tmp_dir = tempfile.mkdtemp() + '/'
 #        print("Made tmpdir...")
@@ -131,7 +194,7 @@ def get_gps_ppp(input_file_path, measurement_path,user_name):
 # get status
     def get_status(tmp_dir,keyid):
         # get status
-        r = requests.get('{0:s}/CSRS-PPP/service/results/status?id={1:s}"' \
+        r = http.get('{0:s}/CSRS-PPP/service/results/status?id={1:s}"' \
             .format(domain, keyid), timeout=5)
         try:
             status = r.content.decode(encoding='utf-8', errors='strict')
@@ -185,54 +248,69 @@ def get_gps_ppp(input_file_path, measurement_path,user_name):
         'Content-Type': mtp_data.content_type, 'Accept': 'text/plain'}
 
     # upload RINEX file and get transaction key
-    keyid = None
-    got_key = False
-    while got_key == False:
-        try:
-            req = requests.post(url_to_post_to, data=mtp_data, \
-                headers=header)
-        except requests.exceptions.RequestException as e:
-            print("Couldn't get key so exiting")
-            print("Error:",e)
-            raise SystemExit(e)
+    with Stage('ppp_upload', m.m_name, measurement_base) as st:
+        keyid = None
+        got_key = False
+        while got_key == False:
+            try:
+                req = http.post(url_to_post_to, data=mtp_data, \
+                    headers=header)
+            except requests.exceptions.RequestException as e:
+                print("Couldn't get key so exiting")
+                print("Error:",e)
+                st.done('failed')
+                raise SystemExit(e)
+
+            keyid = str(req.text)  # The keyid required for the job
+            if req.text:
+                keyid = req.text
+                if 'DOCTYPE' in keyid:
+                    print("keyid =",keyid)
+                    print('keyid has a weird value! [{0:s}]'. \
+                        format(input_file_name))
+                if keyid == 'ERROR [002]':
+                    print('NOTICE:\nTemporarily blocked from using CSRS-PPP')
+                    st.done('blocked')
+                    sys.exit()
+                # key OKAY!
+                got_key = True
+                #print('keyid: {0:s}'.format(keyid))
+                break
+            else:
+                print('=> NO results! An error occurred while processing!!!')
+                print('=> RNX: {0:s} [keyid: {1:s}]'. \
+                    format(input_file_name, keyid))
+                error = 1
+        st.done('ok' if got_key else 'failed',
+            bytes=file_size(input_file_path))
 
-        keyid = str(req.text)  # The keyid required for the job
-        if req.text:
-            keyid = req.text
-            if 'DOCTYPE' in keyid:
-                print("keyid =",keyid)
-                print('keyid has a weird value! [{0:s}]'. \
-                    format(input_file_name))
-            if keyid == 'ERROR [002]':
-                print('NOTICE:\nTemporarily blocked from using CSRS-PPP')
-                sys.exit()
-            # key OKAY!
-            got_key = True
-            #print('keyid: {0:s}'.format(keyid))
-            break
-        else:
-            print('=> NO results! An error occurred while processing!!!')
-            print('=> RNX: {0:s} [keyid: {1:s}]'. \
-                format(input_file_name, keyid))
-            error = 1
-
-    # wait for results
-    get_num = 0
-    status = ''
-    print("Processing", input_file_name)
-    while status != 'done' and error != 1:
-        print('.',end='')
-        status = get_status(tmp_dir,keyid)
-        get_num += 1
-        # Check get_max
-        if get_num > get_max:
-            print('=> Taking too long!')
-            print('=> Next file ...')
-            error = 1
-            sys.exit(error)
-
-        time.sleep(sleepsec)
-    print(" (time: ~", get_num * 10,"seconds)")
+    try:
+        sub_id = get_catalog(measurement_path).add_submission( \
+            input_file_path, keyid)
+    except Exception as e:
+        sub_id = None
+        print("Couldn't add submission to catalog:",e)
+
+    # wait for results (the time spent in NRCan's queue)
+    with Stage('ppp_wait', m.m_name, measurement_base) as st:
+        get_num = 0
+        status = ''
+        print("Processing", input_file_name)
+        while status != 'done' and error != 1:
+            print('.',end='')
+            status = get_status(tmp_dir,keyid)
+            get_num += 1
+            # Check get_max
+            if get_num > get_max:
+                print('=> Taking too long!')
+                print('=> Next file ...')
+                error = 1
+                st.done('timeout', records=get_num)
+                sys.exit(error)
+
+            time.sleep(sleepsec)
+        print(" (time: ~", get_num * 10,"seconds)")
+        st.done(records=get_num)
 
     # Get full_output.zip
     
@@ -240,12 +318,15 @@ def get_gps_ppp(input_file_path, measurement_path,user_name):
     tmp_sum_path = tmp_dir + measurement_base + '.sum'
     tmp_clk_path = tmp_dir + measurement_base + '.clk'
 
-    try:
-        r = requests.get('{0:s}/CSRS-PPP/service/results/file?id={1:s}' \
-            .format(domain, keyid), timeout=5)
-    except requests.exceptions.RequestException as e:
-        print("request error:",e,"so exiting!")
-        raise SystemExit(e)
+    with Stage('ppp_fetch', m.m_name, measurement_base) as st:
+        try:
+            r = http.get('{0:s}/CSRS-PPP/service/results/file?id={1:s}' \
+                .format(domain, keyid), timeout=5)
+        except requests.exceptions.RequestException as e:
+            print("request error:",e,"so exiting!")
+            st.done('failed')
+            raise SystemExit(e)
+        st.done(bytes=len(r.content))
 
     with open(tmp_zip_path, 'wb') as f:
         f.write(r.content)
@@ -261,104 +342,180 @@ def get_gps_ppp(input_file_path, measurement_path,user_name):
             print('ERROR: Bad ZIP file')
             sys.exit()
 
-    # extract the files we need -- .sum and .clk
-    with zipfile.ZipFile(tmp_zip_path, 'r') as zip_ref:
-        print('Extracting', measurement_base + '.sum')
-        zip_ref.extract(measurement_base + '.sum',tmp_dir)
-        print('Extracting', measurement_base + '.clk')
-        zip_ref.extract(measurement_base + '.clk',tmp_dir)
-        clktmp = tmp_dir + '/' + measurement_base + '.clk'
-        #print("temp clock file:",tmp_dir + '/' + measurement_base + '.clk',
-        #        "size:", \
-        #        os.path.getsize(clktmp),"bytes")
-
-    # get correction type from summary file
-    # NOTE: as of 27 Nov 2022 the format of the summary file has
-    # changed, and that changed how to determine the correction
-    # type.  The SP3 lines now begin EMR0DC[A|B]FIN_* where the
-    # last three characters before the underscore are the correction
-    # type:  FIN, RAP, ULT
-    with open(tmp_sum_path,'r') as f:
-        while True:
-            line = f.readline()
-            if not line:
-                break
-            if line.startswith('SP3'):
-                corr_type = line[:line.index("_")][-3:].strip()
-                break
-
-    if corr_type == 'ULT':
-        corr_type_string = "ultra-rapid"
-        corr_dir = 'ultra/'
-        print("Correction type: ultra-rapid")
-    elif corr_type == 'RAP':
-        corr_type_string = "rapid"
-        corr_dir = 'rapid/'
-        print("Correction type: rapid")
-    elif corr_type == 'FIN':
-        corr_type_string = "final"
-        corr_dir = 'final/'
-        print("Correction type: final")
-
-    zip_file_path = measurement_path + corr_dir + \
-        'zip/' + measurement_base + '_' + corr_type_string + '.zip'
-    sum_file_path = measurement_path + corr_dir + \
-        'sum/' + measurement_base + '_' + corr_type_string + '.sum'
-    clk_file_path = measurement_path + corr_dir + \
-        'clk/' + measurement_base + '_' + corr_type_string + '.clk'
-
-    #print("measurement_base:",measurement_base)
-    #print("clk_file_path:",clk_file_path)
-
-    # Move outputs to desired path and name
-    try:
-        #print("zip_file_path:",zip_file_path)
-        shutil.move(tmp_zip_path,zip_file_path)
-        if not os.path.isfile(zip_file_path):
-            print("zip_file_path:",zip_file_path,"not found! Exiting...")
-        shutil.move(tmp_sum_path,sum_file_path)
-        if not os.path.isfile(sum_file_path):
-            print("sum_file_path:",sum_file_path,"not found! Exiting...")
-        shutil.move(tmp_clk_path,clk_file_path)
-        if not os.path.isfile(clk_file_path):
-            print("clk_file_path:",clk_file_path,"not found! Exiting...")
-        #else:
-            #print("clock file:",clk_file_path,"size:", \
-                #os.path.getsize(clk_file_path),"bytes")
-    except Exception as e:
-        print("Couldn't move files from tmp to output directory:",e)
-        sys.exit()  # don't delete tmp_dir since we may want to inspect
-    shutil.rmtree(tmp_dir)
-    #print("Moved files from tmp to output directory")
+    return {'tmp_dir': tmp_dir, 'measurement_base': measurement_base,
+        'measurement_path': measurement_path,
+        'input_file_path': input_file_path,
+        'final_file_path': final_file_path, 'sub_id': sub_id,
+        'daily': daily}
+
+# file the results fetched by submit_ppp() by correction type, move
+# the input file if they're final, and update the derived files
+def ingest_ppp(result):
+    tmp_dir = result['tmp_dir']
+    measurement_base = result['measurement_base']
+    measurement_path = result['measurement_path']
+    input_file_path = result['input_file_path']
+    final_file_path = result['final_file_path']
+    sub_id = result['sub_id']
+    tmp_zip_path = tmp_dir + measurement_base + '.zip'
+    tmp_sum_path = tmp_dir + measurement_base + '.sum'
+    tmp_clk_path = tmp_dir + measurement_base + '.clk'
+    with Stage('ppp_ingest', os.path.basename(measurement_path.rstrip('/')),
+        measurement_base) as st:
+
+        # extract the files we need -- .sum and .clk
+        with zipfile.ZipFile(tmp_zip_path, 'r') as zip_ref:
+            print('Extracting', measurement_base + '.sum')
+            zip_ref.extract(measurement_base + '.sum',tmp_dir)
+            print('Extracting', measurement_base + '.clk')
+            zip_ref.extract(measurement_base + '.clk',tmp_dir)
+            clktmp = tmp_dir + '/' + measurement_base + '.clk'
+            #print("temp clock file:",tmp_dir + '/' + measurement_base + '.clk',
+            #        "size:", \
+            #        os.path.getsize(clktmp),"bytes")
+
+        # get correction type from summary file
+        # NOTE: as of 27 Nov 2022 the format of the summary file has
+        # changed, and that changed how to determine the correction
+        # type.  The SP3 lines now begin EMR0DC[A|B]FIN_* where the
+        # last three characters before the underscore are the correction
+        # type:  FIN, RAP, ULT
+        sum_rec = read_sum(tmp_sum_path, use_cache=False)
+        corr_type = sum_rec.corr_type
+        # (also pick up the data span for the catalog)
+        data_begin = sum_rec.data_begin or ''
+        data_end = sum_rec.data_end or ''
+
+        if corr_type == 'ULT':
+            corr_type_string = "ultra-rapid"
+            corr_dir = 'ultra/'
+            print("Correction type: ultra-rapid")
+        elif corr_type == 'RAP':
+            corr_type_string = "rapid"
+            corr_dir = 'rapid/'
+            print("Correction type: rapid")
+        elif corr_type == 'FIN':
+            corr_type_string = "final"
+            corr_dir = 'final/'
+            print("Correction type: final")
+
+        # the weekly lane provides finals; a daily file old enough to
+        # get them is left to it
+        if result.get('daily') and corr_type == 'FIN':
+            print("Final results for a daily file; not kept")
+            shutil.rmtree(tmp_dir)
+            try:
+                if sub_id is not None:
+                    get_catalog(measurement_path).finish_submission(sub_id,
+                        'done')
+            except Exception as e:
+                print("Couldn't update catalog:",e)
+            st.done('skipped')
+            return
+
+        zip_file_path = measurement_path + corr_dir + \
+            'zip/' + measurement_base + '_' + corr_type_string + '.zip'
+        sum_file_path = measurement_path + corr_dir + \
+            'sum/' + measurement_base + '_' + corr_type_string + '.sum'
+        clk_file_path = measurement_path + corr_dir + \
+            'clk/' + measurement_base + '_' + corr_type_string + '.clk'
+
+        #print("measurement_base:",measurement_base)
+        #print("clk_file_path:",clk_file_path)
+
+        # Move outputs to desired path and name
+        try:
+            #print("zip_file_path:",zip_file_path)
+            shutil.move(tmp_zip_path,zip_file_path)
+            if not os.path.isfile(zip_file_path):
+                print("zip_file_path:",zip_file_path,"not found! Exiting...")
+            shutil.move(tmp_sum_path,sum_file_path)
+            if not os.path.isfile(sum_file_path):
+                print("sum_file_path:",sum_file_path,"not found! Exiting...")
+            shutil.move(tmp_clk_path,clk_file_path)
+            if not os.path.isfile(clk_file_path):
+                print("clk_file_path:",clk_file_path,"not found! Exiting...")
+            #else:
+                #print("clock file:",clk_file_path,"size:", \
+                    #os.path.getsize(clk_file_path),"bytes")
+        except Exception as e:
+            print("Couldn't move files from tmp to output directory:",e)
+            st.done('failed')
+            sys.exit()  # don't delete tmp_dir since we may want to inspect
+        shutil.rmtree(tmp_dir)
+        #print("Moved files from tmp to output directory")
 
-    # if we got final results, move the input file to "weekly/final/"
-    if corr_type == "FIN":
+        # record what we got
         try:
-            shutil.move(input_file_path,final_file_path)
+            cat = get_catalog(measurement_path)
+            if sub_id is not None:
+                cat.finish_submission(sub_id, 'done')
+            tier = corr_dir.rstrip('/')
+            cat.add_product(zip_file_path, tier, 'zip', data_begin, data_end)
+            cat.add_product(sum_file_path, tier, 'sum', data_begin, data_end)
+            cat.add_product(clk_file_path, tier, 'clk', data_begin, data_end)
         except Exception as e:
-            print("Couldn't move file to weekly/final directory")
-            print("Error:",e)
-            print("input_file_path:")
-            print(input_file_path)
-            print("final_file_path:")
-            print(final_file_path)
+            print("Couldn't add products to catalog:",e)
+
+        # if we got final results, move the input file to "weekly/final/"
+        if corr_type == "FIN" and not result.get('daily'):
+            try:
+                shutil.move(input_file_path,final_file_path)
+            except Exception as e:
+                print("Couldn't move file to weekly/final directory")
+                print("Error:",e)
+                print("input_file_path:")
+                print(input_file_path)
+                print("final_file_path:")
+                print(final_file_path)
     
-    # call make_gps_misc.py
-    try:
-        make_gps_misc(sum_file_path,measurement_path)
-        print("Added data to position, offset, and maybe other files")
-    except Exception as e:
-        print("Couldn't make miscellaneous files, error:")
-        print(e)
-    print("get_gps_ppp.py:  Finished")
+        # call make_gps_misc.py
+        try:
+            make_gps_misc(sum_file_path,measurement_path)
+            print("Added data to position, offset, and maybe other files")
+        except Exception as e:
+            print("Couldn't make miscellaneous files, error:")
+            print(e)
+
+        # and fold the new clock data into the best-tier phase series
+        try:
+            from merge_tiers import merge_tiers
+            merge_tiers(measurement_path)
+        except Exception as e:
+            print("Couldn't update best-tier phase file:",e)
+        st.done(bytes=file_size(clk_file_path))
+        print("get_gps_ppp.py:  Finished")
 
-    return
+        return
 
-if __name__ == '__main__':
+# the daily lane: submit the daily file for the day of m, and for
+# each of the days_back days before it that has no rapid results
+# yet (so a day first gets ultra-rapids, then is sent again for
+# rapids once they're out).  Returns the number of files sent.
+def get_gps_ppp_daily(m, user_name, session=None, days_back=DAILY_DAYS_BACK):
+    sent = 0
+    for i in range(days_back, -1, -1):
+        d = m.dt - timedelta(days=i)
+        day = get_measurement_files(m.m_path, d.year, d.timetuple().tm_yday)
+        if not os.path.isfile(day.daily_dnld_path):
+            continue
+        base = day.daily_dnld_file.split(os.extsep)[0]
+        if os.path.isfile(day.output_path_rapid + 'clk/' + base + \
+                '_rapid.clk'):
+            continue
+        print("Daily lane:", day.daily_dnld_file)
+        get_gps_ppp(day.daily_dnld_path, m.m_path, user_name, session,
+            daily=True)
+        sent += 1
+    return sent
+
+def main():
     # this allows processing multiple files in one go
     args = options_get_gps_ppp()
     files = glob.glob(args.input_path)
     files.sort(key=lambda f: int(''.join(filter(str.isdigit, f))))
     for x in files:
-        get_gps_ppp(x,args.measurement_path,args.email)
+        get_gps_ppp(x,args.measurement_path,args.email,daily=args.daily)
 
+if __name__ == '__main__':
+    main()
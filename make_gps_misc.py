@@ -18,11 +18,15 @@
 # and clock offset data, and appends to position and offset files
 # in the "misc" directory of the measurement path
 # Usage: make_gps_misc input_file_path measurement_path
+#        make_gps_misc -b [-j jobs] input_file_path [...]
 #
 # --    'input_file_path' is absolute path of input .sum file(s),
-#       wildcards allowed
+#       wildcards allowed with -b
 # --    'measurement_path" is where dirs for final, rapid,
 #        ultra will go, with the output files placed appropriately
+# --    -b (batch) reads any number of .sum files, in any order,
+#       and merges them into the pos and offset files, replacing
+#       any line with the same epoch.  -j reads them in parallel.
 
 import os
 import sys
@@ -32,48 +36,19 @@ import datetime
 import shutil
 import zipfile
 import errno
-import webbrowser
-import requests
-from requests_toolbelt.multipart.encoder import MultipartEncoder
+import glob
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, date,timedelta
 from nrcan_tools import *
+from sum_file import read_sum
 
-def make_gps_misc(sum_file, measurement_path):
-    # first, read the summary file
-    with open(sum_file,'r') as f:
-        ecef = [0,0,0]
-        llh = [0,0,0]
-        while True:
-            line = f.readline()
-            if not line:
-                break
-            if line.startswith('SP3'):
-                corr_type = line[:line.index("_")][-3:].strip()
-            if line.startswith('NOW'):
-                report_date = line[4:].strip()
-            if line.startswith('BEG'):
-                (data_begin,frac) = line[4:].strip().rsplit('.',1)
-            if line.startswith('END'):
-                (data_end,frac) = line[4:].strip().rsplit('.',1)
-            if line.startswith('INT'):
-                data_interval = line[4:].strip()
-            if line.startswith('POS   X'):
-                ecef[0] = line[49:][:13].strip()
-            if line.startswith('POS   Y'):
-                ecef[1] = line[49:][:13].strip()
-            if line.startswith('POS   Z'):
-                ecef[2] = line[49:][:13].strip()
-            if line.startswith('POS LAT'):
-                llh[0] = line[47:][:16].strip()
-            if line.startswith('POS LON'):
-                llh[1] = line[47:][:16].strip()
-            if line.startswith('POS HGT'):
-                llh[2] = line[47:][:16].strip()
-            # get clock offset from .sum file:
-            # OFF -277.3000 0.1666 ns
-            if line.startswith('OFF'):
-                (junk,offset1,offset2,scale) = line.split()
-        f.close()
+# read a .sum file and return a dict holding its tier, epoch
+# (unix timestamp of end of data) and the lines for the pos
+# and offset files
+def read_sum_file(sum_file, measurement_path=''):
+    rec = read_sum(sum_file)
+    if rec.tier is None:
+        raise ValueError("no correction type in " + sum_file)
 
     # create the measurement path
     # from the summary file path
@@ -84,140 +59,154 @@ def make_gps_misc(sum_file, measurement_path):
             measurement_path = '/'.join(parts[:count])
             break
 
-    # get the proper file names
-    # date_1, date_2, curr_leapsecond are placeholders
-    # as we don't care about specific dates here
-    m = MeasurementFiles(measurement_path, 2022,22)
-    if corr_type == 'FIN':
-        corr_type_string = 'final'
-        pos_file = m.pos_file_final
-        pos_path = m.pos_path_final
-        offset_file = m.offset_file_final
-        offset_path = m.offset_path_final
-
-    elif corr_type == 'RAP':
-        corr_type_string = 'rapid'
-        pos_file = m.pos_file_rapid
-        pos_path = m.pos_path_rapid
-        offset_file = m.offset_file_rapid
-        offset_path = m.offset_path_rapid
-    elif corr_type == 'ULT':
-        corr_type_string = 'ultra'
-        pos_file = m.pos_file_ultra
-        pos_path = m.pos_path_ultra
-        offset_file = m.offset_file_ultra
-        offset_path = m.offset_path_ultra
-
-    print("Adding position data to", pos_file)
-    print("Adding offset data to", offset_file)
-
-    os.umask(0o002)     # o-w
-
+    (data_end,frac) = rec.data_end.rsplit('.',1)
     t = time.mktime(datetime.strptime(data_end, \
         "%Y-%m-%d %H:%M:%S").timetuple())
     (timestamp,frac) = str(t).rsplit('.') # get rid of '.0'
     iso_timestamp = datetime.utcfromtimestamp(t).isoformat()
 
+    ecef = rec.ecef_str
+    llh = rec.llh_str
     pos_line = str(timestamp) + ' ' + iso_timestamp + ' ' + \
         ecef[0] + ' ' + ecef[1] + ' ' + ecef[2] + ' ' + \
         llh[0].replace(' ','_')  + ' ' + llh[1].replace(' ','_') + \
         ' ' + llh[2].replace(' ','_') + '\n'
     offset_line = str(timestamp) + ' ' + iso_timestamp + ' ' + \
-        offset1 + ' ' + offset2 + ' ' + scale + '\n'
-
-
-    # now make/append files
-
-    # do they exist?
-    if not os.path.exists(pos_path):
-        os.mknod(pos_path)
-    if not os.path.exists(offset_path):
-        os.mknod(offset_path)
-
-################### pos file ##########################
-    # now read pos file to see what it has
-    with open(pos_path,'r') as f:
-        new_pos_file = True
-        have_header = False
-        last_pos_time = 0
-        while True:
-            line = f.readline()
-            if not line:
-                break
-            new_pos_file = False       # else we wouldn't be here
-            if line.startswith('#'):
-                have_header = True      # octothorpe means header
-            else:
-                last_pos_time = int(line.split()[0])
-
-        f.close()
-
-    if int(timestamp) < last_pos_time:
-        print("Later data already in position file.  Exiting...")
-        return
-
-    with open(pos_path,'a') as f:
-        # create the file header if necessary
-        if not have_header:
-            buf = '# NRCan PPP pos data (ITRF) for: '
-            f.write(buf)
-            buf = m.m_name + '\n'
-            f.write(buf)
-            buf = '# with ' + corr_type_string + \
-                ' corrections (file created ' + \
-                str(datetime.utcnow().isoformat(timespec='seconds')) + \
-                ' UTC)\n'
-            f.write(buf)
-            buf = \
-                "# fields: unix epoch, iso_8601, ecef(x), ecef(y) " + \
-                  "ecef(z), lat, lon, height\n"
-            f.write(buf)
-
-        f.write(pos_line)
-        f.close
-
-################### offset file ##########################
-    # now read offset file to see what it has
-    with open(offset_path,'r') as f:
-        new_offset_file = True
-        have_header = False
-        last_offset_time = 0
-        while True:
-            line = f.readline()
-            if not line:
-                break
-            new_offset_file = False       # else we wouldn't be here
-            if line.startswith('#'):
-                have_header = True      # octothorpe means header
-            else:
-                last_offset_time = int(line.split()[0])
-
-        f.close()
-
-    if int(timestamp) < last_offset_time:
-        print("Later data already in offset file.  Exiting...")
-        return
-
-    with open(offset_path,'a') as f:
-        # create the file header if necessary
-        if not have_header:
-            buf = '# NRCan PPP offset data for: '
-            f.write(buf)
-            buf = m.m_name + '\n'
-            f.write(buf)
-            buf = '# with ' + corr_type_string + \
-                ' corrections (file created ' + \
-                str(datetime.utcnow().isoformat(timespec='seconds')) + \
-                ' UTC)\n'
-            f.write(buf)
-            buf = \
-                "# fields: unix epoch, iso_8601, offset1, offset2, scale \n"
-            f.write(buf)
-
-        f.write(offset_line)
-        f.close
+        rec.offset_str + ' ' + rec.offset_sigma_str + ' ' + \
+        rec.offset_units + '\n'
+
+    return {'sum_file': sum_file, 'measurement_path': measurement_path,
+        'corr_type': rec.corr_type, 'tier': rec.tier,
+        'timestamp': int(timestamp), 'pos_line': pos_line,
+        'offset_line': offset_line}
+
+# same, but print a message and return None on a bad file
+# (for batch mode, where one bad file shouldn't stop the rest)
+def try_read_sum_file(sum_file):
+    try:
+        return read_sum_file(sum_file)
+    except Exception as e:
+        print("Couldn't read", sum_file + ":", e)
+        return None
+
+# return (m, pos_path, pos_header, offset_path, offset_header)
+# for a measurement path and tier
+def misc_files(measurement_path, corr_type_string):
+    # get the proper file names
+    # date_1, date_2 are placeholders
+    # as we don't care about specific dates here
+    m = get_measurement_files(measurement_path, 2022,22)
+    m.make_dirs()
+    pos_path = getattr(m, 'pos_path_' + corr_type_string)
+    offset_path = getattr(m, 'offset_path_' + corr_type_string)
+
+    created = str(datetime.utcnow().isoformat(timespec='seconds'))
+    pos_header = [
+        '# NRCan PPP pos data (ITRF) for: ' + m.m_name + '\n',
+        '# with ' + corr_type_string + \
+            ' corrections (file created ' + created + ' UTC)\n',
+        "# fields: unix epoch, iso_8601, ecef(x), ecef(y) " + \
+            "ecef(z), lat, lon, height\n"]
+    offset_header = [
+        '# NRCan PPP offset data for: ' + m.m_name + '\n',
+        '# with ' + corr_type_string + \
+            ' corrections (file created ' + created + ' UTC)\n',
+        "# fields: unix epoch, iso_8601, offset1, offset2, scale \n"]
+    return m, pos_path, pos_header, offset_path, offset_header
+
+def make_gps_misc(sum_file, measurement_path):
+    # first, read the summary file
+    rec = read_sum_file(sum_file, measurement_path)
+    m, pos_path, pos_header, offset_path, offset_header = \
+        misc_files(rec['measurement_path'], rec['tier'])
+
+    print("Adding position data to", os.path.basename(pos_path))
+    print("Adding offset data to", os.path.basename(offset_path))
+
+    os.umask(0o002)     # o-w
+
+    # now make/append files; only the first byte and last line
+    # of each are read, so this doesn't slow down as they grow.
+    # A record older than the end of the file (a weekly result
+    # arriving after the daily lane's later ones) is merged in
+    # by time instead.
+    if not append_data_line(pos_path, pos_header, rec['pos_line'], \
+            rec['timestamp']):
+        print("Later data already in position file; merging")
+        merge_data_lines(pos_path, pos_header, \
+            {rec['timestamp']: rec['pos_line']})
+
+    if not append_data_line(offset_path, offset_header, \
+            rec['offset_line'], rec['timestamp']):
+        print("Later data already in offset file; merging")
+        merge_data_lines(offset_path, offset_header, \
+            {rec['timestamp']: rec['offset_line']})
 
     return
 
+# read many .sum files (in parallel if jobs > 1) and merge them
+# into the pos and offset files, one rewrite per file.  Records
+# are deduplicated by epoch within each tier; where two .sum
+# files have the same epoch the later one in sum_files wins.
+def make_gps_misc_batch(sum_files, jobs=1):
+    os.umask(0o002)     # o-w
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as ex:
+            records = list(ex.map(try_read_sum_file, sum_files, \
+                chunksize=16))
+    else:
+        records = [try_read_sum_file(f) for f in sum_files]
+
+    # (measurement_path, tier) -> {timestamp: record}
+    groups = {}
+    for rec in records:
+        if rec is None:
+            continue
+        key = (rec['measurement_path'], rec['tier'])
+        groups.setdefault(key, {})[rec['timestamp']] = rec
+
+    for (measurement_path, tier), recs in sorted(groups.items()):
+        m, pos_path, pos_header, offset_path, offset_header = \
+            misc_files(measurement_path, tier)
+        n = merge_data_lines(pos_path, pos_header, \
+            {t: r['pos_line'] for t, r in recs.items()})
+        merge_data_lines(offset_path, offset_header, \
+            {t: r['offset_line'] for t, r in recs.items()})
+        print("Merged", len(recs), tier, ".sum records into",
+            os.path.basename(pos_path), "and",
+            os.path.basename(offset_path), "(" + str(n), "epochs)")
+    return
+
+def options_make_gps_misc():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('input_path',
+        type=str,nargs='+',
+        help="Input .sum file and measurement path, or with -b " + \
+            "any number of .sum files/wildcards")
+    parser.add_argument('-b','--batch',
+        action='store_true',
+        help="Merge many .sum files into pos/offset files")
+    parser.add_argument('-j','--jobs',
+        type=int,required=False,default=1,
+        help="Number of .sum files to read in parallel (with -b)")
+
+    args = parser.parse_args()
+    return args
+
+def main():
+    args = options_make_gps_misc()
+    if args.batch:
+        files = []
+        for pattern in args.input_path:
+            files += glob.glob(pattern)
+        files.sort(key=lambda f: int(''.join(filter(str.isdigit, f))))
+        make_gps_misc_batch(files, args.jobs)
+    elif len(args.input_path) == 2:
+        make_gps_misc(args.input_path[0], args.input_path[1])
+    else:
+        print("Need input .sum file and measurement path (or use -b)")
+        sys.exit()
+
 if __name__ == '__main__':
-    make_gps_misc(sys.argv[1],sys.argv[2])
+    main()
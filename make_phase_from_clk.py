@@ -18,7 +18,8 @@
 # Precise Point Positioning service* and creates file with
 # clock offset (phase) data and timetags.
 #
-# Usage: make_phase.py infile outfile [first_doy]
+# Usage: make_phase.py infile outfile [-p] [-l levels] [-d state]
+#        [-e] [-E]
 #
 # -- infile is the .clk file or files to be processed.  It
 #    can be a directory with wildcards, or a single file name
@@ -26,12 +27,22 @@
 # -- outfile is the file in which the combined phase data
 #    will be returned
 #
-# -- first_doy is optional.  If specified, will skip processing
-#    until specified day of year is encountered.
+# -- -p also writes decimated copies of outfile (300 s, 1 hour
+#    and 1 day bins by default, or the comma separated bin widths
+#    in seconds given with -l) for plotting; see pyramid.py
+#
+# -- -d updates the frequency offset/drift estimate kept in the
+#    given state file with any epochs newer than it has seen, and
+#    prints it; see freq_drift.py
+#
+# -- -e writes phase steps, spikes and gaps found while reading the
+#    data to <outfile>_events.dat; -E also lists them in the header.
+#    See phase_events.py
 #
 #####################################################################
 from datetime import datetime, date, timedelta, timezone
 from decimal import Decimal
+import argparse
 import glob
 import os
 import random
@@ -42,6 +53,7 @@ from tempfile import NamedTemporaryFile
 import zipfile
 
 from nrcan_tools import *
+from metrics import Stage, file_size
 
 # return day of year as string from .clk AR line
 def make_doy_from_clk(instring):
@@ -103,8 +115,10 @@ def get_tau_from_clk(files):
 ########################################################################
 # read .clk files into a combined file with offset,
 # iso_epoch, doy_str and return epoch count
-def make_phase_file(infile,outfile):
+def make_phase_file(infile,outfile,pyramid_levels=None,drift_state=None,
+        events=False,events_header=False):
     print("make_phase_from_clk.py:",infile,outfile)   # ID for log
+    st = Stage('phase', os.path.splitext(os.path.basename(outfile))[0])
 
     ##### set Test to False for normal operation
     Test = True
@@ -128,6 +142,7 @@ def make_phase_file(infile,outfile):
         os.path.isfile(infile)
     except:
         print("Couldn't open",infile,"!")
+        st.done('failed')
         sys.exit()
 
     outfile = os.path.abspath(outfile)
@@ -136,14 +151,34 @@ def make_phase_file(infile,outfile):
         f.close()
     except:
         print("Couldn't create",outfile,"!")
+        st.done('failed')
         sys.exit()
 
     try:
         tmpfile1 = NamedTemporaryFile(mode='w+t',delete=False)
     except:
         print("Couldnt' create tmpfile",tmpfile1.name,"!")
+        st.done('failed')
         sys.exit()
 
+    # decimated levels are built as the data goes by
+    pyramid = None
+    if pyramid_levels:
+        from pyramid import PyramidBuilder
+        pyramid = PyramidBuilder(outfile, pyramid_levels, places)
+
+    # and so is the drift estimate, from only the new epochs
+    drift = None
+    if drift_state:
+        from freq_drift import load_state
+        drift = load_state(drift_state)
+
+    # and steps, spikes and gaps are looked for
+    detector = None
+    if events or events_header:
+        from phase_events import EventDetector
+        detector = EventDetector()
+
     with open(tmpfile1.name,'w') as outp:
         # get list of .clk files
         infile = os.path.abspath(infile)
@@ -166,6 +201,13 @@ def make_phase_file(infile,outfile):
                     result = format_dec(offset,places) + " " + \
                         this_epoch_iso + " " + this_epoch_doy + "\n"
                     outp.write(result)
+                    if pyramid:
+                        pyramid.add(this_epoch, offset)
+                    if detector:
+                        detector.add(this_epoch, offset)
+                    if drift:
+                        drift.add(make_timestamp_from_dt(this_epoch \
+                            .replace(tzinfo=timezone.utc)), offset)
                     # capture first epoch
                     if count == 0:
                         first_epoch = make_dt_from_iso(this_epoch_iso)
@@ -197,6 +239,17 @@ def make_phase_file(infile,outfile):
     header.append("# Wrote " + str(count) + " lines of data; there should\n")
     header.append("# be " + str(should_be) + " epochs, so " + \
         str(missing) + " epochs are missing\n")
+    if detector:
+        found = detector.close()
+        from phase_events import events_path, write_events, format_event
+        if events:
+            write_events(events_path(outfile), found, \
+                os.path.basename(outfile))
+        print("Found", len(found), "steps, spikes and gaps")
+        if events_header:
+            header.append("# Events (" + str(len(found)) + "):\n")
+            for ev in found:
+                header.append("#     " + format_event(ev) + "\n")
     header.append('#\n')
     with open(outfile,'w') as outp:
         for lines in header:
@@ -206,10 +259,51 @@ def make_phase_file(infile,outfile):
                     outp.write(lines)
     outp.close()
     tmpfile1.close()
+    if pyramid:
+        pyramid.close()
+    if drift:
+        from freq_drift import save_state, format_report
+        save_state(drift_state, drift)
+        sys.stdout.writelines(format_report(drift.report()))
     os.remove(tmpfile1.name)
+    st.done(bytes=file_size(outfile), records=count)
     return count
     
+def options_make_phase_file():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('infile',
+        type=str,
+        help=".clk file, or path with wildcards")
+    parser.add_argument('outfile',
+        type=str,
+        help="Phase file to write")
+    parser.add_argument('-p','--pyramid',
+        action='store_true',
+        help="Also write decimated levels for plotting")
+    parser.add_argument('-l','--levels',
+        type=str,required=False,default='300,3600,86400',
+        help="Comma separated bin widths for -p, seconds")
+    parser.add_argument('-d','--drift_state',
+        type=str,required=False,default=None,
+        help="Update frequency/drift estimate in this state file")
+    parser.add_argument('-e','--events',
+        action='store_true',
+        help="Write steps, spikes and gaps to an events file")
+    parser.add_argument('-E','--events_header',
+        action='store_true',
+        help="List steps, spikes and gaps in the header")
+
+    args = parser.parse_args()
+    return args
+
+def main():
+    args = options_make_phase_file()
+    levels = None
+    if args.pyramid:
+        levels = [int(l) for l in args.levels.split(',')]
+    make_phase_file(args.infile, args.outfile, levels, args.drift_state,
+        args.events, args.events_header)
+
 if __name__ == '__main__':
-    infile = sys.argv[1]     # can be path/wildcard, or single file
-    outfile = sys.argv[2]
-    make_phase_file(infile, outfile)
+    main()
@@ -23,48 +23,17 @@ import datetime
 import shutil
 import zipfile
 import errno
-import webbrowser
-import requests
-from requests_toolbelt.multipart.encoder import MultipartEncoder
 from datetime import datetime, date,timedelta
 from nrcan_tools import *
+from sum_file import read_sum
 
 def make_pos_file(sum_file, measurement_path):
     # first, read the summary file
-    with open(sum_file,'r') as f:
-        ecef = [0,0,0]
-        llh = [0,0,0]
-        while True:
-            line = f.readline()
-            if not line:
-                break
-            if line.startswith('SP3'):
-                corr_type = line[:line.index("_")][-3:].strip()
-            if line.startswith('NOW'):
-                report_date = line[4:].strip()
-            if line.startswith('BEG'):
-                (data_begin,frac) = line[4:].strip().rsplit('.',1)
-            if line.startswith('END'):
-                (data_end,frac) = line[4:].strip().rsplit('.',1)
-            if line.startswith('INT'):
-                data_interval = line[4:].strip()
-            if line.startswith('POS   X'):
-                ecef[0] = line[49:][:13].strip()
-            if line.startswith('POS   Y'):
-                ecef[1] = line[49:][:13].strip()
-            if line.startswith('POS   Z'):
-                ecef[2] = line[49:][:13].strip()
-            if line.startswith('POS LAT'):
-                llh[0] = line[47:][:16].strip()
-            if line.startswith('POS LON'):
-                llh[1] = line[47:][:16].strip()
-            if line.startswith('POS HGT'):
-                llh[2] = line[47:][:16].strip()
-            # get clock offset from .sum file:
-            # OFF -277.3000 0.1666 ns
-            if line.startswith('OFF'):
-                offset = line
-        f.close()
+    rec = read_sum(sum_file)
+    corr_type = rec.corr_type
+    (data_end,frac) = rec.data_end.rsplit('.',1)
+    ecef = rec.ecef_str
+    llh = rec.llh_str
 
     # create the measurement path
     # from the summary file path
@@ -78,7 +47,8 @@ def make_pos_file(sum_file, measurement_path):
     # get the proper file names
     # date_1, date_2, curr_leapsecond are placeholders
     # as we don't care about specific dates here
-    m = MeasurementFiles(measurement_path, 2022,22,17)
+    m = get_measurement_files(measurement_path, 2022,22)
+    m.make_dirs()
     if corr_type == 'FIN':
         corr_type_string = 'final'
         pos_file = m.pos_file_final
@@ -106,54 +76,23 @@ def make_pos_file(sum_file, measurement_path):
             llh[0].replace(' ','_')  + ' ' + llh[1].replace(' ','_') + \
             ' ' + llh[2].replace(' ','_') + '\n'
 
-    # now make/append to pos file
-
-    # does it exist?
-    if not os.path.exists(pos_path):
-        os.mknod(pos_path)
-
-    # now read it to see what it has
-    with open(pos_path,'r') as f:
-        new_pos_file = True
-        have_header = False
-        last_pos_time = 0
-        while True:
-            line = f.readline()
-            if not line:
-                break
-            new_pos_file = False       # else we wouldn't be here
-            if line.startswith('#'):
-                have_header = True      # octothorpe means header
-            else:
-                last_pos_time = int(line.split()[0])
-
-        f.close()
-
-    if int(timestamp) < last_pos_time:
+    # now make/append to pos file; only the first byte and
+    # last line are read, so this doesn't slow down as it grows
+    pos_header = [
+        '# NRCan PPP pos data (ITRF) for: ' + m.m_name + '\n',
+        '# with ' + corr_type_string + \
+            ' corrections (file created ' + \
+            str(datetime.utcnow().isoformat(timespec='seconds')) + \
+            ' UTC)\n',
+        "# fields: unix epoch, iso_8601, ecef(x), ecef(y) " + \
+            "ecef(z), lat, lon, height\n"]
+    if not append_data_line(pos_path, pos_header, pos_line, timestamp):
         print("Later data already in file.  Exiting...")
         return
-
-    with open(pos_path,'a') as f:
-        # create the file header if necessary
-        if not have_header:
-            buf = '# NRCan PPP pos data (ITRF) for: '
-            f.write(buf)
-            buf = m.m_name + '\n'
-            f.write(buf)
-            buf = '# with ' + corr_type_string + \
-                ' corrections (file created ' + \
-                str(datetime.utcnow().isoformat(timespec='seconds')) + \
-                ' UTC)\n'
-            f.write(buf)
-            buf = \
-                "# fields: unix epoch, iso_8601, ecef(x), ecef(y) " + \
-                  "ecef(z), lat, lon, height\n"
-            f.write(buf)
-
-        f.write(pos_line)
-        f.close
     return
 
-if __name__ == '__main__':
+def main():
     make_pos_file(sys.argv[1],sys.argv[2])
 
+if __name__ == '__main__':
+    main()
@@ -17,14 +17,17 @@
 import os
 import sys
 import subprocess
-from ftplib import FTP
 from datetime import datetime, date, timedelta
 import glob
 import shutil
 import zipfile
 import argparse
+import json
 
 from nrcan_tools import *
+from rinex import *
+from catalog import get_catalog
+from metrics import Stage, day_label, week_label, file_size
 
 def options_make_weekly_rinex():
     parser = argparse.ArgumentParser()
@@ -48,16 +51,240 @@ def options_make_weekly_rinex():
     parser.add_argument('-a','--all_gps_weeks',
         action='store_true',
         help="Process all unprocessed weeks")
+    parser.add_argument('-u','--upload_interval',
+        type=float,required=False,default=0,
+        help="Decimate weekly (upload) file to this many seconds")
+    parser.add_argument('-A','--archive_interval',
+        type=float,required=False,default=0,
+        help="Decimate daily (archive) zip to this many seconds")
 
     args = parser.parse_args()
     return args
 
 
-def make_weekly_rinex(measurement_path, gps_week, zip, cleanup):
+# read the state of the week's partial file; 'size' is the length
+# of the partial .obs after the last complete append, so a crashed
+# append can be rolled back rather than duplicated
+def read_partial_state(m):
+    state = {'days': [], 'size': 0, 'last_epoch': '',
+        'obs_types': [], 'stale': False}
+    try:
+        with open(m.weekly_partial_state,'r') as f:
+            state.update(json.load(f))
+    except FileNotFoundError:
+        pass
+    return state
+
+def write_partial_state(m, state):
+    tmp = m.weekly_partial_state + '.tmp'
+    with open(tmp,'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, m.weekly_partial_state)
+
+# append the newly downloaded daily file to the week's running
+# partial RINEX and daily zip.  Returns True if the day is in the
+# partial file.  Anything odd (out of order day, RINEX 3, obs types
+# that change mid-week) marks the partial as stale so that the
+# weekly run falls back to concatenating with teqc.
+def append_daily_to_weekly(m):
+    try:
+        os.makedirs(m.weekly_partial_dir, exist_ok=True)
+    except Exception as e:
+        print("Couldn't create", m.weekly_partial_dir)
+        return False
+
+    state = read_partial_state(m)
+    if state['stale']:
+        return False
+    if m.gps_dow_num in state['days']:
+        print("Day", m.gps_dow_str, "already in partial weekly file")
+        return True
+    if len(state['days']) > 0 and m.gps_dow_num < max(state['days']):
+        print("Day", m.gps_dow_str, "out of order; weekly file will",
+            "be made from scratch")
+        state['stale'] = True
+        write_partial_state(m, state)
+        return False
+
+    with Stage('append', m.m_name, day_label(m)) as st:
+        with open(m.daily_dnld_path,'r', errors='replace') as inp:
+            header = read_rinex_header(inp)
+            n_types = num_obs_types(header)
+            if int(rinex_version(header)) != 2 or n_types == 0:
+                print("Not a RINEX 2 observation file; can't append",
+                    os.path.basename(m.daily_dnld_path))
+                state['stale'] = True
+                write_partial_state(m, state)
+                st.done('failed')
+                return False
+            if len(state['days']) > 0 and \
+                    obs_types_lines(header) != state['obs_types']:
+                print("Observation types changed mid-week; can't append",
+                    os.path.basename(m.daily_dnld_path))
+                state['stale'] = True
+                write_partial_state(m, state)
+                st.done('failed')
+                return False
+
+            with open(m.weekly_partial_path,'a+') as outp:
+                # throw away anything left by an interrupted append
+                outp.truncate(state['size'])
+                outp.seek(state['size'])
+                if len(state['days']) == 0:
+                    outp.writelines(header)
+                    state['obs_types'] = obs_types_lines(header)
+                # a day file may start with the epoch that ended the day
+                # before (e.g., midnight); don't repeat it
+                prev_epoch = None
+                if state['last_epoch']:
+                    prev_epoch = make_dt_from_iso(state['last_epoch'])
+                last_epoch = None
+                for dt, flag, lines in iter_epochs(inp, n_types):
+                    if prev_epoch is not None and flag in (0, 1, 6) and \
+                            dt <= prev_epoch:
+                        continue
+                    outp.writelines(lines)
+                    if flag in (0, 1):
+                        last_epoch = dt
+                        st.records += 1
+                outp.flush()
+                state['size'] = outp.tell()
+
+        # the daily zip can be built as we go, too
+        try:
+            with zipfile.ZipFile(m.daily_partial_zip_path, mode='a', \
+                    compression=zipfile.ZIP_DEFLATED) as zf:
+                if m.daily_dnld_file not in zf.namelist():
+                    zf.write(m.daily_dnld_path, m.daily_dnld_file)
+        except Exception as e:
+            print("Couldn't add to partial daily zip:", e)
+
+        state['days'].append(m.gps_dow_num)
+        if last_epoch is not None:
+            state['last_epoch'] = make_iso_from_dt(last_epoch)
+        write_partial_state(m, state)
+        st.done(bytes=file_size(m.daily_dnld_path))
+        print("Appended day", m.gps_dow_str, "to partial weekly file",
+            os.path.basename(m.weekly_partial_path))
+        return True
+
+# the day of m, already in the week's partial file, has been
+# replaced by a fuller one.  The partial can't be patched, so mark
+# it stale (the weekly run then starts from the daily files) and
+# drop the partial daily zip, which holds the old copy.
+def invalidate_partial_day(m):
+    state = read_partial_state(m)
+    if m.gps_dow_num not in state['days']:
+        return
+    state['stale'] = True
+    write_partial_state(m, state)
+    try:
+        os.remove(m.daily_partial_zip_path)
+    except FileNotFoundError:
+        pass
+
+# turn the partial weekly file into the real weekly RINEX by
+# rewriting its header.  'files' is the list of daily files that
+# should be in it; returns False (leaving it for teqc) if the
+# partial doesn't hold exactly those days.  With an interval, the
+# body is decimated to that grid on the way through.
+def finalize_weekly_rinex(m, files, interval=0):
+    if not os.path.isfile(m.weekly_partial_path):
+        return False
+    state = read_partial_state(m)
+    days = sorted([find_file_week_and_day(f)[1] for f in files])
+    if state['stale'] or sorted(state['days']) != days:
+        print("Partial weekly file doesn't match daily files;",
+            "concatenating from scratch")
+        return False
+
+    with open(m.weekly_partial_path,'r', errors='replace') as inp:
+        header = read_rinex_header(inp)
+        # per-satellite counts from day 1 are wrong for the week
+        header = drop_header_lines(header, \
+            ('# OF SATELLITES', 'PRN / # OF OBS'))
+        interval = decimation_interval(header, interval)
+        if interval > 0 and header_interval(header) < interval:
+            header = decimated_header(header, interval)
+            print("Decimating weekly file to {:g} s".format(interval))
+        else:
+            interval = 0
+        if state['last_epoch']:
+            last_epoch = make_dt_from_iso(state['last_epoch'])
+            if interval > 0:
+                # the last epoch that survives decimation
+                day = last_epoch.replace(hour=0, minute=0, second=0, \
+                    microsecond=0)
+                secs = (last_epoch - day).total_seconds()
+                last_epoch = day + timedelta(seconds = \
+                    (secs + 0.001) // interval * interval)
+            header = set_header_line(header, 'TIME OF LAST OBS', \
+                format_time_line(last_epoch, 'TIME OF LAST OBS'), \
+                after='TIME OF FIRST OBS')
+        with open(m.weekly_rinex_path,'w') as outp:
+            outp.writelines(header)
+            # body is already in order; copy it through
+            if interval == 0:
+                shutil.copyfileobj(inp, outp)
+            else:
+                for dt, flag, lines in decimate_epochs( \
+                        iter_epochs(inp, num_obs_types(header)), interval):
+                    outp.writelines(lines)
+    print("Made weekly RINEX file", m.weekly_rinex_file, \
+        "from partial file")
+    return True
+
+# move the partial daily zip into place if it holds the same
+# files we would have zipped; returns False if it doesn't
+def finalize_daily_zip(m, files):
+    try:
+        with zipfile.ZipFile(m.daily_partial_zip_path,'r') as zf:
+            names = sorted(zf.namelist())
+    except Exception:
+        return False
+    if names != sorted([os.path.basename(f) for f in files]):
+        return False
+    os.replace(m.daily_partial_zip_path, m.daily_dnld_zip_path)
+    return True
+
+# zip the daily files, decimated to 'interval' seconds; each one
+# is streamed straight into its zip member.  Returns the interval
+# actually kept (see decimation_interval()).
+def zip_daily_decimated(m, files, interval):
+    import io
+    kept = interval
+    with zipfile.ZipFile(m.daily_dnld_zip_path,mode='w', \
+            compression=zipfile.ZIP_DEFLATED) as zf:
+        for f in files:
+            with open(f,'r', errors='replace') as inp, \
+                    zf.open(os.path.basename(f),'w') as raw:
+                outp = io.TextIOWrapper(raw, newline='')
+                count, kept = decimate_rinex(inp, outp, interval)
+                outp.flush()
+                outp.detach()
+    return kept
+
+# get rid of the partial files once the week is done
+def remove_partial_files(m):
+    for f in (m.weekly_partial_path, m.weekly_partial_state, \
+            m.daily_partial_zip_path):
+        try:
+            os.remove(f)
+        except FileNotFoundError:
+            pass
+
+# upload_interval decimates the weekly file that goes to NRCan and
+# archive_interval the daily files kept in the daily zip; 0 keeps
+# the receiver's own rate
+def make_weekly_rinex(measurement_path, gps_week, zip, cleanup, \
+        upload_interval=0, archive_interval=0):
     print("make_weekly_rinex.py:")
 
     os.umask(0o002)     # o-w
-    m = MeasurementFiles(measurement_path,int(gps_week),0)
+    m = get_measurement_files(measurement_path,int(gps_week),0)
+    m.make_dirs()
+    # file count may have changed since m was first made
+    m.count_files()
 
     files = glob.glob(m.daily_dnld_dir + '/*', recursive = False)
     # glob doesn't sort files, so do that
@@ -66,20 +293,33 @@ def make_weekly_rinex(measurement_path, gps_week, zip, cleanup):
         print("Incomplete week -- {} files; skipping".format(len(files)))
         return
 
-    # now run teqc to concatenate the daily files
-    with open(m.weekly_rinex_path,'w') as f:
-        args = ['/usr/local/bin/teqc', '+C2', '-R'] + files
-        try:
-            subprocess.run(args, stdout = f, stderr=subprocess.DEVNULL)
-            #subprocess.run(args, stdout = f)
-        except Exception as e:
-            print("Couldn't run teqc, error:",e)
-            sys.exit()
-        print("Made weekly RINEX file", m.weekly_rinex_file)
+    # use the partial file built as days arrived if we can;
+    # otherwise run teqc to concatenate the daily files
+    with Stage('weekly', m.m_name, week_label(m)) as st:
+        if not finalize_weekly_rinex(m, files, upload_interval):
+            with open(m.weekly_rinex_path,'w') as f:
+                args = ['/usr/local/bin/teqc', '+C2', '-R']
+                # a whole multiple of the daily files' interval
+                with open(files[0],'r', errors='replace') as inp:
+                    upload_interval = decimation_interval( \
+                        read_rinex_header(inp), upload_interval)
+                if upload_interval > 0:
+                    args += ['-O.dec', '{:g}'.format(upload_interval)]
+                args += files
+                try:
+                    subprocess.run(args, stdout = f, stderr=subprocess.DEVNULL)
+                    #subprocess.run(args, stdout = f)
+                except Exception as e:
+                    print("Couldn't run teqc, error:",e)
+                    st.done('failed')
+                    sys.exit()
+                print("Made weekly RINEX file", m.weekly_rinex_file)
+        st.done(bytes=file_size(m.weekly_rinex_path), records=len(files))
 
 #    if zip == True:
     if True:        # always make zip
         # zip the weekly combined file
+        st = Stage('weekly_zip', m.m_name, week_label(m))
         try:
             with zipfile.ZipFile(m.weekly_rinex_zip_path,mode='w', \
                     compression=zipfile.ZIP_DEFLATED) as zf:
@@ -88,21 +328,41 @@ def make_weekly_rinex(measurement_path, gps_week, zip, cleanup):
             print("Zipped weekly RINEX file:", m.weekly_rinex_zip)
         except Exception as e:
             print("Couldn't make weekly zip:",e)
+            st.done('failed')
             sys.exit()
+        st.done(bytes=file_size(m.weekly_rinex_zip_path), records=1)
+        try:
+            get_catalog(m.m_path).add_weekly(m.gps_week_num, \
+                m.weekly_rinex_zip_path, len(files))
+        except Exception as e:
+            print("Couldn't add week to catalog:",e)
 
         # zip up the daily files
         m.make_daily_zip_name()
-        try:
-            with zipfile.ZipFile(m.daily_dnld_zip_path,mode='w', \
-                    compression=zipfile.ZIP_DEFLATED) as zf:
-                for f in files:
-                    zf.write(f, os.path.basename(f))
-                zf.close()
+        if archive_interval > 0:
+            try:
+                kept = zip_daily_decimated(m, files, archive_interval)
+                print("Zipped daily RINEX directory:", \
+                    m.daily_dnld_zip, "(decimated to {:g} s)".format(kept))
+            except Exception as e:
+                print("Couldn't make daily zip:",e)
+                sys.exit()
+        elif finalize_daily_zip(m, files):
             print("Zipped daily RINEX directory:", \
-                m.daily_dnld_zip)
-        except Exception as e:
-            print("Couldn't make daily zip:",e)
-            sys.exit()
+                m.daily_dnld_zip, "(from partial zip)")
+        else:
+            try:
+                with zipfile.ZipFile(m.daily_dnld_zip_path,mode='w', \
+                        compression=zipfile.ZIP_DEFLATED) as zf:
+                    for f in files:
+                        zf.write(f, os.path.basename(f))
+                    zf.close()
+                print("Zipped daily RINEX directory:", \
+                    m.daily_dnld_zip)
+            except Exception as e:
+                print("Couldn't make daily zip:",e)
+                sys.exit()
+    remove_partial_files(m)
     # for now, always remove the .obs after making .zip
     try:
         os.remove(m.weekly_rinex_path)
@@ -117,11 +377,11 @@ def make_weekly_rinex(measurement_path, gps_week, zip, cleanup):
         except:
             print("Couldn't remove directory", m.daily_dnld_dir)
     return
-if __name__ == '__main__':
+def main():
     args = options_make_weekly_rinex()
     # measurement_path, gps_week, make-zip, cleanup, [end_gps_week]
     if args.all_gps_weeks == True:
-        last_week = find_last_weekly_rinex(args.measurement_path)
+        last_week = int(find_last_weekly_rinex(args.measurement_path))
         this_week = find_this_gps_week()
         # loop from last_gps_week to to current gps_week
         if last_week == 0:
@@ -129,12 +389,18 @@ if __name__ == '__main__':
             print("No weeklys found, so starting with",last_week)
         for x in range(last_week,this_week):
             make_weekly_rinex(args.measurement_path, x, \
-            args.make_zip, args.cleanup)
+            args.make_zip, args.cleanup, args.upload_interval, \
+            args.archive_interval)
     elif args.last_gps_week < 0:   # just process one week
         make_weekly_rinex(args.measurement_path, args.gps_week, \
-            args.make_zip, args.cleanup)
+            args.make_zip, args.cleanup, args.upload_interval, \
+            args.archive_interval)
     else:
         # loop from last_gps_week to to current gps_week
-        for x in range(args.gps_last_gps_week,args.gps_week):
+        for x in range(args.last_gps_week,args.gps_week):
             make_weekly_rinex(args.measurement_path, x, \
-            make_zip, cleanup)
+            args.make_zip, args.cleanup, args.upload_interval, \
+            args.archive_interval)
+
+if __name__ == '__main__':
+    main()
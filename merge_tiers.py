@@ -0,0 +1,249 @@
+#!/usr/bin/env -S python3 -u
+
+#################################################
+# merge_tiers.py v.20250604.1
+# copyright 2025 John Ackermann N8UR jra@febo.com
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# Builds one continuous phase series for a measurement from the
+# .clk files under final/, rapid/ and ultra/, taking each epoch
+# from the best tier that has it (FIN over RAP over ULT) and
+# recording which one in a fourth column:
+#
+#     offset iso_8601 doy tier
+#
+# The result is <measurement_path>/best/<name>_phase_best.dat.  A
+# small state file remembers which .clk files (and versions) went
+# into each GPS week, so a run only rebuilds the weeks whose inputs
+# changed -- e.g. when finals arrive for a week we had rapids for --
+# and splices just that week's lines into the file in place.  Only
+# the weeks after it are moved; nothing before it is touched.  A
+# week whose .clk files have all gone is taken out.
+#
+# Usage: merge_tiers.py -m measurement_path [--rebuild]
+
+import os
+import sys
+import glob
+import json
+import argparse
+from datetime import datetime, timedelta
+
+from nrcan_tools import *
+from query import find_offset
+from catalog import week_from_name
+
+# tiers, best first, with the code written in the tier column
+TIERS = (('final', 'FIN'), ('rapid', 'RAP'), ('ultra', 'ULT'))
+
+# day 0 of GPS week 0
+GPS_EPOCH = datetime(1980, 1, 6)
+
+# number of decimal places for offset values (as make_phase_from_clk)
+PLACES = 12
+
+# {gps_week: {tier: [clk paths]}} for a measurement
+def clk_files_by_week(m):
+    weeks = {}
+    for tier, code in TIERS:
+        for f in sorted(glob.glob(m.m_path + tier + '/clk/*.clk')):
+            week = week_from_name(f)
+            if week is not None:
+                weeks.setdefault(week, {}).setdefault(tier, []).append(f)
+    return weeks
+
+# what went into a week: [tier, path, mtime, size] for each file
+def week_signature(tier_files):
+    sig = []
+    for tier, code in TIERS:
+        for f in tier_files.get(tier, []):
+            st = os.stat(f)
+            sig.append([tier, f, st.st_mtime_ns, st.st_size])
+    return sig
+
+# (start, end) datetimes of a gps week
+def week_bounds(week):
+    start = GPS_EPOCH + timedelta(days=7 * week)
+    return start, start + timedelta(days=7)
+
+# {iso_epoch: offset string} from the AR lines of a .clk file
+def read_clk(path):
+    epochs = {}
+    with open(path,'r') as f:
+        for line in f:
+            if not line.startswith('AR'):
+                continue
+            try:
+                iso = make_iso_from_clk(line)
+                offset = float(line.split()[9])
+            except (ValueError, IndexError):
+                print("bad line:",line)
+                continue
+            epochs[iso] = format_dec(offset, PLACES)
+    return epochs
+
+# phase lines for one week, best tier winning each epoch, in time
+# order; epochs outside the week are left to their own week
+def week_lines(week, tier_files):
+    start, end = week_bounds(week)
+    best = {}
+    # worst tier first, so better ones overwrite it
+    for tier, code in reversed(TIERS):
+        for f in tier_files.get(tier, []):
+            for iso, offset in read_clk(f).items():
+                best[iso] = (offset, code)
+    lines = []
+    for iso in sorted(best):
+        dt = make_dt_from_iso(iso)
+        if dt < start or dt >= end:
+            continue
+        offset, code = best[iso]
+        lines.append(offset + ' ' + iso + ' ' + make_doy_from_dt(dt) + \
+            ' ' + code + '\n')
+    return lines
+
+# move bytes [start, end) of open file f so they begin at dest,
+# a block at a time; works whichever way the ranges overlap
+def move_range(f, start, end, dest):
+    block = 1 << 20
+    if dest < start:
+        pos = start
+        while pos < end:
+            n = min(block, end - pos)
+            f.seek(pos)
+            buf = f.read(n)
+            f.seek(dest + pos - start)
+            f.write(buf)
+            pos += n
+    elif dest > start:
+        # back to front, so nothing is overwritten before it's read
+        pos = end
+        while pos > start:
+            n = min(block, pos - start)
+            f.seek(pos - n)
+            buf = f.read(n)
+            f.seek(dest + pos - n - start)
+            f.write(buf)
+            pos -= n
+
+# replace one week's lines in the merged file.  If the week comes
+# after everything in the file it's just appended; otherwise the
+# week's byte range is found by binary search (so nothing else is
+# parsed), the later weeks are moved up or down to fit and the
+# new lines written in the gap.
+def splice_week(path, header, week, lines):
+    start, end = week_bounds(week)
+    data = ''.join(lines).encode()
+    with open_locked_data_file(path) as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            if data:
+                f.write(''.join(header).encode())
+                f.write(data)
+            return
+        a = find_offset(f, start)
+        if a >= size:
+            f.write(data)
+            return
+        b = find_offset(f, end)
+        # f is in append mode; write through a second handle,
+        # still under f's lock
+        with open(path,'r+b') as g:
+            move_range(g, b, size, a + len(data))
+            g.seek(a)
+            g.write(data)
+            g.truncate(a + len(data) + size - b)
+
+def read_state(path):
+    try:
+        with open(path,'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def write_state(path, state):
+    tmp = path + '.tmp'
+    with open(tmp,'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+# bring the merged series up to date; returns number of weeks redone
+def merge_tiers(measurement_path, rebuild=False):
+    os.umask(0o002)     # o-w
+    # date_1, date_2 are placeholders
+    m = get_measurement_files(measurement_path, 2022, 22)
+    m.make_dirs()
+    path = m.phase_path_best
+    header = [
+        '# NRCan PPP best-tier phase data for: ' + m.m_name + '\n',
+        '# fields: offset, iso_8601, doy, tier (FIN, RAP or ULT)\n']
+
+    state = {} if rebuild else read_state(m.phase_state_best)
+    # a splice that didn't finish can leave the file in pieces
+    if state.get('splicing'):
+        print("Last update was interrupted; rebuilding")
+        rebuild = True
+    if not os.path.isfile(path) or rebuild:
+        # start over
+        state = {}
+        if os.path.isfile(path):
+            os.remove(path)
+    done = state.setdefault('weeks', {})
+
+    weeks = clk_files_by_week(m)
+    # weeks whose files have gone come out of the merged file
+    for week in [int(w) for w in done if int(w) not in weeks]:
+        weeks[week] = {}
+
+    count = 0
+    for week, tier_files in sorted(weeks.items()):
+        sig = week_signature(tier_files)
+        if done.get(str(week)) == sig:
+            continue
+        lines = week_lines(week, tier_files)
+        state['splicing'] = week
+        write_state(m.phase_state_best, state)
+        splice_week(path, header, week, lines)
+        tiers = sorted(set(l.split()[3] for l in lines))
+        print("Week", week, ":", len(lines), "epochs from", \
+            ', '.join(tiers) if tiers else "nothing")
+        if tier_files:
+            done[str(week)] = sig
+        else:
+            del done[str(week)]
+        # save as we go, so an interrupted run picks up here
+        del state['splicing']
+        write_state(m.phase_state_best, state)
+        count += 1
+    return count
+
+def options_merge_tiers():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-m','--measurement_path',
+        type=str,required=True,
+        help="Measurement path")
+    parser.add_argument('--rebuild',
+        action='store_true',
+        help="Rebuild the merged file from scratch")
+
+    args = parser.parse_args()
+    return args
+
+def main():
+    args = options_merge_tiers()
+    n = merge_tiers(args.measurement_path, args.rebuild)
+    print("merge_tiers.py:", n, "weeks updated")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env -S python3 -u
+
+#################################################
+# metrics.py v.20250604.1
+# copyright 2025 John Ackermann N8UR jra@febo.com
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# Timing and size of each pipeline stage, so a slow night can be
+# put down to FTP, conversion, zipping, the PPP upload, waiting in
+# NRCan's queue, or our own parsing.  The stages time themselves:
+#
+#     st = Stage('ftp', station, day)
+#     ...
+#     st.done(bytes=size)          # or st.done('failed')
+#
+# or as a context manager, which records 'failed' if the block
+# raises (or exits) before done() is called:
+#
+#     with Stage('weekly', station, week) as st:
+#         ...
+#         st.records = len(files)
+#
+# Each finished stage is appended as one JSON line (time, stage,
+# station, day, status, seconds, bytes, records) to the JSON-lines
+# file, and the Prometheus textfile (for node_exporter's textfile
+# collector) is rewritten with the latest values and running totals
+# for each stage and station.  The totals are kept in a small JSON
+# file next to the textfile so separate runs add up.
+#
+# Nothing is written unless a file is set, either with configure()
+# (nrcan_daemon.py does this from the [metrics] section of its
+# config) or with the NRCAN_METRICS_JSONL and NRCAN_METRICS_TEXTFILE
+# environment variables.
+#
+# Usage: metrics.py jsonl_file [-s stage] [-n station]
+#        (summarizes the runs in a JSON-lines file)
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+config = {'jsonl': os.environ.get('NRCAN_METRICS_JSONL') or None,
+    'textfile': os.environ.get('NRCAN_METRICS_TEXTFILE') or None}
+
+# one writer at a time within a process; other processes are kept
+# out with file locks
+write_lock = threading.Lock()
+
+# per stage and station values in the textfile: (name, help, type)
+SERIES = (
+    ('seconds', "Wall time of the last run", 'gauge'),
+    ('bytes', "Bytes handled by the last run", 'gauge'),
+    ('records', "Records handled by the last run", 'gauge'),
+    ('last_run_timestamp_seconds', "Unix time the last run ended",
+        'gauge'),
+    ('last_success_timestamp_seconds',
+        "Unix time the last successful run ended", 'gauge'),
+    ('seconds_total', "Wall time of all runs", 'counter'),
+    ('bytes_total', "Bytes handled by all runs", 'counter'),
+)
+
+def configure(jsonl=None, textfile=None):
+    if jsonl is not None:
+        config['jsonl'] = jsonl or None
+    if textfile is not None:
+        config['textfile'] = textfile or None
+
+def enabled():
+    return bool(config['jsonl'] or config['textfile'])
+
+class Stage:
+    def __init__(self, name, station='', day=''):
+        self.name = name
+        self.station = station
+        self.day = str(day)
+        self.bytes = 0
+        self.records = 0
+        self.start = time.time()
+        self.finished = False
+
+    # record the stage as finished; bytes and records, if given,
+    # replace what's been set on the object
+    def done(self, status='ok', bytes=None, records=None):
+        if self.finished:
+            return
+        self.finished = True
+        if bytes is not None:
+            self.bytes = bytes
+        if records is not None:
+            self.records = records
+        if not enabled():
+            return
+        end = time.time()
+        rec = {'time': round(end, 3), 'stage': self.name,
+            'station': self.station, 'day': self.day, 'status': status,
+            'seconds': round(end - self.start, 3),
+            'bytes': int(self.bytes), 'records': int(self.records)}
+        try:
+            emit(rec)
+        except OSError as e:
+            print("Couldn't write metrics:",e)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.done()
+        elif issubclass(exc_type, SystemExit) and exc.code in (None, 0):
+            self.done('stopped')
+        else:
+            self.done('failed')
+        return False
+
+# day and week labels for a MeasurementFiles object
+def day_label(m):
+    return m.yyyy_str + '-' + m.doy_str
+
+def week_label(m):
+    return 'W' + m.gps_week_str
+
+# size of a file, 0 if it isn't there
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def emit(rec):
+    import fcntl
+    with write_lock:
+        if config['jsonl']:
+            with open(config['jsonl'],'a') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                f.write(json.dumps(rec, separators=(',', ':')) + '\n')
+        if config['textfile']:
+            update_textfile(config['textfile'], rec)
+
+# fold rec into the totals kept next to the textfile and rewrite it
+def update_textfile(path, rec):
+    import fcntl
+    with open(path + '.state.json','a+') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        f.seek(0)
+        try:
+            state = json.load(f)
+        except ValueError:
+            state = {}
+        key = rec['stage'] + '|' + rec['station']
+        s = state.setdefault(key, {'runs': {}, 'seconds_total': 0.0,
+            'bytes_total': 0, 'last_success_timestamp_seconds': 0})
+        s['seconds'] = rec['seconds']
+        s['bytes'] = rec['bytes']
+        s['records'] = rec['records']
+        s['last_run_timestamp_seconds'] = rec['time']
+        if rec['status'] == 'ok':
+            s['last_success_timestamp_seconds'] = rec['time']
+        s['seconds_total'] += rec['seconds']
+        s['bytes_total'] += rec['bytes']
+        s['runs'][rec['status']] = s['runs'].get(rec['status'], 0) + 1
+
+        tmp = path + '.tmp'
+        with open(tmp,'w') as out:
+            out.writelines(format_textfile(state))
+        os.replace(tmp, path)
+        f.seek(0)
+        f.truncate()
+        json.dump(state, f, separators=(',', ':'))
+
+def label_value(v):
+    return str(v).replace('\\', '\\\\').replace('"', '\\"')
+
+# Prometheus text exposition lines for the state dict
+def format_textfile(state):
+    lines = []
+    keys = sorted(state)
+    for name, text, kind in SERIES:
+        metric = 'nrcan_stage_' + name
+        lines.append('# HELP ' + metric + ' ' + text + '\n')
+        lines.append('# TYPE ' + metric + ' ' + kind + '\n')
+        for key in keys:
+            stage, station = key.split('|', 1)
+            lines.append('{}{{stage="{}",station="{}"}} {}\n'.format(metric,
+                label_value(stage), label_value(station),
+                state[key].get(name, 0)))
+    metric = 'nrcan_stage_runs_total'
+    lines.append('# HELP ' + metric + ' Runs by final status\n')
+    lines.append('# TYPE ' + metric + ' counter\n')
+    for key in keys:
+        stage, station = key.split('|', 1)
+        for status, n in sorted(state[key]['runs'].items()):
+            lines.append('{}{{stage="{}",station="{}",status="{}"}} {}\n' \
+                .format(metric, label_value(stage), label_value(station),
+                label_value(status), n))
+    return lines
+
+def options_metrics():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('path',
+        type=str,
+        help="JSON-lines metrics file")
+    parser.add_argument('-s','--stage',
+        type=str,required=False,default=None,
+        help="Only this stage")
+    parser.add_argument('-n','--station',
+        type=str,required=False,default=None,
+        help="Only this station")
+
+    args = parser.parse_args()
+    return args
+
+def main():
+    args = options_metrics()
+    totals = {}
+    with open(args.path,'r') as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if args.stage and rec['stage'] != args.stage:
+                continue
+            if args.station and rec['station'] != args.station:
+                continue
+            t = totals.setdefault((rec['stage'], rec['station']),
+                [0, 0, 0.0, 0.0, 0])
+            t[0] += 1
+            t[1] += rec['status'] != 'ok'
+            t[2] += rec['seconds']
+            t[3] = max(t[3], rec['seconds'])
+            t[4] += rec['bytes']
+    print('# stage station runs failed mean_s max_s total_bytes')
+    for (stage, station), t in sorted(totals.items()):
+        print('{} {} {} {} {:.3f} {:.3f} {}'.format(stage, station or '-',
+            t[0], t[1], t[2] / t[0], t[3], t[4]))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env -S python3 -u
+
+#################################################
+# nrcan.py v.20250604.1
+# copyright 2025 John Ackermann N8UR jra@febo.com
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# Single entry point for the nrcan_tools suite.  Each subcommand
+# runs one of the tools with its usual arguments; the tool's module
+# (and whatever it drags in, like requests) is only imported when
+# that subcommand is run.
+#
+# Usage: nrcan.py <command> [tool arguments]
+#        nrcan.py <command> -h for the tool's own help
+
+import sys
+import argparse
+import importlib
+
+# subcommand: (module, help)
+COMMANDS = {
+    'run':      ('ppp_runner',
+        "daily pipeline for one station (ppp_runner.py)"),
+    'daemon':   ('nrcan_daemon',
+        "run all stations in a config file (nrcan_daemon.py)"),
+    'watch':    ('watch',
+        "process files as they land in measurement dirs (watch.py)"),
+    'graph':    ('task_graph',
+        "backfill days with stages overlapped (task_graph.py)"),
+    'ftp':      ('get_gps_ftp',
+        "download RINEX from a receiver (get_gps_ftp.py)"),
+    'incr':     ('get_gps_incr',
+        "add the day's new epochs from a receiver (get_gps_incr.py)"),
+    'weekly':   ('make_weekly_rinex',
+        "make weekly RINEX and zip files (make_weekly_rinex.py)"),
+    'check':    ('rinex_check',
+        "check RINEX files before PPP submission (rinex_check.py)"),
+    'decimate': ('rinex_decimate',
+        "thin a RINEX file to a longer interval (rinex_decimate.py)"),
+    'ppp':      ('get_gps_ppp',
+        "submit weekly files to CSRS-PPP (get_gps_ppp.py)"),
+    'misc':     ('make_gps_misc',
+        "add .sum results to pos/offset files (make_gps_misc.py)"),
+    'phase':    ('make_phase_from_clk',
+        "make phase file from .clk files (make_phase_from_clk.py)"),
+    'catalog':  ('catalog',
+        "query or rebuild a measurement's catalog (catalog.py)"),
+    'dates':    ('date_range',
+        "list GPS days with calendar fields (date_range.py)"),
+    'metrics':  ('metrics',
+        "summarize stage timings from a metrics file (metrics.py)"),
+    'query':    ('query',
+        "print a time range from a phase/pos/offset file (query.py)"),
+    'best':     ('merge_tiers',
+        "merge final/rapid/ultra .clk into one phase file (merge_tiers.py)"),
+    'pyramid':  ('pyramid',
+        "read a phase file at plotting resolution (pyramid.py)"),
+    'compare':  ('compare_stations',
+        "difference, statistics and stability of stations (compare_stations.py)"),
+    'drift':    ('freq_drift',
+        "frequency offset and drift of a phase file (freq_drift.py)"),
+    'events':   ('phase_events',
+        "list phase steps, spikes and gaps (phase_events.py)"),
+    'stability': ('stability',
+        "ADEV/MDEV/TDEV of a phase file (stability.py)"),
+}
+
+def options_nrcan(argv):
+    parser = argparse.ArgumentParser(prog='nrcan',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="commands:\n" + "\n".join(["  {:10s}{}".format(k, v[1]) \
+            for k, v in COMMANDS.items()]))
+    parser.add_argument('command', choices=COMMANDS.keys(),
+        metavar='command', help="tool to run (see below)")
+    parser.add_argument('args', nargs=argparse.REMAINDER,
+        help="arguments passed to the tool")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    args = options_nrcan(argv)
+    module = importlib.import_module(COMMANDS[args.command][0])
+    # the tools read their own arguments from sys.argv
+    sys.argv = ['nrcan ' + args.command] + args.args
+    module.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env -S python3 -u
+
+#################################################
+# nrcan_daemon.py v.20250604.1
+# copyright 2025 John Ackermann N8UR jra@febo.com
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# Runs ppp_runner for every station in a config file, in one
+# process.  Stations run side by side in threads, sharing one HTTP
+# session for CSRS-PPP and keeping one FTP connection per receiver;
+# the number of stations allowed in each stage at once (FTP,
+# weekly RINEX, PPP) is set in the config.  A stage that gives up
+# (they call sys.exit()) only ends that station's run.  At the end
+# a status line is printed for each station, and the exit code is
+# the number of stations that failed.
+#
+# The config is TOML (Python 3.11+) or JSON; see
+# nrcan_stations.toml.  Station entries take the same fields as
+# ppp_runner's arguments, with anything missing taken from
+# [defaults].  An optional [metrics] section sets where stage
+# timings go (jsonl = JSON-lines file, textfile = Prometheus
+# textfile for node_exporter); see metrics.py.
+#
+# With -n, each pass just polls the receivers for new data in the
+# current day (get_gps_incr.py) instead of running the daily
+# pipeline; run it every few minutes alongside the daily run.
+#
+# Usage: nrcan_daemon.py -c config [-y year -d doy] [-i hours] [-n]
+#        -i keeps running, starting a new pass every 'hours' hours
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+# stages that can be limited, and the default limit for each
+STAGES = {'ftp': 2, 'weekly': 1, 'ppp': 2}
+
+# station fields and their defaults (None = required)
+STATION_FIELDS = {'measurement_path': None, 'rx_type': None,
+    'fqdn': None, 'station': None, 'email': None,
+    'zip': True, 'cleanup': False, 'daily_ppp': False,
+    'upload_interval': 0, 'archive_interval': 0}
+
+def load_config(path):
+    with open(path,'rb') as f:
+        text = f.read()
+    if path.endswith('.json'):
+        return json.loads(text)
+    import tomllib
+    return tomllib.loads(text.decode())
+
+# list of station dicts with defaults filled in; exits on a bad entry
+def config_stations(config):
+    defaults = config.get('defaults', {})
+    stations = []
+    for i, entry in enumerate(config.get('station', [])):
+        st = dict(STATION_FIELDS)
+        st.update(defaults)
+        st.update(entry)
+        missing = [k for k, v in st.items() if v is None]
+        if missing:
+            print("Station", i + 1, "in config is missing:", \
+                ', '.join(missing))
+            sys.exit(1)
+        stations.append(st)
+    return stations
+
+class FtpConnections:
+    # one open FTP connection per receiver, reopened if it has
+    # dropped since the last time it was used.  Each receiver has
+    # its own lock, so a dead one only holds up its own station.
+    def __init__(self):
+        self.conns = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    def get(self, fqdn):
+        from ftplib import all_errors
+        from get_gps_ftp import ftp_connect
+        with self.lock:
+            lock = self.locks.setdefault(fqdn, threading.Lock())
+        with lock:
+            ftp = self.conns.pop(fqdn, None)
+            if ftp is not None:
+                try:
+                    ftp.voidcmd('NOOP')
+                    self.conns[fqdn] = ftp
+                    return ftp
+                except all_errors:
+                    ftp.close()
+            try:
+                ftp = ftp_connect(fqdn, timeout=60)
+            except all_errors as e:
+                print("Couldn't connect to", fqdn + ":", e)
+                return None
+            self.conns[fqdn] = ftp
+            return ftp
+
+    def close(self):
+        for ftp in list(self.conns.values()):
+            try:
+                ftp.quit()
+            except Exception:
+                ftp.close()
+        self.conns = {}
+
+# run one station; returns (status, seconds, message)
+def run_station(st, year, doy, session, ftps, limits, incremental=False):
+    from ppp_runner import ppp_runner
+    from get_gps_incr import get_gps_incr
+    start = time.time()
+    try:
+        if incremental:
+            with limits.get('ftp'):
+                get_gps_incr(st['measurement_path'], st['rx_type'],
+                    st['fqdn'], st['station'], year, doy,
+                    ftps.get(st['fqdn']))
+            return 'ok', time.time() - start, ''
+        ppp_runner(st['measurement_path'], st['rx_type'], st['fqdn'],
+            st['station'], st['email'], st['zip'], st['cleanup'],
+            year, doy, session=session,
+            ftp=lambda: ftps.get(st['fqdn']),
+            limits=limits, daily_ppp=st['daily_ppp'],
+            upload_interval=st['upload_interval'],
+            archive_interval=st['archive_interval'])
+        return 'ok', time.time() - start, ''
+    except SystemExit as e:
+        # a stage gave up; exit(0) or exit() is a normal stop
+        if e.code in (None, 0):
+            return 'ok', time.time() - start, 'stopped early'
+        return 'failed', time.time() - start, 'exit ' + str(e.code)
+    except Exception as e:
+        traceback.print_exc()
+        return 'failed', time.time() - start, repr(e)
+
+# one pass over all stations; returns {station name: status tuple}
+def run_all(config, year=0, doy=0, incremental=False):
+    import requests
+    import metrics
+    metrics.configure(**config.get('metrics', {}))
+    stations = config_stations(config)
+    limits = dict(STAGES)
+    limits.update(config.get('limits', {}))
+    semaphores = dict((k, threading.BoundedSemaphore(int(v))) \
+        for k, v in limits.items() if k in STAGES)
+    workers = int(limits.get('stations', len(stations))) or 1
+
+    ftps = FtpConnections()
+    results = {}
+    with requests.Session() as session:
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            futures = dict((st['station'], ex.submit(run_station, st,
+                year, doy, session, ftps, semaphores, incremental)) \
+                for st in stations)
+            for name, fut in futures.items():
+                results[name] = fut.result()
+    ftps.close()
+    return results
+
+def print_summary(results):
+    print("nrcan_daemon.py: summary")
+    for name, (status, secs, msg) in results.items():
+        print('  {:12s} {:7s} {:7.1f} s  {}'.format(name, status, secs,
+            msg).rstrip())
+
+def options_nrcan_daemon():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-c','--config',
+        type=str,required=True,
+        help="Station config file (.toml or .json)")
+    parser.add_argument('-y','--year',
+        type=int,required=False,default=0,
+        help="Year to process (default: yesterday; " + \
+            "with -n, today and yesterday)")
+    parser.add_argument('-d','--day_of_year',
+        type=int,required=False,default=0,
+        help="Day of year to process (default: yesterday; " + \
+            "with -n, today and yesterday)")
+    parser.add_argument('-i','--interval',
+        type=float,required=False,default=0,
+        help="Keep running, one pass every INTERVAL hours")
+    parser.add_argument('-n','--incremental',
+        action='store_true',
+        help="Only poll for new data in the current day")
+
+    args = parser.parse_args()
+    return args
+
+def main():
+    args = options_nrcan_daemon()
+    config = load_config(args.config)
+    while True:
+        started = time.time()
+        results = run_all(config, args.year, args.day_of_year,
+            args.incremental)
+        print_summary(results)
+        failed = sum(1 for r in results.values() if r[0] != 'ok')
+        if not args.interval:
+            sys.exit(failed)
+        time.sleep(max(args.interval * 3600 - (time.time() - started), 0))
+
+if __name__ == '__main__':
+    main()
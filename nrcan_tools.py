@@ -21,24 +21,68 @@ import time
 import shutil
 import errno
 import glob
-import random
-import zipfile
-from pprint import pprint
-from gnsscal import *
+import fcntl
 from datetime import datetime, date, timedelta, timezone
-from decimal import Decimal
-from tempfile import NamedTemporaryFile
+# NOTE: gnsscal is imported where it's used rather than here, so
+# that tools which star-import this module start up quickly
 
 # NOTE: final corrections are available about 17 days after
 # the end of each gps_week (e.g., each Wednesday), so we make
 # names for current week as well as two weeks back. 
 
+# directories already created during this run, by m_path
+dirs_made = set()
+
 class MeasurementFiles:
+    # Most attributes are file and directory names that many
+    # callers never look at, so they are filled in on first
+    # access by the method that sets them.  Nothing in __init__
+    # touches the filesystem; call make_dirs() when the output
+    # directories are actually needed.
+    lazy_groups = {
+        'get_today_yesterday': ('today', 'today_year_num',
+            'today_month_num', 'today_day_num', 'today_doy_num',
+            'yesterday', 'yesterday_year_num', 'yesterday_month_num',
+            'yesterday_day_num', 'yesterday_doy_num',
+            'today_gps_week_num', 'today_gps_dow_num',
+            'today_gps_days_num', 'yesterday_gps_week_num',
+            'yesterday_gps_dow_num', 'yesterday_gps_days_num',
+            'today_gps_week_str', 'today_gps_dow_str',
+            'today_gps_days_str', 'yesterday_gps_week_str',
+            'yesterday_gps_dow_str', 'yesterday_gps_days_str'),
+        'make_daily_dnld_file': ('dnld_base', 'daily_dnld_file',
+            'daily_dnld_dir', 'daily_dnld_path', 'daily_incr_dir',
+            'daily_incr_state', 'daily_incr_path'),
+        'count_files': ('num_files',),
+        'make_daily_zip_name': ('daily_dnld_zip', 'daily_dnld_zip_path'),
+        'make_weekly_rinex_file': ('weekly_rinex_file',
+            'weekly_rinex_dir', 'weekly_rinex_path', 'weekly_rinex_zip',
+            'weekly_rinex_zip_path', 'weekly_partial_dir',
+            'weekly_partial_path', 'weekly_partial_state',
+            'daily_partial_zip_path'),
+        'make_output_path_names': ('output_path_final',
+            'output_path_rapid', 'output_path_ultra',
+            'pos_file_final', 'pos_path_final', 'pos_file_rapid',
+            'pos_path_rapid', 'pos_file_ultra', 'pos_path_ultra',
+            'offset_file_final', 'offset_path_final',
+            'offset_file_rapid', 'offset_path_rapid',
+            'offset_file_ultra', 'offset_path_ultra',
+            'output_path_best', 'phase_file_best', 'phase_path_best',
+            'phase_state_best'),
+    }
+
+    # only called when an attribute isn't set yet
+    def __getattr__(self, name):
+        for method, attrs in MeasurementFiles.lazy_groups.items():
+            if name in attrs:
+                getattr(self, method)()
+                return self.__dict__[name]
+        raise AttributeError(name)
+
     # m_path, date_1, date_2 are required
     def __init__(self, m_path, date_1=0, date_2=0):
         self.curr_leap = 18
 
-        self.get_today_yesterday()
         ######################################################
         # NAMING CONVENTIONS:
         # numeric values (day of year, etc.) in integer form 
@@ -91,6 +135,7 @@ class MeasurementFiles:
         # it's a gps week and dow
         if date_1 > 2100 and 0 <= date_2 <= 6:
             # turn gps_week and gps_dow into datetime object
+            from gnsscal import gpswd2date   # pip3 install gnsscal
             self.dt = gpswd2date(date_1,date_2)
             self.gps_week_num = date_1
             self.gps_dow_num = date_2
@@ -100,10 +145,11 @@ class MeasurementFiles:
         # or it's a calendar year and doy
         elif date_1 > 1980 and 0 <= date_2 <= 366:  
             # turn year and doy into gps week and dow
+            from gnsscal import yrdoy2gpswd
             (x,y) = yrdoy2gpswd(date_1,date_2)
-            # and make datetime object
+            # and make datetime object (doy 1 is January 1)
             self.dt = datetime(date_1, 1, 1) + \
-                timedelta(date_2)
+                timedelta(date_2 - 1)
             self.gps_week_num = int(x)
             self.gps_dow_num = int(y)
             self.year_num = date_1
@@ -126,18 +172,6 @@ class MeasurementFiles:
         self.prior_gps_week_num = self.gps_week_num - 1
         self.prior_gps_dow_num = self.gps_dow_num - 1
 
-        # gps week and dow of today
-        (self.today_gps_week_num,self.today_gps_dow_num) = \
-            yrdoy2gpswd(self.today_year_num,self.today_doy_num)
-        self.today_gps_days_num = \
-            (self.today_gps_week_num * 7) + self.today_gps_dow_num
-
-        # gps week and dow of last full day
-        (self.yesterday_gps_week_num,self.yesterday_gps_dow_num) = \
-            yrdoy2gpswd(self.yesterday_year_num,self.yesterday_doy_num)
-        self.yesterday_gps_days_num = \
-            (self.yesterday_gps_week_num * 7) + self.yesterday_gps_dow_num
-
         # week numbering is amusing;
         # we have four choices:
         #self.week_num = int(dt.strftime("%U"))      # Sunday is first day
@@ -173,34 +207,30 @@ class MeasurementFiles:
         self.gps_days_str = '{:05d}'.format(self.gps_days_num)
         self.prior_gps_days_str = '{:05d}'.format(self.prior_gps_days_num)
 
-        self.today_gps_week_str = '{:04d}'.format(self.today_gps_week_num)
-        self.today_gps_dow_str = '{:02d}'.format(self.today_gps_dow_num)
-        self.today_gps_days_str = '{:05d}'.format(self.today_gps_days_num)
-
-        self.yesterday_gps_week_str = \
-            '{:04d}'.format(self.yesterday_gps_week_num)
-        self.yesterday_gps_dow_str = '{:02d}'.format(self.yesterday_gps_dow_num)
-        self.yesterday_gps_days_str = \
-            '{:05d}'.format(self.yesterday_gps_days_num)
-
         # name for weekly files, both current and prior
         self.m_week_name = self.m_name + '__' + self.gps_week_str
         self.m_prior_week_name = \
             self.m_name + '__' + self.prior_gps_week_str
 
-        # call methods to set up all the names
-        self.make_daily_dnld_file()
-        self.num_files = self.get_num_files(self.daily_dnld_dir)
-        self.make_daily_zip_name()
-        self.make_weekly_rinex_file()
-        # don't make download dirs automatically; let get_gps_ftp.py do it
-        #self.make_daily_dnld_dir()
-        self.make_output_path_names()
-        self.make_output_dirs()     # actually create dirs
+        # everything else (file names, file count, today's date)
+        # is set up on first access; see lazy_groups above.
+        # don't make any dirs automatically; callers use make_dirs()
 
     # end of __init__
     ##########################################################
 
+    # fill in all the lazy attributes (e.g., for printing)
+    def load_all(self):
+        for method in MeasurementFiles.lazy_groups:
+            getattr(self, method)()
+
+    # throw away lazy attributes set by methods so they
+    # are recomputed on next access
+    def forget(self, *methods):
+        for method in methods:
+            for attr in MeasurementFiles.lazy_groups[method]:
+                self.__dict__.pop(attr, None)
+
     # get date now, and yesterday
     def get_today_yesterday(self):
         self.today = datetime.utcnow()
@@ -214,6 +244,29 @@ class MeasurementFiles:
         self.yesterday_day_num = int(self.yesterday.day)
         self.yesterday_doy_num = int(self.yesterday.strftime('%j')) 
 
+        from gnsscal import yrdoy2gpswd
+        # gps week and dow of today
+        (self.today_gps_week_num,self.today_gps_dow_num) = \
+            yrdoy2gpswd(self.today_year_num,self.today_doy_num)
+        self.today_gps_days_num = \
+            (self.today_gps_week_num * 7) + self.today_gps_dow_num
+
+        # gps week and dow of last full day
+        (self.yesterday_gps_week_num,self.yesterday_gps_dow_num) = \
+            yrdoy2gpswd(self.yesterday_year_num,self.yesterday_doy_num)
+        self.yesterday_gps_days_num = \
+            (self.yesterday_gps_week_num * 7) + self.yesterday_gps_dow_num
+
+        self.today_gps_week_str = '{:04d}'.format(self.today_gps_week_num)
+        self.today_gps_dow_str = '{:02d}'.format(self.today_gps_dow_num)
+        self.today_gps_days_str = '{:05d}'.format(self.today_gps_days_num)
+
+        self.yesterday_gps_week_str = \
+            '{:04d}'.format(self.yesterday_gps_week_num)
+        self.yesterday_gps_dow_str = '{:02d}'.format(self.yesterday_gps_dow_num)
+        self.yesterday_gps_days_str = \
+            '{:05d}'.format(self.yesterday_gps_days_num)
+
     def make_daily_dnld_file(self):
         # the daily file from the receiver
         self.dnld_base = self.m_path + "download/" 
@@ -221,12 +274,27 @@ class MeasurementFiles:
             self.gps_dow_str + ".obs"
         self.daily_dnld_dir = self.dnld_base + self.m_week_name + '_daily/'
         self.daily_dnld_path = self.daily_dnld_dir + self.daily_dnld_file
+        # state and local copies of the receiver's files for
+        # get_gps_incr.py, which builds the day's file as it goes
+        # (at daily_incr_path, moved to daily_dnld_path when done)
+        self.daily_incr_dir = self.dnld_base + 'incremental/'
+        self.daily_incr_state = self.daily_incr_dir + self.m_week_name + \
+            "_" + self.gps_dow_str + ".json"
+        self.daily_incr_path = self.daily_incr_dir + self.daily_dnld_file
 
     def get_num_files(self,dirname):
         files = glob.glob(dirname + '/*', recursive = False)
+        # on a recount, names with the file count in them
+        # need to be redone
+        if 'num_files' in self.__dict__:
+            self.forget('make_daily_zip_name', 'make_weekly_rinex_file')
         self.num_files = len(files)
         return self.num_files
 
+    # count the files in this week's download dir
+    def count_files(self):
+        return self.get_num_files(self.daily_dnld_dir)
+
     def make_daily_zip_name(self):
         # the zip file of the week's individual files
 
@@ -248,23 +316,6 @@ class MeasurementFiles:
         
     # Concatenate week's daily rinexes into a single file
     def make_weekly_rinex_file(self):
-        # make weekly/ dir in case it's not there
-        try:
-            os.makedirs(self.m_path + '/weekly',exist_ok=True)
-        except Exception as e:
-            print("Couldn't create",self.m_path + '/weekly')
-            print("Exiting...")
-            sys.exit()
-        # make weekly/final dir in case it's not there
-        # (this is where weekly files go after we've gotten
-        # final corrections for them)
-        try:
-            os.makedirs(self.m_path + '/weekly/final',exist_ok=True)
-        except Exception as e:
-            print("Couldn't create",self.m_path + '/weekly/final')
-            print("Exiting...")
-            sys.exit()
-
         # normal full week
         self.weekly_rinex_file = self.m_name + "__" + self.gps_week_str
         if self.num_files == 7:
@@ -286,6 +337,16 @@ class MeasurementFiles:
         self.weekly_rinex_zip_path = \
             self.weekly_rinex_dir + self.weekly_rinex_zip
 
+        # running partial weekly file, appended to as each
+        # daily file arrives and finalized on weekly day
+        self.weekly_partial_dir = self.weekly_rinex_dir + "partial/"
+        self.weekly_partial_path = self.weekly_partial_dir + \
+            self.m_week_name + "_partial.obs"
+        self.weekly_partial_state = self.weekly_partial_dir + \
+            self.m_week_name + "_partial.json"
+        self.daily_partial_zip_path = self.weekly_partial_dir + \
+            self.m_week_name + "_daily_partial.zip"
+
     # make the directory names
     def make_output_path_names(self):
         self.output_path_final = self.m_path + 'final/'
@@ -312,6 +373,14 @@ class MeasurementFiles:
         self.offset_path_ultra = self.output_path_ultra + \
             'misc/' + self.offset_file_ultra
 
+        # phase series merged from the best tier for each epoch
+        # (see merge_tiers.py)
+        self.output_path_best = self.m_path + 'best/'
+        self.phase_file_best = self.m_name + '_phase_best.dat'
+        self.phase_path_best = self.output_path_best + self.phase_file_best
+        self.phase_state_best = self.output_path_best + \
+            '.' + self.m_name + '_phase_best.json'
+
     def make_daily_dnld_dir(self):
         try:
             os.makedirs(self.daily_dnld_dir,exist_ok=True)
@@ -327,6 +396,24 @@ class MeasurementFiles:
             print("Couldn't create",self.weekly_rinex_dir)
             print("Exiting...")
             sys.exit()
+        # make weekly/final dir in case it's not there
+        # (this is where weekly files go after we've gotten
+        # final corrections for them)
+        try:
+            os.makedirs(self.weekly_rinex_dir + 'final',exist_ok=True)
+        except Exception as e:
+            print("Couldn't create",self.weekly_rinex_dir + 'final')
+            print("Exiting...")
+            sys.exit()
+
+    # create weekly and output dirs; only does the work
+    # once per measurement path in each run
+    def make_dirs(self):
+        if self.m_path in dirs_made:
+            return
+        self.make_weekly_dir()
+        self.make_output_dirs()
+        dirs_made.add(self.m_path)
         
     def make_output_dirs(self):
         try:
@@ -347,12 +434,26 @@ class MeasurementFiles:
             os.makedirs(self.output_path_ultra + '/sum', exist_ok=True)
             os.makedirs(self.output_path_ultra + '/misc', exist_ok=True)
             os.makedirs(self.output_path_ultra + '/zip', exist_ok=True)
+
+            os.makedirs(self.output_path_best, exist_ok=True)
         except Exception as e:
             print("Couldn't create directory:",e)
             print("Exiting...")
             sys.exit()
 
 #################### End of MeasurementFiles #########################
+
+# MeasurementFiles objects already made during this run,
+# keyed by (m_path, gps_days_num)
+measurement_files_cache = {}
+
+# return a MeasurementFiles for path and date, reusing one
+# made earlier in this run if there is one
+def get_measurement_files(m_path, date_1=0, date_2=0):
+    m = MeasurementFiles(m_path, date_1, date_2)
+    key = (m.m_path, m.gps_days_num)
+    return measurement_files_cache.setdefault(key, m)
+
 # Following are a bunch of random functions
 # used elsewhere in the nrcan_tools suite
 ######################################################################
@@ -382,6 +483,7 @@ def format_filesize(num, suffix="B"):
 # this will adjust float val by randomly +/-
 # 1 digit at position places (12 = 1 ps)
 def tweak_picos(val,places):
+    import random
     if places == 11:
         adj_val = val + ((random.randint(0,1)*2-1) / 1e11)
     if places == 12:
@@ -493,45 +595,14 @@ def make_DDHHMMSS_from_seconds(t_secs):
 
 # find the last daily rinex that has been
 # downloaded to <measurement_name>/download
+# (looked up in the measurement's catalog; see catalog.py)
 def find_last_daily_rinex(path):
-    m = MeasurementFiles(path,0,0)
-    days = []
-    weeks = []
-    zips = []
-
-    # find the number of weekly directories
-    dirs = [f.path for f in os.scandir(m.dnld_base) if f.is_dir()]
-    for f in dirs:
-        # this filters out any bak, etc. directories
-        if os.path.basename(f).startswith(m.m_name):
-            weeks.append(f)
-    # numeric sort
-    weeks.sort(key=lambda f: int(''.join(filter(str.isdigit, f))))
-    # get the last week and dow numbers
-    if len(weeks) > 0:
-        latest_week = weeks[len(weeks) - 1]
-        latest_week_num = int(latest_week.split('__')[1][:4])
-        days = [f.path for f in os.scandir(latest_week) if f.is_file()]
-        days.sort(key=lambda f: int(''.join(filter(str.isdigit, f))))
-        latest_dow_file = days[len(days)-1]
-        # extract the day of week whether in DD or D format
-        # and using either my old or my new filename convention
-        date_part = os.path.basename(latest_dow_file). \
-            partition("__")[2].partition(".obs")[0]
-        date_part = date_part.partition("daily")[0]
-        latest_gps_week_num,latest_gps_dow_num = date_part.split("_")
-        latest_gps_week_num = int(latest_gps_week_num)
-        latest_gps_dow_num = int(latest_gps_dow_num)
-    else:
-    # if none, find the last weekly zip (this assumes it's a full week!)
-        zips = glob.glob(m.dnld_base + "*.zip")
-        zips.sort(key=lambda f: int(''.join(filter(str.isdigit, f))))
-        latest_gps_week = zips[len(zips) - 1]
-        latest_gps_week_num = latest_gps_week.split('__')[1][:4]
-        # assume zipped week is full week
-        latest_gps_dow_num = 6
-    latest_year, latest_doy = \
-        gpswd2yrdoy(int(latest_gps_week_num), int(latest_gps_dow_num))
+    from catalog import get_catalog
+    last = get_catalog(path).last_daily()
+    if last is None:
+        print("No daily RINEX files found for", path)
+        sys.exit()
+    latest_gps_week_num, latest_gps_dow_num, latest_year, latest_doy = last
     print("Latest GPS week, day of week, calendar year, and day of year:", \
         latest_gps_week_num, latest_gps_dow_num, latest_year, latest_doy)
     return latest_gps_week_num, latest_gps_dow_num, latest_year, latest_doy
@@ -539,15 +610,10 @@ def find_last_daily_rinex(path):
 # find the last weekly rinex that has
 # been made in <measurement_name>/weekly
 def find_last_weekly_rinex(path):
-    m = MeasurementFiles(path,0,0)
-    files = glob.glob(m.m_path + "/weekly/*.obs*")
-    files.sort(key=lambda f: int(''.join(filter(str.isdigit, f))))
-    if len(files) > 0:
-        latest_gps_week = files[len(files) - 1]
-        latest_gps_week_num = latest_gps_week.split('__')[1][:4]
-    else:
+    from catalog import get_catalog
+    latest_gps_week_num = get_catalog(path).last_weekly()
+    if latest_gps_week_num is None:
         latest_gps_week_num = 0
-        
     print("Latest GPS week:",latest_gps_week_num)
     return latest_gps_week_num
 
@@ -555,8 +621,9 @@ def find_last_weekly_rinex(path):
 def find_file_week_and_day(infile):
     # get rid of measurement name
     date_part = os.path.basename(infile).partition("__")[2]
-    # get rid of extension
+    # get rid of extension (and "daily" from the old convention)
     date_part = date_part.partition(".obs")[0]
+    date_part = date_part.partition("daily")[0]
     date_part = date_part.split("_",2)[:2]
     # split week and dow
     gps_week,gps_dow = date_part
@@ -569,9 +636,107 @@ def find_this_gps_week():
     today_year = int(today.year)
     today_doy = int(today.strftime('%j')) 
     # turn year and doy into gps week and dow
+    from gnsscal import yrdoy2gpswd
     (x,y) = yrdoy2gpswd(today_year,today_doy)
     return int(x)
 
+##### append-only data files (pos, offset) #####
+
+# return the last non-empty line of an open binary file,
+# reading backwards from the end in blocks (b'' if none)
+def read_last_line(f, blocksize=4096):
+    f.seek(0, os.SEEK_END)
+    end = f.tell()
+    buf = b''
+    pos = end
+    while pos > 0:
+        step = min(blocksize, pos)
+        pos -= step
+        f.seek(pos)
+        buf = f.read(step) + buf
+        stripped = buf.rstrip(b'\r\n')
+        # need a newline before the last line unless we're at the top
+        nl = stripped.rfind(b'\n')
+        if nl >= 0:
+            return stripped[nl + 1:]
+    return buf.rstrip(b'\r\n')
+
+# returns (have_header, last_timestamp) for an open binary data file
+# whose data lines start with a unix timestamp; only looks at
+# the first byte and the last line
+def get_data_file_state(f):
+    f.seek(0)
+    have_header = f.read(1) == b'#'
+    last_time = 0
+    last = read_last_line(f)
+    if last and not last.startswith(b'#'):
+        try:
+            last_time = int(last.split()[0])
+        except (ValueError, IndexError):
+            pass
+    return have_header, last_time
+
+# open a data file for appending with an exclusive advisory lock.
+# If another run replaced the file (see merge_data_lines) while we
+# waited for the lock, open the new one instead.  Caller unlocks
+# by closing the file.
+def open_locked_data_file(path):
+    while True:
+        f = open(path,'ab+')
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            if os.fstat(f.fileno()).st_ino == os.stat(path).st_ino:
+                return f
+        except FileNotFoundError:
+            pass
+        f.close()
+
+# append line (with data timestamp 'timestamp') to a data file,
+# writing header lines first if the file is new.  Takes an
+# advisory lock so concurrent runs can append safely.  Returns
+# False without writing if the file already has later data.
+def append_data_line(path, header, line, timestamp):
+    with open_locked_data_file(path) as f:
+        have_header, last_time = get_data_file_state(f)
+        if int(timestamp) < last_time:
+            return False
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0 and not have_header:
+            for buf in header:
+                f.write(buf.encode())
+        f.write(line.encode())
+        f.flush()
+    return True
+
+# merge new_lines ({timestamp: line}) into a data file in a single
+# pass: existing and new lines are combined, deduplicated by
+# timestamp (new lines win) and written back in time order, then
+# atomically swapped in.  Existing header lines are kept; 'header'
+# is used if the file has none.  Returns number of data lines.
+def merge_data_lines(path, header, new_lines):
+    with open_locked_data_file(path) as f:
+        f.seek(0)
+        old_header = []
+        data = {}
+        for raw in f:
+            line = raw.decode()
+            if line.startswith('#'):
+                old_header.append(line)
+                continue
+            try:
+                data[int(line.split()[0])] = line
+            except (ValueError, IndexError):
+                continue
+        data.update(new_lines)
+
+        tmp = path + '.tmp'
+        with open(tmp,'w') as outp:
+            outp.writelines(old_header if old_header else header)
+            for timestamp in sorted(data):
+                outp.write(data[timestamp])
+        os.replace(tmp, path)
+    return len(data)
+
 # read  phase file (offset, epoch, doy) return dt of first epoch
 def get_first_epoch(phase_file):
     first_epoch= datetime.min
@@ -624,6 +789,7 @@ def get_tau(phase_file):
 
 
 if __name__ == '__main__':
+    from pprint import pprint
     # m_path, date_1, date_2
     if len(sys.argv) == 4:
         testObj = MeasurementFiles(sys.argv[1],sys.argv[2], \
@@ -635,5 +801,6 @@ if __name__ == '__main__':
     else:
         print("Need at least one command line argument!")
         sys.exit()
+    testObj.load_all()
     pprint(vars(testObj))
 
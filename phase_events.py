@@ -0,0 +1,212 @@
+#!/usr/bin/env -S python3 -u
+
+#################################################
+# phase_events.py v.20250604.1
+# copyright 2025 John Ackermann N8UR jra@febo.com
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# Finds phase steps, spikes and gaps in clock offset data as it
+# streams by, so make_phase_from_clk.py can flag bad PPP arcs and
+# receiver resets while it writes the phase file.
+#
+# Each first difference of the phase is compared with the median of
+# the last WINDOW good differences; if it's more than K robust
+# sigmas (1.4826 * median absolute deviation) away it's an outlier.
+# We then wait one sample: if the next difference jumps back by
+# about the same amount, the sample between them was a spike;
+# otherwise the phase stepped.  Outliers don't go into the window,
+# so one bad point doesn't hide the next.  But if RATE_RUN outliers
+# go the same way, with nothing on the other side of the median in
+# between, the frequency has changed: that's one step with detail
+# 'rate', and the window starts again from the new differences so
+# the median follows the new rate.  A gap is any jump in epoch of
+# more than 1.5 sample intervals; the difference across a gap isn't
+# tested.
+#
+# Events are (kind, iso_epoch, size_s, detail) with kind 'step',
+# 'spike' or 'gap'; for gaps, size is the length in seconds and
+# detail the number of missing epochs; for rate changes, size is
+# the change in fractional frequency.
+#
+# Usage: phase_events.py phase_file   (prints events in a phase file)
+
+import os
+import sys
+from bisect import insort, bisect_left
+
+# good differences kept for the median
+WINDOW = 101
+# outlier threshold, robust sigmas
+K = 6.0
+# a spike's two differences must cancel to within this many
+# robust sigmas
+SPIKE_K = 3.0
+# recompute the MAD this often (samples); it changes slowly and
+# is the expensive part
+MAD_EVERY = 16
+# this many same-signed outliers in a row is a frequency change,
+# not a run of steps
+RATE_RUN = 8
+# smallest robust sigma we'll believe, seconds (quantized data
+# can have a MAD of 0)
+MIN_SIGMA = 1e-13
+
+def median(sorted_vals):
+    n = len(sorted_vals)
+    mid = n // 2
+    if n % 2:
+        return sorted_vals[mid]
+    return (sorted_vals[mid - 1] + sorted_vals[mid]) / 2.0
+
+class EventDetector:
+    def __init__(self, window=WINDOW, k=K):
+        self.window = window
+        self.k = k
+        self.recent = []        # good differences, oldest first
+        self.ordered = []       # same, sorted
+        self.sigma = None
+        self.since_mad = 0
+        self.tau = None         # sample interval, seconds
+        self.prev = None        # (dt, offset) of the last sample
+        self.pending = []       # (dt, diff, outlier) since the first
+                                # outlier, all off the same way
+        self.events = []
+
+    def event(self, kind, dt, size, detail=''):
+        self.events.append((kind, dt.isoformat(), size, detail))
+
+    # remember a good difference
+    def keep(self, d):
+        self.recent.append(d)
+        insort(self.ordered, d)
+        if len(self.recent) > self.window:
+            old = self.recent.pop(0)
+            del self.ordered[bisect_left(self.ordered, old)]
+        self.since_mad += 1
+        if len(self.recent) < self.window or self.since_mad >= MAD_EVERY:
+            med = median(self.ordered)
+            mad = median(sorted([abs(v - med) for v in self.ordered]))
+            self.sigma = max(1.4826 * mad, MIN_SIGMA)
+            self.since_mad = 0
+
+    # feed one sample (datetime, offset in seconds), in time order
+    def add(self, dt, offset):
+        if self.prev is None:
+            self.prev = (dt, offset)
+            return
+        step = (dt - self.prev[0]).total_seconds()
+        if step <= 0:
+            return
+        if self.tau is None or step < self.tau:
+            self.tau = step
+        if step > 1.5 * self.tau:
+            self.finish_pending()
+            self.event('gap', self.prev[0], step,
+                str(int(round(step / self.tau)) - 1))
+            self.prev = (dt, offset)
+            return
+        d = offset - self.prev[1]
+        self.prev = (dt, offset)
+
+        # not enough history yet to judge
+        if len(self.ordered) < min(self.window, 20):
+            self.keep(d)
+            return
+        med = median(self.ordered)
+        out = abs(d - med) > self.k * self.sigma
+
+        if self.pending:
+            p_dt, p_d, p_out = self.pending[0]
+            if out and len(self.pending) == 1 and \
+                    abs((p_d - med) + (d - med)) < SPIKE_K * self.sigma:
+                # went out and came back: p_dt was a spike
+                self.event('spike', p_dt, p_d - med)
+                self.pending = []
+                return
+            if (d - med) * (p_d - med) > 0:
+                # still off the same way; enough of that is a new rate
+                self.pending.append((dt, d, out))
+                if not out:
+                    self.keep(d)
+                elif sum(1 for p in self.pending if p[2]) >= RATE_RUN:
+                    self.rate_change(med)
+                return
+            self.finish_pending()
+        if out:
+            # decide when we see the next sample
+            self.pending = [(dt, d, True)]
+        else:
+            self.keep(d)
+
+    # the pending run is a frequency change: one event, then judge
+    # what follows against the new differences only
+    def rate_change(self, med):
+        diffs = [p_d for p_dt, p_d, p_out in self.pending]
+        new = median(sorted(diffs))
+        self.event('step', self.pending[0][0], (new - med) / self.tau,
+            'rate')
+        self.pending = []
+        self.recent = []
+        self.ordered = []
+        self.since_mad = 0
+        for d in diffs:
+            self.keep(d)
+
+    # outliers with no lookahead (last sample, or before a gap), or
+    # in a run too short to be a rate change, are called steps
+    def finish_pending(self):
+        if self.pending:
+            med = median(self.ordered)
+            for p_dt, p_d, p_out in self.pending:
+                if p_out:
+                    self.event('step', p_dt, p_d - med)
+            self.pending = []
+
+    # call after the last sample; returns the events
+    def close(self):
+        self.finish_pending()
+        return self.events
+
+# events file for a phase file
+def events_path(phase_path):
+    root, ext = os.path.splitext(phase_path)
+    return root + '_events' + (ext or '.dat')
+
+def format_event(ev):
+    kind, iso, size, detail = ev
+    return '{} {} {:+.6e} {}'.format(iso, kind, size, detail).rstrip()
+
+def write_events(path, events, source=''):
+    with open(path,'w') as f:
+        f.write('# phase events' + (' in ' + source if source else '') + \
+            '\n')
+        f.write('# fields: iso_8601, kind (step, spike, gap), ' + \
+            'size (s; fractional frequency for rate), ' + \
+            'missing epochs (gaps) or rate\n')
+        for ev in events:
+            f.write(format_event(ev) + '\n')
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: phase_events.py phase_file")
+        sys.exit()
+    from query import query
+    from nrcan_tools import make_dt_from_iso
+    det = EventDetector()
+    for line in query(sys.argv[1]):
+        parts = line.split()
+        det.add(make_dt_from_iso(parts[1]), float(parts[0]))
+    for ev in det.close():
+        print(format_event(ev))
+
+if __name__ == '__main__':
+    main()
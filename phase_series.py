@@ -0,0 +1,129 @@
+#!/usr/bin/env -S python3 -u
+
+#################################################
+# phase_series.py v.20250604.1
+# copyright 2025 John Ackermann N8UR jra@febo.com
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# Reads phase files from make_phase_from_clk.py ("offset iso doy"
+# lines) into NumPy arrays, either whole or a chunk at a time, with
+# the epochs as integer unix seconds.  gridded_chunks() puts the
+# data on a uniform tau0 grid with NaN where epochs are missing, so
+# the samples line up in time across gaps and chunk boundaries.
+
+import numpy as np          # pip3 install numpy
+
+from query import find_offset, to_dt
+
+# samples per chunk when reading in pieces
+CHUNK = 1 << 20
+
+# (epochs, offsets) arrays from a list of phase file lines
+def parse_lines(lines):
+    if not lines:
+        return np.zeros(0, np.int64), np.zeros(0)
+    parts = [line.split(None, 2) for line in lines]
+    offsets = np.array([p[0] for p in parts], dtype=float)
+    epochs = np.array([p[1] for p in parts], dtype='datetime64[s]')
+    return epochs.astype(np.int64), offsets
+
+# yield (epochs, offsets) arrays of about chunk samples each, for
+# data lines with start <= epoch < end (either may be None).  The
+# start is found by query.find_offset(); after that lines are parsed
+# a chunk at a time and the end checked on the arrays.
+def read_chunks(path, start=None, end=None, chunk=CHUNK):
+    start = to_dt(start)
+    end = to_dt(end)
+    if end is not None:
+        end = np.datetime64(end, 's').astype(np.int64)
+    with open(path,'r') as f:
+        if start is not None:
+            with open(path,'rb') as fb:
+                f.seek(find_offset(fb, start))
+        while True:
+            lines = f.readlines(chunk * 48)
+            if not lines:
+                break
+            epochs, offsets = parse_lines([line for line in lines \
+                if line[:1] not in ('#', '\n', '')])
+            if end is not None and len(epochs) and epochs[-1] >= end:
+                n = np.searchsorted(epochs, end)
+                if n:
+                    yield epochs[:n], offsets[:n]
+                break
+            if len(epochs):
+                yield epochs, offsets
+
+# whole file (or time range) as (epochs, offsets) arrays
+def read_phase(path, start=None, end=None):
+    epochs = []
+    offsets = []
+    for e, x in read_chunks(path, start, end):
+        epochs.append(e)
+        offsets.append(x)
+    if not epochs:
+        return np.zeros(0, np.int64), np.zeros(0)
+    return np.concatenate(epochs), np.concatenate(offsets)
+
+# sample interval in seconds: the most common spacing in the
+# first chunk of the file
+def guess_tau0(path, start=None, end=None):
+    for e, x in read_chunks(path, start, end, chunk=10000):
+        d = np.diff(e)
+        d = d[d > 0]
+        if len(d):
+            vals, counts = np.unique(d, return_counts=True)
+            return int(vals[np.argmax(counts)])
+        break
+    return None
+
+class Gridder:
+    # puts successive (epochs, values) arrays on a uniform tau0 grid
+    # starting at the first epoch seen, NaN for missing epochs.  The
+    # grids from consecutive calls are contiguous, and epochs off the
+    # grid or not later than every one before them are dropped.
+    def __init__(self, tau0):
+        self.tau0 = tau0
+        self.t0 = None
+        self.next_i = 0
+
+    # returns (first_epoch, grid), or None if nothing was kept
+    def add(self, epochs, values):
+        if not len(epochs):
+            return None
+        if self.t0 is None:
+            self.t0 = int(epochs[0])
+        idx = epochs - self.t0
+        ok = (idx % self.tau0 == 0)
+        idx = idx[ok] // self.tau0
+        values = values[ok]
+        prev_max = np.maximum.accumulate(
+            np.concatenate(([self.next_i - 1], idx)))
+        keep = idx > prev_max[:-1]
+        idx = idx[keep]
+        values = values[keep]
+        if not len(idx):
+            return None
+        grid = np.full(int(idx[-1]) - self.next_i + 1, np.nan)
+        grid[idx - self.next_i] = values
+        first = self.t0 + self.next_i * self.tau0
+        self.next_i = int(idx[-1]) + 1
+        return first, grid
+
+# yield (first_epoch, offsets) with offsets on a uniform tau0 grid
+# (see Gridder)
+def gridded_chunks(path, tau0, start=None, end=None, chunk=CHUNK):
+    gridder = Gridder(tau0)
+    for epochs, offsets in read_chunks(path, start, end, chunk):
+        out = gridder.add(epochs, offsets)
+        if out is not None:
+            yield out
@@ -16,23 +16,25 @@
 #
 # Parent program to manage files on receiver to NrCan PPP results
 #
+# With -p (daily_ppp) each day's file is also sent to PPP as soon
+# as it's downloaded, for ultra-rapid and then rapid results (see
+# get_gps_ppp_daily()); the weekly file still gets the finals.
+#
 # Usage: ppp_runner.py measurement_path, rx_type, \
-#    fqdn, station, user, zip, cleanup, year, doy
+#    fqdn, station, user, zip, cleanup, year, doy, daily_ppp, \
+#    upload_interval, archive_interval
 
+import os
 import sys
-import subprocess
+import glob
 import time
 import argparse
-from ftplib import FTP
+from contextlib import nullcontext
 from datetime import datetime, date, timedelta
-from pathlib import Path
 
+# the stage modules are imported in ppp_runner() as they're
+# needed, so days without weekly work don't load requests, etc.
 from nrcan_tools import *
-from get_gps_ftp import *
-from get_gps_ppp import *
-from make_phase_from_clk import *
-from make_pos_file import *
-from make_weekly_rinex import *
 
 def options_ppp_runner():
     parser = argparse.ArgumentParser()
@@ -64,14 +66,36 @@ def options_ppp_runner():
     parser.add_argument('-d','--day_of_year',
         type=int,required=False,default=0,
         help="Day of year to process")
+    parser.add_argument('-p','--daily_ppp',
+        action='store_true',
+        help="Also submit each daily file for rapid/ultra results")
+    parser.add_argument('-u','--upload_interval',
+        type=float,required=False,default=0,
+        help="Decimate weekly (upload) file to this many seconds")
+    parser.add_argument('-A','--archive_interval',
+        type=float,required=False,default=0,
+        help="Decimate daily (archive) zip to this many seconds")
 
     args = parser.parse_args()
     return args
 
 ##########################################################
+# session, ftp and limits are for running several stations in
+# one process (see nrcan_daemon.py): a shared requests.Session,
+# an open FTP connection to this receiver, or a function returning
+# one that's called once the 'ftp' stage is ours (so it isn't left
+# idle while other stations download), and a dict of stage name
+# ('ftp', 'weekly', 'ppp') -> semaphore limiting how many stations
+# run that stage at once
 def ppp_runner(measurement_path, rx_type, \
-    fqdn, station, user, zip, cleanup, year, doy):
+    fqdn, station, user, zip, cleanup, year, doy, \
+    session=None, ftp=None, limits=None, daily_ppp=False, \
+    upload_interval=0, archive_interval=0):
 
+    def stage(name):
+        if limits and name in limits:
+            return limits[name]
+        return nullcontext()
 
     os.umask(0o002)     # o-w
 
@@ -79,25 +103,47 @@ def ppp_runner(measurement_path, rx_type, \
     if (year == 0) and (doy == 0):
         print("processing yesterday")
         print("year,day of year",year, doy)
-        m = MeasurementFiles(measurement_path, "yesterday")
+        m = get_measurement_files(measurement_path, "yesterday")
     else:
-        m = MeasurementFiles(measurement_path, year, doy)
+        m = get_measurement_files(measurement_path, year, doy)
+    # create output dirs once for the whole run
+    m.make_dirs()
 
     print("ppp_runner.py:")
     print("measurement_path:",measurement_path)
     print("gps week and day to process:",m.gps_week_num,m.gps_dow_str)
 
-    get_gps_ftp(measurement_path, rx_type, fqdn, station,year,doy)
+    from get_gps_ftp import get_gps_ftp
+    with stage('ftp'):
+        if callable(ftp):
+            ftp = ftp()
+        # m's day, so the download, the daily lane and the weekly
+        # step all work on the same day
+        get_gps_ftp(measurement_path, rx_type, fqdn, station, \
+            m.year_num, m.doy_num, ftp)
     
     files_this_week = m.get_num_files(m.daily_dnld_dir)
 
+    # the daily lane; a failure here shouldn't stop the weekly work
+    if daily_ppp:
+        from get_gps_ppp import get_gps_ppp_daily
+        try:
+            with stage('ppp'):
+                get_gps_ppp_daily(m, user, session)
+        except (Exception, SystemExit) as e:
+            print("Daily PPP processing failed:",e)
+
     # Do weekly stuff on Thursday (GPS week day 4)
     # because that should get us the latest final
     # corrections (about 17 days after the end of
     # the GPS week)
     if m.gps_dow_num == 4:
+        from make_weekly_rinex import make_weekly_rinex
+        from get_gps_ppp import get_gps_ppp
         print("Making weekly RINEX file for gps week",m.gps_week_str)
-        make_weekly_rinex(m.m_path, m.gps_week_num, zip, cleanup)
+        with stage('weekly'):
+            make_weekly_rinex(m.m_path, m.gps_week_num, zip, cleanup, \
+                upload_interval, archive_interval)
 
         # upload all the files in the weekly/ directory to NRCan for
         # processing.  This includes the one we just made, as well
@@ -107,15 +153,22 @@ def ppp_runner(measurement_path, rx_type, \
 
         rinex_path = m.m_path + "/weekly/*.obs.zip"
         try:
-            get_gps_ppp(rinex_path, measurement_path, user)
+            with stage('ppp'):
+                for f in sorted(glob.glob(rinex_path)):
+                    get_gps_ppp(f, measurement_path, user, session)
         except Exception as e:
             print("Couldn't do NRCan processing. Exiting...")
             print("Error:",e)
 
 ##########################################################
-if __name__ == '__main__':
+def main():
     args = options_ppp_runner()
     ppp_runner(args.measurement_path,args.rx_type,args.fqdn,
         args.station,args.email,args.zip,args.cleanup,
-        args.year,args.day_of_year)
+        args.year,args.day_of_year,daily_ppp=args.daily_ppp,
+        upload_interval=args.upload_interval,
+        archive_interval=args.archive_interval)
+
+if __name__ == '__main__':
+    main()
 
@@ -0,0 +1,188 @@
+#!/usr/bin/env -S python3 -u
+
+#################################################
+# pyramid.py v.20250604.1
+# copyright 2025 John Ackermann N8UR jra@febo.com
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# Decimated copies of a phase file for plotting.  Each level bins
+# the data into fixed intervals (300 s, 1 hour, 1 day by default,
+# aligned to the UTC clock) and keeps the mean, min and max offset
+# and the number of samples in each bin.  Level files sit next to
+# the full-rate file as <name>_<seconds>s.dat, with lines
+#
+#     mean iso_8601_bin_start min max count
+#
+# so query.py and phase_series.py read them like any phase file.
+# The builder is fed one sample at a time during the pass that
+# writes the full-rate file, so making them costs no extra read.
+#
+# read_pyramid() picks the coarsest level that still has bins no
+# wider than the resolution asked for, and falls back to the
+# full-rate file if none does.
+#
+# Usage: pyramid.py phase_file [-s start] [-e end]
+#        [-r resolution_seconds | -n max_points]
+
+import os
+import argparse
+import calendar
+from datetime import datetime
+
+from query import query, to_dt, file_span
+
+# default bin widths in seconds
+LEVELS = (300, 3600, 86400)
+
+# level file name for a phase file and bin width
+def level_path(phase_path, level):
+    root, ext = os.path.splitext(phase_path)
+    return root + '_' + str(level) + 's' + (ext or '.dat')
+
+class Level:
+    # one level being written; lines go to a temp file until close()
+    def __init__(self, phase_path, level, places=12):
+        self.level = level
+        self.fmt = '{:+.' + str(places) + 'f}'
+        self.path = level_path(phase_path, level)
+        self.out = open(self.path + '.tmp','w')
+        self.out.write('# ' + str(level) + ' s bins of ' + \
+            os.path.basename(phase_path) + '\n')
+        self.out.write('# fields: mean, iso_8601 (bin start), min, ' + \
+            'max, count\n')
+        self.bin = None
+
+    def add(self, ts, offset):
+        b = ts - ts % self.level
+        if b != self.bin:
+            self.flush()
+            self.bin = b
+            self.total = 0.0
+            self.lo = self.hi = offset
+            self.n = 0
+        self.total += offset
+        self.n += 1
+        if offset < self.lo:
+            self.lo = offset
+        if offset > self.hi:
+            self.hi = offset
+
+    def flush(self):
+        if self.bin is None:
+            return
+        f = self.fmt
+        self.out.write(f.format(self.total / self.n) + ' ' + \
+            datetime.utcfromtimestamp(self.bin).isoformat() + ' ' + \
+            f.format(self.lo) + ' ' + f.format(self.hi) + ' ' + \
+            str(self.n) + '\n')
+
+    def close(self):
+        self.flush()
+        self.out.close()
+        os.replace(self.path + '.tmp', self.path)
+
+class PyramidBuilder:
+    # feed samples in time order with add(), then close()
+    def __init__(self, phase_path, levels=LEVELS, places=12):
+        self.levels = [Level(phase_path, l, places) for l in levels]
+
+    # dt is a (UTC/GPS) datetime, offset a float
+    def add(self, dt, offset):
+        ts = calendar.timegm(dt.timetuple())
+        for level in self.levels:
+            level.add(ts, offset)
+
+    def close(self):
+        for level in self.levels:
+            level.close()
+
+# levels that exist for a phase file, finest first
+def available_levels(phase_path):
+    root, ext = os.path.splitext(os.path.basename(phase_path))
+    tail = 's' + (ext or '.dat')
+    found = []
+    for f in os.listdir(os.path.dirname(os.path.abspath(phase_path))):
+        if f.startswith(root + '_') and f.endswith(tail):
+            try:
+                found.append(int(f[len(root) + 1:-len(tail)]))
+            except ValueError:
+                continue
+    return sorted(found)
+
+# (path, level) to read for a window: the coarsest level with bins
+# no wider than resolution seconds, or the full-rate file (level 0)
+def pick_level(phase_path, resolution):
+    best = (phase_path, 0)
+    for level in available_levels(phase_path):
+        if level <= resolution:
+            best = (level_path(phase_path, level), level)
+    return best
+
+# yield (iso, mean, min, max, count) for start <= epoch < end at
+# the given resolution in seconds, or at whatever resolution gives
+# no more than max_points points over the window
+def read_pyramid(phase_path, start=None, end=None, resolution=None,
+        max_points=None):
+    start = to_dt(start)
+    end = to_dt(end)
+    if resolution is None:
+        resolution = 0
+        if max_points:
+            first, last = file_span(phase_path)
+            if first is not None:
+                span = ((end or last) - (start or first)).total_seconds()
+                resolution = span / max_points
+    path, level = pick_level(phase_path, resolution)
+    if level and start is not None:
+        # include the bin that start falls in
+        ts = calendar.timegm(start.timetuple())
+        start = datetime.utcfromtimestamp(ts - ts % level)
+    for line in query(path, start, end):
+        parts = line.split()
+        if level:
+            yield parts[1], float(parts[0]), float(parts[2]), \
+                float(parts[3]), int(parts[4])
+        else:
+            x = float(parts[0])
+            yield parts[1], x, x, x, 1
+
+def options_pyramid():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('path',
+        type=str,
+        help="Full-rate phase file")
+    parser.add_argument('-s','--start',
+        type=str,required=False,default=None,
+        help="First epoch (ISO 8601)")
+    parser.add_argument('-e','--end',
+        type=str,required=False,default=None,
+        help="End epoch (ISO 8601, exclusive)")
+    parser.add_argument('-r','--resolution',
+        type=float,required=False,default=None,
+        help="Widest bin wanted, seconds")
+    parser.add_argument('-n','--max_points',
+        type=int,required=False,default=2000,
+        help="Most points wanted over the window (default 2000)")
+
+    args = parser.parse_args()
+    return args
+
+def main():
+    args = options_pyramid()
+    for row in read_pyramid(args.path, args.start, args.end,
+            args.resolution, args.max_points):
+        print('{:+.12f} {} {:+.12f} {:+.12f} {}'.format(row[1], row[0],
+            row[2], row[3], row[4]))
+
+if __name__ == '__main__':
+    main()
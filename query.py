@@ -0,0 +1,153 @@
+#!/usr/bin/env -S python3 -u
+
+#################################################
+# query.py v.20250604.1
+# copyright 2025 John Ackermann N8UR jra@febo.com
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# Pull a time range out of a phase, pos or offset file without
+# reading the whole thing.  All of these are written in time order
+# with the ISO 8601 epoch in the second field, so we binary search
+# on byte offset (seek, then resync to the next line start) to find
+# the first epoch in range in O(log N) reads, then stream from there.
+#
+# Usage: query.py file start [end] [-c]
+#   start and end are ISO 8601 (e.g. 2024-03-01 or 2024-03-01T12:00:00);
+#   end is exclusive.  -c prints just the number of lines.
+
+import os
+import sys
+import argparse
+from datetime import datetime, timezone
+
+# field holding the ISO epoch in phase, pos and offset files
+EPOCH_FIELD = 1
+
+# naive UTC datetime from an ISO string or datetime (None stays
+# None); the files' epochs are naive UTC, so any zone is folded in
+def to_dt(when):
+    if when is None:
+        return None
+    if not isinstance(when, datetime):
+        when = datetime.fromisoformat(str(when).replace('Z', '+00:00'))
+    if when.tzinfo is not None:
+        when = when.astimezone(timezone.utc).replace(tzinfo=None)
+    return when
+
+# epoch of a data line (bytes), or None for header or bad lines
+def line_epoch(line):
+    if line.startswith(b'#'):
+        return None
+    parts = line.split()
+    if len(parts) <= EPOCH_FIELD:
+        return None
+    try:
+        return datetime.fromisoformat(parts[EPOCH_FIELD].decode())
+    except ValueError:
+        return None
+
+# offset of the first line starting at or after pos
+def line_start_after(f, pos):
+    if pos <= 0:
+        return 0
+    f.seek(pos - 1)
+    f.readline()
+    return f.tell()
+
+# epoch of the first data line at or after offset pos
+# (None at end of file)
+def epoch_after(f, pos):
+    f.seek(line_start_after(f, pos))
+    for line in f:
+        epoch = line_epoch(line)
+        if epoch is not None:
+            return epoch
+    return None
+
+# offset of the first data line with epoch >= target, found by
+# binary search over byte offsets; file must be in time order
+def find_offset(f, target):
+    f.seek(0, os.SEEK_END)
+    lo = 0
+    hi = f.tell()
+    while lo < hi:
+        mid = (lo + hi) // 2
+        epoch = epoch_after(f, mid)
+        if epoch is None or epoch >= target:
+            hi = mid
+        else:
+            lo = mid + 1
+    # step over any header lines to the data line itself
+    pos = line_start_after(f, lo)
+    f.seek(pos)
+    for line in f:
+        if line_epoch(line) is not None:
+            break
+        pos += len(line)
+    return pos
+
+# yield data lines (as str) with start <= epoch < end; either
+# end can be None for "from the beginning" or "to the end"
+def query(path, start=None, end=None):
+    start = to_dt(start)
+    end = to_dt(end)
+    with open(path,'rb') as f:
+        if start is not None:
+            f.seek(find_offset(f, start))
+        for line in f:
+            epoch = line_epoch(line)
+            if epoch is None:
+                continue
+            if end is not None and epoch >= end:
+                break
+            yield line.decode()
+
+# (first, last) epoch datetimes of a time-ordered file, reading
+# only its top and its last line; (None, None) if it has no data
+def file_span(path):
+    from nrcan_tools import read_last_line
+    first = next(query(path), None)
+    if first is None:
+        return None, None
+    with open(path,'rb') as f:
+        last = line_epoch(read_last_line(f))
+    return line_epoch(first.encode()), last
+
+def options_query():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('path',
+        type=str,
+        help="Phase, pos or offset file")
+    parser.add_argument('start',
+        type=str,
+        help="First epoch (ISO 8601)")
+    parser.add_argument('end',
+        type=str,nargs='?',default=None,
+        help="End epoch (ISO 8601, exclusive)")
+    parser.add_argument('-c','--count',
+        action='store_true',
+        help="Print only the number of lines in range")
+
+    args = parser.parse_args()
+    return args
+
+def main():
+    args = options_query()
+    if args.count:
+        print(sum(1 for line in query(args.path, args.start, args.end)))
+        return
+    for line in query(args.path, args.start, args.end):
+        sys.stdout.write(line)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env -S python3 -u
+
+#################################################
+# rinex.py v.20250604.1
+# copyright 2025 John Ackermann N8UR jra@febo.com
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# Minimal streaming helpers for RINEX 2.x observation files:
+# header read/rewrite and epoch-by-epoch iteration.  Only the
+# pieces needed by the nrcan_tools suite are here; anything we
+# can't handle (e.g., RINEX 3) is left for teqc.
+
+import math
+import shutil
+from datetime import datetime, timedelta
+
+# header labels live in columns 61-80
+def header_label(line):
+    return line[60:].rstrip()
+
+# read header lines (through END OF HEADER) from an open file;
+# returns list of lines, leaving the file positioned at the body
+def read_rinex_header(f):
+    header = []
+    for line in f:
+        header.append(line)
+        if header_label(line) == 'END OF HEADER':
+            break
+    return header
+
+# return first header line with the given label, or None
+def header_line(header, label):
+    for line in header:
+        if header_label(line) == label:
+            return line
+    return None
+
+# return RINEX version as float (0.0 if missing or bogus)
+def rinex_version(header):
+    line = header_line(header, 'RINEX VERSION / TYPE')
+    try:
+        return float(line[:9])
+    except:
+        return 0.0
+
+# return number of observation types from "# / TYPES OF OBSERV"
+def num_obs_types(header):
+    line = header_line(header, '# / TYPES OF OBSERV')
+    try:
+        return int(line[:6])
+    except:
+        return 0
+
+# all the "# / TYPES OF OBSERV" lines, for comparing headers
+def obs_types_lines(header):
+    return [l.rstrip() for l in header \
+        if header_label(l) == '# / TYPES OF OBSERV']
+
+# return interval in seconds from header, or 0 if not there
+def header_interval(header):
+    line = header_line(header, 'INTERVAL')
+    try:
+        return float(line[:10])
+    except:
+        return 0
+
+# format a TIME OF FIRST/LAST OBS header line (5I6,F13.7,5X,A3)
+def format_time_line(dt, label, system='GPS'):
+    secs = dt.second + dt.microsecond / 1e6
+    buf = '{:6d}{:6d}{:6d}{:6d}{:6d}{:13.7f}     {:3s}'.format( \
+        dt.year, dt.month, dt.day, dt.hour, dt.minute, secs, system)
+    return '{:60s}{:20s}\n'.format(buf, label)
+
+# format an INTERVAL header line (F10.3)
+def format_interval_line(interval):
+    return '{:60s}{:20s}\n'.format('{:10.3f}'.format(interval), 'INTERVAL')
+
+# replace the line with label in header, or insert it after the
+# line labeled 'after' (or just before END OF HEADER)
+def set_header_line(header, label, newline, after=None):
+    for i, line in enumerate(header):
+        if header_label(line) == label:
+            header[i] = newline
+            return header
+    for i, line in enumerate(header):
+        if after is not None and header_label(line) == after:
+            header.insert(i + 1, newline)
+            return header
+    for i, line in enumerate(header):
+        if header_label(line) == 'END OF HEADER':
+            header.insert(i, newline)
+            return header
+    header.append(newline)
+    return header
+
+# remove all lines with any of the labels from header
+def drop_header_lines(header, labels):
+    return [l for l in header if header_label(l) not in labels]
+
+# parse a RINEX 2 epoch line; returns (datetime, flag, num_sats)
+# or None if the line isn't an epoch line
+def parse_epoch_line(line):
+    try:
+        yy = int(line[1:3])
+        month = int(line[4:6])
+        day = int(line[7:9])
+        hour = int(line[10:12])
+        minute = int(line[13:15])
+        secs = float(line[15:26])
+        flag = int(line[26:29])
+        nsat = int(line[29:32])
+    except ValueError:
+        return None
+    year = 1900 + yy if yy >= 80 else 2000 + yy
+    try:
+        dt = datetime(year, month, day, hour, minute) + \
+            timedelta(seconds=secs)
+    except ValueError:
+        return None
+    return dt, flag, nsat
+
+# walk the body of a RINEX 2 file, yielding (datetime, flag, lines)
+# for each epoch block.  'lines' is the epoch line, its satellite
+# continuation lines and all observation (or event) lines, so
+# writing them back out reproduces the block exactly.  A block cut
+# short by end of file is not yielded.
+def iter_epochs(f, n_types):
+    obs_lines = max(1, (n_types + 4) // 5)
+    lines = iter(f)
+    for line in lines:
+        if not line.strip():
+            continue
+        parsed = parse_epoch_line(line)
+        if parsed is None:
+            # not where we expect an epoch; skip until we resync
+            continue
+        dt, flag, nsat = parsed
+        block = [line]
+        if flag in (0, 1, 6):
+            # satellite list continues every 12 sats
+            count = (max(nsat, 1) - 1) // 12 + nsat * obs_lines
+        else:
+            # event flags: nsat is number of special records
+            count = nsat
+        for i in range(count):
+            nxt = next(lines, None)
+            if nxt is None:
+                return
+            block.append(nxt)
+        yield dt, flag, block
+
+# True if dt falls on a grid of 'interval' seconds counted from
+# the start of its day (to the millisecond, for receivers whose
+# epochs are a hair off the whole second)
+def on_interval_grid(dt, interval):
+    secs = dt.hour * 3600 + dt.minute * 60 + dt.second + \
+        dt.microsecond / 1e6
+    r = secs % interval
+    return r < 0.001 or interval - r < 0.001
+
+# the interval a file with this header can actually be decimated
+# to: 'interval' rounded up to a whole multiple of the file's own
+# (so 30 s data asked for 45 s gives 60 s).  Unchanged if the
+# header has no INTERVAL.
+def decimation_interval(header, interval):
+    own = header_interval(header)
+    if interval <= 0 or own <= 0:
+        return interval
+    steps = math.ceil(interval / own - 1e-6)
+    return max(steps, 1) * own
+
+# header for a copy decimated to 'interval': sets INTERVAL and
+# drops the per-satellite counts, which no longer add up
+def decimated_header(header, interval):
+    header = drop_header_lines(header, ('# OF SATELLITES', 'PRN / # OF OBS'))
+    return set_header_line(header, 'INTERVAL', \
+        format_interval_line(interval))
+
+# filter (dt, flag, lines) epoch blocks down to an interval grid.
+# Observations (flags 0 and 1) and cycle slip records (flag 6) are
+# kept only on the grid; events and in-file header records (flags
+# 2-5) always go through.
+def decimate_epochs(epochs, interval):
+    for dt, flag, lines in epochs:
+        if flag in (2, 3, 4, 5) or on_interval_grid(dt, interval):
+            yield dt, flag, lines
+
+# stream a RINEX 2 observation file from open file inp to outp,
+# keeping only epochs on an 'interval' second grid (rounded up by
+# decimation_interval()).  If the file's own interval is already
+# that long or longer (or interval is 0) it's copied as is.
+# Returns (observation epochs written, interval kept); the count
+# is None if the file was just copied.
+def decimate_rinex(inp, outp, interval):
+    header = read_rinex_header(inp)
+    n_types = num_obs_types(header)
+    interval = decimation_interval(header, interval)
+    if interval <= 0 or n_types == 0 or \
+            int(rinex_version(header)) != 2 or \
+            header_interval(header) >= interval:
+        outp.writelines(header)
+        shutil.copyfileobj(inp, outp)
+        return None, header_interval(header)
+    outp.writelines(decimated_header(header, interval))
+    count = 0
+    for dt, flag, lines in decimate_epochs(iter_epochs(inp, n_types), \
+            interval):
+        outp.writelines(lines)
+        if flag in (0, 1):
+            count += 1
+    return count, interval
+
+# decimate_rinex() from one path to another
+def decimate_rinex_file(inpath, outpath, interval):
+    with open(inpath, 'r', errors='replace') as inp:
+        with open(outpath, 'w') as outp:
+            return decimate_rinex(inp, outp, interval)
@@ -0,0 +1,253 @@
+#!/usr/bin/env -S python3 -u
+
+#################################################
+# rinex_check.py v.20250604.1
+# copyright 2025 John Ackermann N8UR jra@febo.com
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# Checks a RINEX 2 observation file (plain or zipped) before it's
+# sent to CSRS-PPP, so a short, empty or mangled file -- teqc
+# failing quietly, a download cut off part way, days missing --
+# is caught here instead of after an upload and an hour of polling.
+#
+# One pass through the file, a block at a time, looks at:
+#   - the header: RINEX 2, observation types, first epoch
+#   - epochs: how many, first and last, out of order
+#   - the sample interval (from the header, or the data)
+#   - gaps, and the fraction of the span with no data
+#   - lines that aren't part of an epoch block (garbage, or a
+#     block cut short at the end of the file)
+#
+# Anything that makes the file useless is a problem, and the file
+# is rejected; things that are merely odd are warnings.
+#
+# Usage: rinex_check.py file [...] [-s min_span_hours]
+#        [-g max_gap_fraction] [-d expect_days]
+
+import os
+import io
+import sys
+import argparse
+import zipfile
+
+from rinex import read_rinex_header, rinex_version, num_obs_types, \
+    header_interval, header_line, iter_epochs
+
+# reject files covering less than this, hours
+MIN_SPAN = 6.0
+# reject files with more than this fraction of epochs missing
+MAX_GAP_FRACTION = 0.5
+# warn above this fraction
+WARN_GAP_FRACTION = 0.1
+# report gaps longer than this many intervals
+GAP_INTERVALS = 1.5
+
+# open a RINEX file for reading as text; a .zip is read from its
+# first member without unpacking it to disk
+def open_rinex(path):
+    if zipfile.is_zipfile(path):
+        zf = zipfile.ZipFile(path)
+        names = [n for n in zf.namelist() if not n.endswith('/')]
+        if not names:
+            zf.close()
+            raise ValueError("empty zip file")
+        return io.TextIOWrapper(zf.open(names[0]), errors='replace')
+    return open(path,'r', errors='replace')
+
+# counts the lines read through it
+class LineCounter:
+    def __init__(self, f):
+        self.f = f
+        self.n = 0
+        self.blank = 0
+
+    def __iter__(self):
+        for line in self.f:
+            self.n += 1
+            if not line.strip():
+                self.blank += 1
+            yield line
+
+class CheckResult:
+    def __init__(self, path):
+        self.path = path
+        self.problems = []      # reasons to reject the file
+        self.warnings = []
+        self.epochs = 0
+        self.first = None
+        self.last = None
+        self.interval = 0.0
+        self.gaps = 0
+        self.longest_gap = 0.0
+        self.gap_fraction = 0.0
+        self.bad_lines = 0
+        self.duplicates = 0     # epochs repeating the one before
+
+    @property
+    def ok(self):
+        return not self.problems
+
+    def span_hours(self):
+        if self.first is None:
+            return 0.0
+        return (self.last - self.first).total_seconds() / 3600.0
+
+    def summary(self):
+        lines = ['{}: {}'.format(os.path.basename(self.path),
+            'ok' if self.ok else 'REJECT')]
+        if self.first is not None:
+            lines.append('  {} epochs, {} to {} ({:.1f} h), interval {:g} s' \
+                .format(self.epochs, self.first.isoformat(),
+                self.last.isoformat(), self.span_hours(), self.interval))
+            lines.append('  {} gaps (longest {:g} s), {:.1%} missing' \
+                .format(self.gaps, self.longest_gap, self.gap_fraction))
+        for p in self.problems:
+            lines.append('  problem: ' + p)
+        for w in self.warnings:
+            lines.append('  warning: ' + w)
+        return '\n'.join(lines)
+
+# check one file; returns a CheckResult.  expect_days, if given,
+# is how many days the file should cover (7 for a weekly file)
+def check_rinex(path, min_span=MIN_SPAN, max_gap_fraction=MAX_GAP_FRACTION,
+        expect_days=None):
+    res = CheckResult(path)
+    try:
+        if os.path.getsize(path) == 0:
+            res.problems.append('empty file')
+            return res
+        f = open_rinex(path)
+    except (OSError, ValueError, zipfile.BadZipFile) as e:
+        res.problems.append("can't open: " + str(e))
+        return res
+
+    with f:
+        header = read_rinex_header(f)
+        if not header or 'END OF HEADER' not in header[-1]:
+            res.problems.append('no END OF HEADER')
+            return res
+        version = rinex_version(header)
+        n_types = num_obs_types(header)
+        if int(version) != 2:
+            res.problems.append('not RINEX 2 (version {:g})'.format(version))
+            return res
+        if n_types == 0:
+            res.problems.append('no observation types')
+            return res
+        if header_line(header, 'TIME OF FIRST OBS') is None:
+            res.warnings.append('no TIME OF FIRST OBS')
+        res.interval = header_interval(header)
+
+        counter = LineCounter(f)
+        block_lines = 0
+        prev = None
+        step = None     # smallest step between epochs seen
+        missing = 0.0   # seconds in gaps
+        gap_list = []   # steps, kept until we know the interval
+        for dt, flag, lines in iter_epochs(counter, n_types):
+            block_lines += len(lines)
+            if flag not in (0, 1):
+                continue
+            res.epochs += 1
+            if prev is not None:
+                d = (dt - prev).total_seconds()
+                # e.g. a day file that ends with the next midnight;
+                # PPP copes with a repeat, so just count it
+                if d == 0:
+                    res.duplicates += 1
+                    res.epochs -= 1
+                    continue
+                if d < 0:
+                    res.problems.append('epochs out of order at ' + \
+                        dt.isoformat())
+                    return res
+                if step is None or d < step:
+                    step = d
+                gap_list.append(d)
+            else:
+                res.first = dt
+            prev = dt
+        res.last = prev
+        res.bad_lines = counter.n - counter.blank - block_lines
+
+    if res.epochs == 0:
+        res.problems.append('no epochs')
+        return res
+    if not res.interval:
+        res.interval = step or 0.0
+    elif step is not None and step < res.interval:
+        res.warnings.append('data interval {:g} s is less than header ' \
+            'INTERVAL {:g} s'.format(step, res.interval))
+        res.interval = step
+
+    if res.interval:
+        for d in gap_list:
+            if d > GAP_INTERVALS * res.interval:
+                res.gaps += 1
+                missing += d - res.interval
+                res.longest_gap = max(res.longest_gap, d)
+        span = (res.last - res.first).total_seconds() + res.interval
+        res.gap_fraction = min(missing / span, 1.0)
+
+    span_h = res.span_hours()
+    if span_h < min_span:
+        res.problems.append('only {:.1f} h of data (need {:g})'.format(span_h,
+            min_span))
+    if res.gap_fraction > max_gap_fraction:
+        res.problems.append('{:.0%} of the span is missing'.format(
+            res.gap_fraction))
+    elif res.gap_fraction > WARN_GAP_FRACTION:
+        res.warnings.append('{:.0%} of the span is missing'.format(
+            res.gap_fraction))
+    if res.duplicates:
+        res.warnings.append('{} repeated epochs'.format(res.duplicates))
+    if res.bad_lines:
+        res.warnings.append('{} lines outside epoch blocks (corrupt or ' \
+            'cut off?)'.format(res.bad_lines))
+    if expect_days and span_h < (expect_days - 1) * 24:
+        res.warnings.append('covers {:.1f} days, expected {}'.format(
+            span_h / 24, expect_days))
+    return res
+
+def options_rinex_check():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('paths',
+        type=str,nargs='+',
+        help="RINEX 2 observation files (.obs or .obs.zip)")
+    parser.add_argument('-s','--min_span',
+        type=float,required=False,default=MIN_SPAN,
+        help="Reject files shorter than this, hours " + \
+            "(default {:g})".format(MIN_SPAN))
+    parser.add_argument('-g','--max_gap',
+        type=float,required=False,default=MAX_GAP_FRACTION,
+        help="Reject files missing more than this fraction of " + \
+            "epochs (default {:g})".format(MAX_GAP_FRACTION))
+    parser.add_argument('-d','--expect_days',
+        type=int,required=False,default=None,
+        help="Warn if a file covers fewer days than this")
+
+    args = parser.parse_args()
+    return args
+
+def main():
+    args = options_rinex_check()
+    rejected = 0
+    for path in args.paths:
+        res = check_rinex(path, args.min_span, args.max_gap,
+            args.expect_days)
+        print(res.summary())
+        rejected += not res.ok
+    sys.exit(1 if rejected else 0)
+
+if __name__ == '__main__':
+    main()
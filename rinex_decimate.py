@@ -0,0 +1,73 @@
+#!/usr/bin/env -S python3 -u
+
+#################################################
+# rinex_decimate.py v.20250604.1
+# copyright 2025 John Ackermann N8UR jra@febo.com
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# Thins a RINEX 2 observation file to epochs on a coarser grid
+# (e.g., 1 s receiver data down to 30 s), setting the INTERVAL
+# header to match.  An interval that isn't a whole multiple of the
+# file's own is rounded up to one (30 s data to 45 s gives 60 s).  CSRS-PPP doesn't need more than that for a
+# static clock solution, and the file is read and written a block
+# at a time so a week of data never has to fit in memory.
+#
+# make_weekly_rinex.py does the same thing to the weekly file
+# (-u) and the daily zip (-A) as it makes them.
+#
+# Usage: rinex_decimate.py infile outfile -i interval
+
+import os
+import sys
+import argparse
+
+from rinex import decimate_rinex_file
+
+def options_rinex_decimate():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('infile',
+        type=str,
+        help="RINEX 2 observation file")
+    parser.add_argument('outfile',
+        type=str,
+        help="Decimated output file")
+    parser.add_argument('-i','--interval',
+        type=float,required=True,
+        help="Keep epochs every this many seconds")
+
+    args = parser.parse_args()
+    return args
+
+def main():
+    args = options_rinex_decimate()
+    if os.path.abspath(args.infile) == os.path.abspath(args.outfile):
+        print("Input and output files must be different")
+        sys.exit(1)
+    try:
+        count, interval = decimate_rinex_file(args.infile, args.outfile, \
+            args.interval)
+    except OSError as e:
+        print("Couldn't decimate", args.infile + ":", e)
+        sys.exit(1)
+    if count is None:
+        print("Copied", args.infile, "unchanged (already",
+            "{:g} s or coarser)".format(args.interval))
+    else:
+        if interval != args.interval:
+            print("{:g} s isn't a multiple of the file's interval;".format(
+                args.interval), "using {:g} s".format(interval))
+        print("Wrote", count, "epochs at {:g} s to".format(interval),
+            args.outfile)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env -S python3 -u
+
+#################################################
+# stability.py v.20250604.1
+# copyright 2025 John Ackermann N8UR jra@febo.com
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# Overlapping Allan (ADEV), modified Allan (MDEV) and time (TDEV)
+# deviation of a phase file from make_phase_from_clk.py, at octave
+# taus (1, 2, 4 ... x tau0).  Everything is done on NumPy arrays:
+# ADEV from shifted second differences, MDEV from second differences
+# of moving sums taken off a cumulative sum.  Missing epochs are
+# NaN on the tau0 grid and any term touching one is left out.
+#
+# The file is read in chunks, carrying enough of the previous
+# chunk forward that no term is lost or counted twice at the joins,
+# so memory use doesn't grow with the length of the record.
+#
+# Confidence intervals are 1 sigma (68%), from the chi-squared
+# distribution with the equivalent degrees of freedom for white FM
+# noise (Howe's approximation); for other noise types treat them
+# as a rough guide.
+#
+# Usage: stability.py phase_file [-s start] [-e end] [-t tau0]
+#        [-o outfile]
+
+import sys
+import argparse
+
+import numpy as np          # pip3 install numpy
+
+from phase_series import CHUNK, guess_tau0, gridded_chunks
+from query import query, line_epoch, to_dt
+from nrcan_tools import read_last_line
+
+# one row of output per tau
+COLUMNS = ('tau', 'n', 'adev', 'adev_lo', 'adev_hi',
+    'mdev', 'mdev_lo', 'mdev_hi', 'tdev', 'tdev_lo', 'tdev_hi')
+
+# octave averaging factors for n samples: 1, 2, 4 ... up to n/4
+def octave_ms(n):
+    ms = []
+    m = 1
+    while m <= n // 4:
+        ms.append(m)
+        m *= 2
+    return ms
+
+# samples needed for one ADEV or MDEV term
+def adev_need(m):
+    return 2 * m + 1
+
+def mdev_need(m):
+    return 3 * m
+
+class Accumulator:
+    # running sums of squared terms (and term counts) per m
+    def __init__(self, ms):
+        self.ms = list(ms)
+        self.adev_sum = dict((m, 0.0) for m in self.ms)
+        self.adev_n = dict((m, 0) for m in self.ms)
+        self.mdev_sum = dict((m, 0.0) for m in self.ms)
+        self.mdev_n = dict((m, 0) for m in self.ms)
+        # samples carried from one chunk to the next
+        self.keep = max([mdev_need(m) for m in self.ms] + \
+            [adev_need(m) for m in self.ms]) - 1 if self.ms else 0
+        self.tail = np.zeros(0)
+
+    # add a chunk of gridded phase that follows the last one
+    def add(self, x):
+        first = len(self.tail) == 0
+        buf = np.concatenate((self.tail, x))
+        carried = len(self.tail)
+        # second differences don't care about a constant, and
+        # taking one off keeps the cumulative sums small
+        ref = buf[~np.isnan(buf)]
+        if len(ref):
+            buf = buf - ref[0]
+        # terms starting before 'skip' were counted last time
+        def skip(need):
+            return 0 if first else max(carried - need + 1, 0)
+
+        valid = ~np.isnan(buf)
+        S = np.concatenate(([0.0], np.cumsum(np.where(valid, buf, 0.0))))
+        bad = np.concatenate(([0], np.cumsum(~valid)))
+        L = len(buf)
+        for m in self.ms:
+            if L >= adev_need(m):
+                d = buf[2*m:] - 2 * buf[m:L-m] + buf[:L-2*m]
+                d = d[skip(adev_need(m)):]
+                d = d[~np.isnan(d)]
+                self.adev_sum[m] += float(np.dot(d, d))
+                self.adev_n[m] += len(d)
+            if L >= mdev_need(m):
+                # sums of m samples starting at each i, and whether
+                # any of them is missing
+                W = S[m:] - S[:-m]
+                Wbad = (bad[m:] - bad[:-m]) > 0
+                n = len(W) - 2 * m
+                d = W[2*m:] - 2 * W[m:m+n] + W[:n]
+                dbad = Wbad[2*m:] | Wbad[m:m+n] | Wbad[:n]
+                s = skip(mdev_need(m))
+                d = d[s:][~dbad[s:]]
+                self.mdev_sum[m] += float(np.dot(d, d))
+                self.mdev_n[m] += len(d)
+        self.tail = buf[max(L - self.keep, 0):] if self.keep else buf[:0]
+        if len(ref):
+            self.tail = self.tail + ref[0]
+
+    # list of result dicts (keys in COLUMNS), one per m with data
+    def results(self, tau0):
+        rows = []
+        for m in self.ms:
+            na = self.adev_n[m]
+            nm = self.mdev_n[m]
+            if na == 0:
+                continue
+            tau = m * tau0
+            row = {'tau': tau, 'n': na}
+            adev = np.sqrt(self.adev_sum[m] / na / (2.0 * tau * tau))
+            row['adev'] = adev
+            row['adev_lo'], row['adev_hi'] = \
+                confidence(adev, edf_white_fm(na + 2 * m, m))
+            if nm:
+                mdev = np.sqrt(self.mdev_sum[m] / nm / \
+                    (2.0 * m * m * tau * tau))
+                lo, hi = confidence(1.0, edf_white_fm(nm + 3 * m - 1, m))
+                tdev = tau * mdev / np.sqrt(3.0)
+            else:
+                mdev = tdev = lo = hi = np.nan
+            row['mdev'], row['mdev_lo'], row['mdev_hi'] = \
+                mdev, mdev * lo, mdev * hi
+            row['tdev'], row['tdev_lo'], row['tdev_hi'] = \
+                tdev, tdev * lo, tdev * hi
+            rows.append(row)
+        return rows
+
+# equivalent degrees of freedom for overlapping ADEV with white
+# FM noise, n phase samples and averaging factor m (Howe)
+def edf_white_fm(n, m):
+    edf = (3.0 * (n - 1) / (2 * m) - 2.0 * (n - 2) / n) * \
+        (4.0 * m * m) / (4.0 * m * m + 5)
+    return max(edf, 1.0)
+
+# chi-squared quantile for k degrees of freedom at normal deviate z
+# (Wilson-Hilferty)
+def chi2_ppf(z, k):
+    h = 2.0 / (9.0 * k)
+    return max(k * (1.0 - h + z * np.sqrt(h)) ** 3, 1e-12)
+
+# (low, high) 1 sigma bounds for a deviation with edf degrees
+# of freedom
+def confidence(dev, edf):
+    return (dev * np.sqrt(edf / chi2_ppf(1.0, edf)),
+        dev * np.sqrt(edf / chi2_ppf(-1.0, edf)))
+
+# number of tau0 grid points between the first and last epochs
+# in the file (or range), without reading it all
+def grid_length(path, tau0, start=None, end=None):
+    first = next(query(path, start, end), None)
+    if first is None:
+        return 0
+    t0 = line_epoch(first.encode())
+    with open(path,'rb') as f:
+        t1 = line_epoch(read_last_line(f))
+    if end is not None:
+        t1 = min(t1, to_dt(end))
+    return int((t1 - t0).total_seconds() // tau0) + 1
+
+# stability rows for a phase file or a time range of it
+def phase_stability(path, start=None, end=None, tau0=None, chunk=CHUNK):
+    if tau0 is None:
+        tau0 = guess_tau0(path, start, end)
+        if tau0 is None:
+            return [], None
+    acc = Accumulator(octave_ms(grid_length(path, tau0, start, end)))
+    for t, x in gridded_chunks(path, tau0, start, end, chunk):
+        acc.add(x)
+    return acc.results(tau0), tau0
+
+def format_rows(rows):
+    lines = ['# ' + ' '.join(COLUMNS) + '\n']
+    for row in rows:
+        lines.append('{:d} {:d} '.format(int(row['tau']), row['n']) + \
+            ' '.join(['{:.4e}'.format(row[c]) for c in COLUMNS[2:]]) + '\n')
+    return lines
+
+def options_stability():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('path',
+        type=str,
+        help="Phase file from make_phase_from_clk.py")
+    parser.add_argument('-s','--start',
+        type=str,required=False,default=None,
+        help="First epoch (ISO 8601)")
+    parser.add_argument('-e','--end',
+        type=str,required=False,default=None,
+        help="End epoch (ISO 8601, exclusive)")
+    parser.add_argument('-t','--tau0',
+        type=int,required=False,default=None,
+        help="Sample interval in seconds (default: from the data)")
+    parser.add_argument('-o','--outfile',
+        type=str,required=False,default=None,
+        help="Write results here instead of stdout")
+
+    args = parser.parse_args()
+    return args
+
+def main():
+    args = options_stability()
+    rows, tau0 = phase_stability(args.path, args.start, args.end,
+        args.tau0)
+    if not rows:
+        print("Not enough data in", args.path)
+        sys.exit()
+    lines = ['# ' + args.path + ' tau0 = ' + str(tau0) + ' s\n'] + \
+        format_rows(rows)
+    if args.outfile:
+        with open(args.outfile,'w') as f:
+            f.writelines(lines)
+    else:
+        sys.stdout.writelines(lines)
+
+if __name__ == '__main__':
+    main()
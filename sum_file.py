@@ -0,0 +1,220 @@
+#!/usr/bin/env -S python3 -u
+
+#################################################
+# sum_file.py v.20250604.1
+# copyright 2025 John Ackermann N8UR jra@febo.com
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# Parser for NRCan CSRS-PPP .sum summary files.  Each file is read
+# once into a SumFile holding the fields we use (with their
+# uncertainties) plus every other line, grouped by its three letter
+# key, so nothing is thrown away.  Parsed records are cached in a
+# small hidden JSON sidecar next to the .sum file (".<name>.json"),
+# keyed on the file's mtime and size, so going back over hundreds of
+# weeks doesn't re-parse the text.
+#
+# Usage: sum_file.py file.sum [...]   (prints the parsed record)
+
+import os
+import sys
+import json
+from datetime import datetime
+
+# correction type in .sum file -> name used for dirs and files
+CORR_TYPES = {'FIN': 'final', 'RAP': 'rapid', 'ULT': 'ultra'}
+
+# bump this if the record layout changes, to invalidate caches
+CACHE_VERSION = 1
+
+# float from a string, or None
+def to_float(s):
+    try:
+        return float(s)
+    except (TypeError, ValueError):
+        return None
+
+# last number in a list of tokens, or None
+def last_number(tokens):
+    for t in reversed(tokens):
+        val = to_float(t)
+        if val is not None:
+            return val
+    return None
+
+# decimal degrees from a "DDD MM SS.sssss" string
+def dms_to_deg(dms):
+    parts = dms.split()
+    if len(parts) != 3:
+        return to_float(dms)
+    sign = -1.0 if parts[0].startswith('-') else 1.0
+    deg = abs(float(parts[0])) + float(parts[1]) / 60 + \
+        float(parts[2]) / 3600
+    return sign * deg
+
+# datetime from "YYYY-MM-DD HH:MM:SS[.ss]"
+def sum_time(s):
+    try:
+        return datetime.strptime(s.strip().split('.')[0], '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return None
+
+class SumFile:
+    # the parsed fields; all are None (or empty) if not in the file
+    def __init__(self, path=''):
+        self.path = path
+        self.corr_type = None       # FIN, RAP or ULT
+        self.tier = None            # final, rapid or ultra
+        self.sp3 = []               # SP3 file names
+        self.report_date = None     # NOW line, as string
+        self.data_begin = None      # BEG/END lines, as strings
+        self.data_end = None
+        self.interval = None        # INT, seconds
+        # position: strings exactly as in the file (what the pos
+        # file gets), numbers, and sigmas (last number on line)
+        self.ecef_str = ['', '', '']
+        self.ecef = [None, None, None]
+        self.ecef_sigma = [None, None, None]
+        self.llh_str = ['', '', '']
+        self.llh = [None, None, None]    # lat/lon in decimal degrees
+        self.llh_sigma = [None, None, None]
+        # clock offset from OFF line, e.g. "OFF -277.3000 0.1666 ns"
+        self.offset_str = ''
+        self.offset_sigma_str = ''
+        self.offset_units = ''
+        self.offset = None
+        self.offset_sigma = None
+        # every line, keyed by its first three characters, with
+        # the key stripped off (receiver, antenna, ambiguity
+        # statistics, etc. are all in here)
+        self.fields = {}
+
+    # all lines for a key (e.g. 'RCV'), or []
+    def get(self, key):
+        return self.fields.get(key, [])
+
+    def begin_dt(self):
+        return sum_time(self.data_begin) if self.data_begin else None
+
+    def end_dt(self):
+        return sum_time(self.data_end) if self.data_end else None
+
+    def parse(self, f):
+        for line in f:
+            line = line.rstrip('\r\n')
+            key = line[:3]
+            if not key.strip():
+                continue
+            self.fields.setdefault(key, []).append(line[4:])
+
+            if key == 'SP3':
+                self.sp3.append(line[4:].strip())
+                # last three characters before the underscore
+                # are the correction type (format since 27 Nov 2022)
+                if self.corr_type is None and '_' in line:
+                    self.corr_type = line[:line.index('_')][-3:].strip()
+            elif key == 'NOW':
+                self.report_date = line[4:].strip()
+            elif key == 'BEG':
+                self.data_begin = line[4:].strip()
+            elif key == 'END':
+                self.data_end = line[4:].strip()
+            elif key == 'INT':
+                self.interval = to_float(line[4:].strip())
+            elif key == 'OFF':
+                parts = line.split()
+                if len(parts) >= 4:
+                    self.offset_str, self.offset_sigma_str, \
+                        self.offset_units = parts[1:4]
+                    self.offset = to_float(parts[1])
+                    self.offset_sigma = to_float(parts[2])
+            elif line.startswith('POS '):
+                self.parse_pos(line)
+        self.tier = CORR_TYPES.get(self.corr_type)
+        return self
+
+    # POS lines: ECEF values in columns 50-62, lat/lon/height in
+    # columns 48-63; the sigma is the last number on the line
+    def parse_pos(self, line):
+        axes = {'POS   X': 0, 'POS   Y': 1, 'POS   Z': 2}
+        llh = {'POS LAT': 0, 'POS LON': 1, 'POS HGT': 2}
+        key = line[:7]
+        if key in axes:
+            i = axes[key]
+            self.ecef_str[i] = line[49:][:13].strip()
+            self.ecef[i] = to_float(self.ecef_str[i])
+            self.ecef_sigma[i] = last_number(line[62:].split())
+        elif key in llh:
+            i = llh[key]
+            self.llh_str[i] = line[47:][:16].strip()
+            self.llh[i] = to_float(self.llh_str[i]) if i == 2 \
+                else dms_to_deg(self.llh_str[i])
+            self.llh_sigma[i] = last_number(line[63:].split())
+
+    def to_dict(self):
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, d):
+        rec = cls()
+        rec.__dict__.update(d)
+        return rec
+
+# hidden sidecar file holding the cached record for path
+def cache_path(path):
+    return os.path.join(os.path.dirname(path),
+        '.' + os.path.basename(path) + '.json')
+
+# return the parsed SumFile for path, from its sidecar cache if
+# that's still good, otherwise parsing the file (and updating the
+# cache if we can write it)
+def read_sum(path, use_cache=True):
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    key = [CACHE_VERSION, st.st_mtime_ns, st.st_size]
+    cache = cache_path(path)
+    if use_cache:
+        try:
+            with open(cache,'r') as f:
+                cached = json.load(f)
+            if cached['key'] == key:
+                rec = SumFile.from_dict(cached['record'])
+                rec.path = path
+                return rec
+        except (OSError, ValueError, KeyError):
+            pass
+
+    with open(path,'r', errors='replace') as f:
+        rec = SumFile(path).parse(f)
+
+    if use_cache:
+        try:
+            tmp = cache + '.tmp'
+            with open(tmp,'w') as f:
+                json.dump({'key': key, 'record': rec.to_dict()}, f,
+                    separators=(',', ':'))
+            os.replace(tmp, cache)
+        except OSError:
+            pass
+    return rec
+
+def main():
+    from pprint import pprint
+    if len(sys.argv) < 2:
+        print("Usage: sum_file.py file.sum [...]")
+        sys.exit()
+    for path in sys.argv[1:]:
+        rec = read_sum(path).to_dict()
+        del rec['fields']
+        pprint(rec)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+#!/usr/bin/env -S python3 -u
+
+#################################################
+# task_graph.py v.20250604.1
+# copyright 2025 John Ackermann N8UR jra@febo.com
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# Runs the pipeline stages as a graph of tasks instead of one after
+# the other, so a backfill isn't held up by the slowest stage: while
+# one day is being downloaded, earlier days are being converted, and
+# a finished week can wait on CSRS-PPP while the next week's days
+# are still coming in.
+#
+# Each task says which tasks it needs first.  Tasks that wait on
+# the network (FTP, PPP upload and polling) run in the 'io' pool and
+# tasks that work the disk or run teqc/runpkr00 in the 'cpu' pool,
+# each with its own number of worker threads.  (Threads rather than
+# processes: the heavy parts are subprocesses and file I/O, and the
+# stages share the catalog and MeasurementFiles caches.)  If a task
+# fails -- raises, or calls sys.exit() as the stages do when they
+# give up -- everything that depends on it is skipped and the rest
+# of the graph carries on.
+#
+# For a backfill over a range of days the graph is
+#
+#     download day -> convert day -> weekly RINEX -> submit -> ingest
+#
+# with the days of a week converted in order (so the partial
+# weekly file stays usable) and ingests done one at a time in week
+# order (they append to the same pos/offset/phase files).  Weeks
+# not wholly inside the range only get their days downloaded.
+#
+# Usage: task_graph.py -m measurement_path -r rx_type -f fqdn
+#        -s station -e email -y year -d doy [-n days] [-z] [-c]
+#        [--io workers] [--cpu workers]
+
+import os
+import sys
+import time
+import argparse
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# default workers per pool
+IO_WORKERS = 4
+CPU_WORKERS = 2
+
+class Task:
+    def __init__(self, name, func, args, deps, pool, use_results, after):
+        self.name = name
+        self.func = func
+        self.args = tuple(args)
+        self.deps = list(deps)
+        self.after = list(after)
+        self.pool = pool
+        self.use_results = use_results
+        self.status = 'waiting'     # then running, ok, failed, skipped
+        self.result = None
+        self.seconds = 0.0
+        self.message = ''
+
+class TaskGraph:
+    def __init__(self, io_workers=IO_WORKERS, cpu_workers=CPU_WORKERS):
+        self.workers = {'io': io_workers, 'cpu': cpu_workers}
+        self.tasks = {}     # name -> Task, in the order added
+
+    # add a task; func(*args) is run once every task named in deps
+    # and after has finished.  With use_results, the results of the
+    # deps tasks (in order) are passed after args.  'after' only
+    # orders tasks: a failure there doesn't skip this one.
+    # Returns the name.
+    def add(self, name, func, args=(), deps=(), pool='io',
+            use_results=False, after=()):
+        if name in self.tasks:
+            raise ValueError("duplicate task " + name)
+        if pool not in self.workers:
+            raise ValueError("unknown pool " + pool)
+        for d in list(deps) + list(after):
+            if d not in self.tasks:
+                raise ValueError(name + " depends on unknown task " + d)
+        self.tasks[name] = Task(name, func, args, deps, pool, use_results,
+            after)
+        return name
+
+    def ready(self, task):
+        return all(self.tasks[d].status == 'ok' for d in task.deps) and \
+            all(self.tasks[d].status in ('ok', 'failed', 'skipped') \
+                for d in task.after)
+
+    def blocked(self, task):
+        return any(self.tasks[d].status in ('failed', 'skipped') \
+            for d in task.deps)
+
+    # run everything; returns {name: (status, seconds, message)}
+    def run(self):
+        pools = dict((k, ThreadPoolExecutor(max_workers=max(int(v), 1),
+            thread_name_prefix='task_' + k)) for k, v in self.workers.items())
+        running = {}    # future -> Task
+        try:
+            while True:
+                # deps are always added first, so one pass in order
+                # also passes skips down the graph
+                for task in self.tasks.values():
+                    if task.status != 'waiting':
+                        continue
+                    if self.blocked(task):
+                        task.status = 'skipped'
+                        task.message = 'needs ' + ', '.join([d for d in \
+                            task.deps if self.tasks[d].status != 'ok'])
+                    elif self.ready(task):
+                        args = task.args
+                        if task.use_results:
+                            args += tuple(self.tasks[d].result \
+                                for d in task.deps)
+                        task.status = 'running'
+                        running[pools[task.pool].submit(run_task, task.func,
+                            args)] = task
+                if not running:
+                    break
+                done, pending = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    task = running.pop(fut)
+                    task.status, task.seconds, task.message, task.result = \
+                        fut.result()
+        finally:
+            for pool in pools.values():
+                pool.shutdown(wait=True)
+        return dict((t.name, (t.status, t.seconds, t.message)) \
+            for t in self.tasks.values())
+
+# run one task's function; returns (status, seconds, message, result)
+def run_task(func, args):
+    start = time.time()
+    try:
+        result = func(*args)
+        return 'ok', time.time() - start, '', result
+    except SystemExit as e:
+        # the stages call sys.exit() when they give up
+        return 'failed', time.time() - start, 'exit ' + str(e.code), None
+    except Exception as e:
+        traceback.print_exc()
+        return 'failed', time.time() - start, repr(e), None
+
+def print_summary(results):
+    counts = {}
+    for status, secs, msg in results.values():
+        counts[status] = counts.get(status, 0) + 1
+    print("task_graph.py:", ', '.join(['{} {}'.format(n, s) \
+        for s, n in sorted(counts.items())]))
+    for name, (status, secs, msg) in results.items():
+        if status != 'ok':
+            print('  {:24s} {:7s} {:7.1f} s  {}'.format(name, status, secs,
+                msg).rstrip())
+
+##########################################################
+# backfill graph
+
+# the stage steps, tolerant of an earlier step that found nothing
+def convert_step(got):
+    from get_gps_ftp import convert_day
+    if got is None:
+        return None
+    return convert_day(*got)
+
+def submit_step(m_path, gps_week, user, session):
+    from get_gps_ppp import submit_ppp
+    from nrcan_tools import get_measurement_files
+    m = get_measurement_files(m_path, gps_week, 0)
+    if not os.path.isfile(m.weekly_rinex_zip_path):
+        print("No weekly file for week", gps_week)
+        return None
+    return submit_ppp(m.weekly_rinex_zip_path, m_path, user, session)
+
+def ingest_step(result):
+    from get_gps_ppp import ingest_ppp
+    if result is None:
+        return None
+    return ingest_ppp(result)
+
+# graph for one station over gps days first through end - 1
+def backfill_graph(measurement_path, rx_type, fqdn, station, user,
+        first, end, zip=False, cleanup=False, session=None, graph=None):
+    from get_gps_ftp import download_day
+    from make_weekly_rinex import make_weekly_rinex
+    from date_range import gps_days_range, iter_gps_days
+    graph = graph or TaskGraph()
+    m_path = os.path.abspath(measurement_path) + '/'
+    tag = station + ' '
+
+    converts = {}       # gps week -> convert task names, in order
+    for day in iter_gps_days(gps_days_range(first, end)):
+        label = '{}_{}'.format(day.gps_week_str, day.gps_dow_str)
+        dl = graph.add(tag + 'download ' + label, download_day,
+            (m_path, rx_type, fqdn, station, day.year_num, day.doy_num))
+        week = converts.setdefault(day.gps_week_num, [])
+        week.append(graph.add(tag + 'convert ' + label, convert_step,
+            deps=[dl], pool='cpu', use_results=True, after=week[-1:]))
+
+    last_ingest = []
+    for week, names in sorted(converts.items()):
+        if len(names) < 7:
+            continue
+        wk = graph.add(tag + 'weekly {:04d}'.format(week),
+            make_weekly_rinex, (m_path, week, zip, cleanup), deps=names,
+            pool='cpu')
+        sub = graph.add(tag + 'submit {:04d}'.format(week), submit_step,
+            (m_path, week, user, session), deps=[wk])
+        last_ingest = [graph.add(tag + 'ingest {:04d}'.format(week),
+            ingest_step, deps=[sub], pool='cpu', use_results=True,
+            after=last_ingest)]
+    return graph
+
+def options_task_graph():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-m','--measurement_path',
+        type=str,required=True,
+        help="Measurement path")
+    parser.add_argument('-r','--rx_type',
+        type=str,required=True,
+        help="GPS Receiver type (mosaic || netrs)")
+    parser.add_argument('-f','--fqdn',
+        type=str,required=True,
+        help="FQDN of receiver")
+    parser.add_argument('-s','--station',
+        type=str,required=True,
+        help="Receiver station name")
+    parser.add_argument('-e','--email',
+        type=str,required=True,
+        help="User email address for NRCan")
+    parser.add_argument('-y','--year',
+        type=int,required=True,
+        help="Year of first day")
+    parser.add_argument('-d','--day_of_year',
+        type=int,required=True,
+        help="Day of year of first day")
+    parser.add_argument('-n','--days',
+        type=int,required=False,default=7,
+        help="Number of days (default 7)")
+    parser.add_argument('-z','--zip',
+        action='store_true',
+        help="Make daily and weekly zip files")
+    parser.add_argument('-c','--cleanup',
+        action='store_true',
+        help="Remove files after zipping")
+    parser.add_argument('--io',
+        type=int,required=False,default=IO_WORKERS,
+        help="Workers for network tasks (default {})".format(IO_WORKERS))
+    parser.add_argument('--cpu',
+        type=int,required=False,default=CPU_WORKERS,
+        help="Workers for disk/CPU tasks (default {})".format(CPU_WORKERS))
+
+    args = parser.parse_args()
+    return args
+
+def main():
+    import requests
+    from date_range import yrdoy_to_gps_days
+    args = options_task_graph()
+    os.umask(0o002)     # o-w
+    first = int(yrdoy_to_gps_days(args.year, args.day_of_year))
+    with requests.Session() as session:
+        graph = backfill_graph(args.measurement_path, args.rx_type,
+            args.fqdn, args.station, args.email, first, first + args.days,
+            args.zip, args.cleanup, session, TaskGraph(args.io, args.cpu))
+        results = graph.run()
+    print_summary(results)
+    sys.exit(sum(1 for r in results.values() if r[0] == 'failed'))
+
+if __name__ == '__main__':
+    main()
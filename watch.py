@@ -0,0 +1,501 @@
+#!/usr/bin/env -S python3 -u
+
+#################################################
+# watch.py v.20250604.1
+# copyright 2025 John Ackermann N8UR jra@febo.com
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# Watches measurement directories and does the next step for each
+# file as soon as it's finished (closed after writing, or renamed
+# into place), instead of waiting for the daily run to glob for it:
+#
+#   download/incoming/<receiver file>   convert to the day's RINEX
+#                                       (as get_gps_ftp.py would)
+#   download/<name>__<week>_daily/*.obs add to the partial weekly
+#                                       file and catalog; send to PPP
+#                                       if daily_ppp; make the weekly
+#                                       file once the week has 7 days
+#                                       (a day get_gps_incr.py is
+#                                       still building is left alone)
+#   weekly/*.obs.zip                    submit to CSRS-PPP
+#   <tier>/sum/*.sum                    update pos/offset files
+#   <tier>/clk/*.clk                    update the best-tier phase file
+#
+# Files arriving close together are handled as one batch once
+# things have been quiet for --settle seconds.  Local work is done
+# one job at a time in one thread; PPP submissions wait on NRCan in
+# another, and their results are filed by the first.  The steps are
+# all safe to repeat, so it doesn't matter that filing PPP results
+# also shows up as new .sum and .clk files.
+#
+# Events come from inotify (Linux, through ctypes); elsewhere, or
+# with --poll, the directories are scanned every --poll seconds
+# and a file counts as finished when it hasn't changed between two
+# scans.  Files already there at start are left alone, except in
+# download/incoming.  Weekly files still waiting for finals are
+# resubmitted once a week, on the day the daily run would do it.
+#
+# This takes the place of the daily run (nrcan.timer), which would
+# otherwise build and submit the same files; receiver downloads
+# come from get_gps_incr.py (nrcan-incr.timer) or files dropped in
+# download/incoming.
+#
+# Usage: watch.py -m measurement_path [...] [-e email] [-p] [-z] [-c]
+#        watch.py -C stations.toml
+#        [--poll seconds] [--settle seconds]
+
+import os
+import re
+import sys
+import time
+import glob
+import select
+import struct
+import argparse
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from nrcan_tools import *
+
+# inotify event bits (from <sys/inotify.h>)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+# seconds of quiet before a batch of files is acted on
+SETTLE = 5.0
+
+# GPS day of week (of yesterday) on which weekly files waiting for
+# finals are resubmitted, as ppp_runner.py does
+RESUBMIT_DOW = 4
+
+# order the steps run in when several are ready at once
+KINDS = ('incoming', 'daily', 'weekly', 'sum', 'clk')
+
+TIERS = ('final', 'rapid', 'ultra')
+
+# receiver file names for a whole day: Mosaic <station><doy>0.<yy>o
+# and NetRS <station><yyyy><mm><dd>0000a.T00
+MOSAIC_NAME = re.compile(r'^(.+?)(\d{3})0\.(\d{2})o$')
+NETRS_NAME = re.compile(r'^(.+?)(\d{4})(\d{2})(\d{2})0000[a-z]\.T00$')
+
+def options_watch():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-m','--measurement_path',
+        type=str,action='append',default=[],
+        help="Measurement path to watch (may be repeated)")
+    parser.add_argument('-C','--config',
+        type=str,required=False,default='',
+        help="Watch every station in an nrcan_daemon.py config file")
+    parser.add_argument('-e','--email',
+        type=str,required=False,default='',
+        help="User email address for NRCan (no PPP without it)")
+    parser.add_argument('-p','--daily_ppp',
+        action='store_true',
+        help="Also submit each daily file for rapid/ultra results")
+    parser.add_argument('-z','--zip',
+        action='store_true',
+        help="Make daily and weekly zip files")
+    parser.add_argument('-c','--cleanup',
+        action='store_true',
+        help="Remove files after zipping")
+    parser.add_argument('--poll',
+        type=float,required=False,default=0,
+        help="Scan every POLL seconds instead of using inotify")
+    parser.add_argument('--settle',
+        type=float,required=False,default=SETTLE,
+        help="Seconds of quiet before acting on new files " + \
+            "(default {:g})".format(SETTLE))
+
+    args = parser.parse_args()
+    return args
+
+# inotify through libc; events are (directory, mask, name)
+class Inotify:
+    def __init__(self):
+        import ctypes
+        self.ctypes = ctypes
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.dirs = {}      # watch descriptor -> directory
+
+    def add(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path),
+            WATCH_MASK)
+        if wd < 0:
+            err = self.ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        self.dirs[wd] = path
+
+    def read(self, timeout):
+        ready, junk, junk = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            buf = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+        events = []
+        i = 0
+        while i + 16 <= len(buf):
+            wd, mask, cookie, n = struct.unpack_from('iIII', buf, i)
+            name = os.fsdecode(buf[i + 16:i + 16 + n].rstrip(b'\0'))
+            i += 16 + n
+            if mask & IN_Q_OVERFLOW:
+                print("watch: too many events at once; some were lost")
+                continue
+            if mask & IN_IGNORED:
+                self.dirs.pop(wd, None)
+                continue
+            if wd in self.dirs:
+                events.append((self.dirs[wd], mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+# the same events by scanning directories; a file is reported once
+# its size and mtime are the same on two scans in a row
+class Poller:
+    def __init__(self, interval):
+        self.interval = interval
+        self.dirs = []
+        self.seen = {}      # path -> (size, mtime) at the last scan
+        self.done = {}      # path -> (size, mtime) last reported
+        self.next_scan = time.time() + interval
+
+    def entries(self, path):
+        try:
+            return list(os.scandir(path))
+        except OSError:
+            return []
+
+    def add(self, path):
+        self.dirs.append(path)
+        # what's there now doesn't count as new
+        for e in self.entries(path):
+            if e.is_dir():
+                self.done[e.path] = True
+            elif e.is_file():
+                st = e.stat()
+                self.seen[e.path] = self.done[e.path] = \
+                    (st.st_size, st.st_mtime_ns)
+
+    def read(self, timeout):
+        wait = self.next_scan - time.time()
+        if wait > 0:
+            time.sleep(min(timeout, wait))
+            if time.time() < self.next_scan:
+                return []
+        self.next_scan = time.time() + self.interval
+        events = []
+        for d in list(self.dirs):
+            for e in self.entries(d):
+                if e.is_dir():
+                    if e.path not in self.done:
+                        self.done[e.path] = True
+                        events.append((d, IN_CREATE | IN_ISDIR, e.name))
+                    continue
+                try:
+                    st = e.stat()
+                except OSError:
+                    continue
+                sig = (st.st_size, st.st_mtime_ns)
+                if self.seen.get(e.path) == sig and \
+                        self.done.get(e.path) != sig:
+                    self.done[e.path] = sig
+                    events.append((d, IN_CLOSE_WRITE, e.name))
+                self.seen[e.path] = sig
+        return events
+
+    def close(self):
+        pass
+
+# (rx_type, year, doy) from a whole-day receiver file name, or None
+def parse_receiver_name(name):
+    r = MOSAIC_NAME.match(name)
+    if r:
+        return 'mosaic', 2000 + int(r.group(3)), int(r.group(2))
+    r = NETRS_NAME.match(name)
+    if r:
+        from datetime import date
+        d = date(int(r.group(2)), int(r.group(3)), int(r.group(4)))
+        return 'netrs', d.year, d.timetuple().tm_yday
+    return None
+
+# run one step, reporting rather than dying if it gives up
+def run_job(what, func, *args):
+    try:
+        return func(*args)
+    except SystemExit as e:
+        print("watch:", what, "stopped:", e)
+    except Exception as e:
+        traceback.print_exc()
+        print("watch:", what, "failed:", e)
+    return None
+
+class Watcher:
+    # stations: list of dicts with measurement_path, email, zip,
+    # cleanup, daily_ppp and (optionally) upload_interval and
+    # archive_interval
+    def __init__(self, stations, poll=0, settle=SETTLE):
+        self.settle = settle
+        self.stations = {}
+        for st in stations:
+            path = os.path.abspath(st['measurement_path']) + '/'
+            self.stations[path] = dict(st, measurement_path=path)
+        self.backend = None
+        if not poll:
+            try:
+                self.backend = Inotify()
+            except (OSError, AttributeError) as e:
+                print("watch: no inotify (" + str(e) + "); polling")
+        if self.backend is None:
+            self.backend = Poller(poll or 10.0)
+        self.pending = {}       # (m_path, kind) -> set of paths
+        self.last_event = 0.0
+        self.resubmit_day = None    # last day checked for resubmission
+        # local steps one at a time; PPP waits on NRCan separately
+        self.local = ThreadPoolExecutor(max_workers=1)
+        self.network = ThreadPoolExecutor(max_workers=1)
+
+    def add_dir(self, path):
+        try:
+            self.backend.add(path)
+        except OSError as e:
+            print("watch: can't watch", path + ":", e)
+
+    # watch the directories of one measurement
+    def setup(self, m_path):
+        # date_1, date_2 are placeholders
+        m = get_measurement_files(m_path, 2022, 22)
+        m.make_dirs()
+        incoming = m.dnld_base + 'incoming/'
+        os.makedirs(incoming, exist_ok=True)
+        self.add_dir(m.dnld_base)
+        self.add_dir(incoming)
+        for d in sorted(glob.glob(m.dnld_base + m.m_name + '__*_daily')):
+            self.add_dir(d)
+        self.add_dir(m.weekly_rinex_dir)
+        for tier in TIERS:
+            for kind in ('clk', 'sum'):
+                self.add_dir(m_path + tier + '/' + kind)
+        # anything waiting to be converted
+        for f in sorted(os.listdir(incoming)):
+            self.queue(m_path, 'incoming', incoming + f)
+
+    # measurement path a directory belongs to
+    def station_of(self, dirpath):
+        dirpath = os.path.abspath(dirpath) + '/'
+        for m_path in self.stations:
+            if dirpath.startswith(m_path):
+                return m_path
+        return None
+
+    def queue(self, m_path, kind, path):
+        self.pending.setdefault((m_path, kind), set()).add(path)
+        self.last_event = time.time()
+
+    # sort one event into pending work
+    def event(self, dirpath, mask, name):
+        m_path = self.station_of(dirpath)
+        if m_path is None or name.startswith('.') or \
+                name.endswith('.tmp'):
+            return
+        path = os.path.join(dirpath, name)
+        rel = os.path.relpath(dirpath, m_path).split(os.sep)
+        if mask & IN_ISDIR:
+            # a new week's daily directory; files may have landed
+            # before the watch was in place
+            if rel == ['download'] and name.endswith('_daily'):
+                self.add_dir(path)
+                for f in sorted(glob.glob(path + '/*.obs')):
+                    self.queue(m_path, 'daily', f)
+            return
+        if mask & IN_CREATE:
+            # still being written; wait for the close
+            return
+        if rel == ['download', 'incoming']:
+            self.queue(m_path, 'incoming', path)
+        elif len(rel) == 2 and rel[0] == 'download' and \
+                rel[1].endswith('_daily') and name.endswith('.obs'):
+            self.queue(m_path, 'daily', path)
+        elif rel == ['weekly'] and name.endswith('.obs.zip'):
+            self.queue(m_path, 'weekly', path)
+        elif len(rel) == 2 and rel[0] in TIERS and rel[1] == 'sum' and \
+                name.endswith('.sum'):
+            self.queue(m_path, 'sum', path)
+        elif len(rel) == 2 and rel[0] in TIERS and rel[1] == 'clk' and \
+                name.endswith('.clk'):
+            self.queue(m_path, 'clk', path)
+
+    # hand the pending batches to the workers
+    def flush(self):
+        pending, self.pending = self.pending, {}
+        for key in sorted(pending, key=lambda k: (k[0], KINDS.index(k[1]))):
+            m_path, kind = key
+            st = self.stations[m_path]
+            paths = sorted(pending[key])
+            print("watch:", os.path.basename(m_path.rstrip('/')), kind,
+                len(paths), "file(s)")
+            self.local.submit(run_job, kind, getattr(self, 'do_' + kind),
+                st, paths)
+
+    # once a week, queue the weekly files still waiting for finals
+    # (not on the day watch starts, so a restart doesn't send them
+    # all again)
+    def resubmit(self):
+        today = time.gmtime()[:3]
+        if today == self.resubmit_day:
+            return
+        first = self.resubmit_day is None
+        self.resubmit_day = today
+        for m_path, st in self.stations.items():
+            m = get_measurement_files(m_path, 'yesterday')
+            if first or m.gps_dow_num != RESUBMIT_DOW or \
+                    not st.get('email'):
+                continue
+            for f in sorted(glob.glob(m.weekly_rinex_dir + '*.obs.zip')):
+                self.queue(m_path, 'weekly', f)
+
+    def run(self):
+        for m_path in self.stations:
+            self.setup(m_path)
+        print("watch: watching", len(self.stations), "measurement(s) with",
+            type(self.backend).__name__)
+        try:
+            while True:
+                for dirpath, mask, name in self.backend.read(
+                        min(self.settle, 1.0)):
+                    self.event(dirpath, mask, name)
+                self.resubmit()
+                if self.pending and \
+                        time.time() - self.last_event >= self.settle:
+                    self.flush()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.backend.close()
+            self.local.shutdown()
+            self.network.shutdown()
+
+    ###### the steps ######
+
+    # receiver files dropped in download/incoming
+    def do_incoming(self, st, paths):
+        from get_gps_ftp import convert_day
+        for path in paths:
+            if not os.path.isfile(path):
+                continue
+            name = os.path.basename(path)
+            got = parse_receiver_name(name)
+            if got is None:
+                print("watch: not a whole-day receiver file:", name)
+                continue
+            rx_type, year, doy = got
+            m = get_measurement_files(st['measurement_path'], year, doy)
+            m.make_dirs()
+            # (this removes the incoming file)
+            convert_day(m, rx_type, path, name)
+
+    # a day's RINEX file is in place
+    def do_daily(self, st, paths):
+        from make_weekly_rinex import append_daily_to_weekly, \
+            make_weekly_rinex
+        from catalog import get_catalog
+        from get_gps_incr import day_in_progress
+        m_path = st['measurement_path']
+        weeks = set()
+        for path in paths:
+            if not os.path.isfile(path):
+                continue
+            try:
+                week, dow = find_file_week_and_day(path)
+            except ValueError:
+                continue
+            m = get_measurement_files(m_path, week, dow)
+            if day_in_progress(m):
+                print("watch: day", os.path.basename(path),
+                    "still being built by get_gps_incr.py; skipping")
+                continue
+            append_daily_to_weekly(m)
+            get_catalog(m_path).add_daily(week, dow, m.year_num, m.doy_num,
+                path)
+            if st.get('daily_ppp') and st.get('email'):
+                self.submit(st, path, True)
+            weeks.add(week)
+        for week in sorted(weeks):
+            m = get_measurement_files(m_path, week, 0)
+            if m.get_num_files(m.daily_dnld_dir) < 7:
+                continue
+            made = glob.glob(m.weekly_rinex_dir + m.m_week_name + \
+                '_*weekly.obs*') + glob.glob(m.weekly_rinex_dir + \
+                '*/' + m.m_week_name + '_*weekly.obs*')
+            if made:
+                continue
+            make_weekly_rinex(m_path, week, st.get('zip', True),
+                st.get('cleanup', False), st.get('upload_interval', 0),
+                st.get('archive_interval', 0))
+
+    # a weekly file is ready to submit
+    def do_weekly(self, st, paths):
+        if not st.get('email'):
+            return
+        for path in paths:
+            if os.path.isfile(path):
+                self.submit(st, path, False)
+
+    # upload and wait in the network thread, then file the results
+    # in the local one
+    def submit(self, st, path, daily):
+        from get_gps_ppp import submit_ppp, ingest_ppp
+        def job():
+            result = run_job('submit', submit_ppp, path,
+                st['measurement_path'], st['email'], None, daily)
+            if result is not None:
+                self.local.submit(run_job, 'ingest', ingest_ppp, result)
+        self.network.submit(job)
+
+    def do_sum(self, st, paths):
+        from make_gps_misc import make_gps_misc_batch
+        make_gps_misc_batch([p for p in paths if os.path.isfile(p)])
+
+    def do_clk(self, st, paths):
+        from merge_tiers import merge_tiers
+        merge_tiers(st['measurement_path'])
+
+def main():
+    args = options_watch()
+    stations = []
+    if args.config:
+        from nrcan_daemon import load_config, config_stations
+        stations = config_stations(load_config(args.config))
+    for path in args.measurement_path:
+        stations.append({'measurement_path': path, 'email': args.email,
+            'zip': args.zip, 'cleanup': args.cleanup,
+            'daily_ppp': args.daily_ppp})
+    if not stations:
+        print("Nothing to watch; give -m or -C")
+        sys.exit(1)
+    os.umask(0o002)     # o-w
+    Watcher(stations, args.poll, args.settle).run()
+
+if __name__ == '__main__':
+    main()